@@ -0,0 +1,35 @@
+#!/usr/bin/python3 -S
+# Cliente do daemon do coletor (n8n-by-zabbix-coletas.py daemon).
+# Usa apenas a biblioteca padrão e roda com "python3 -S" para iniciar rápido:
+# não importa psycopg2 nem lê o arquivo de configuração.
+
+import os
+import socket
+import sys
+
+SOCKET_PATH = os.environ.get('N8N_MONITOR_SOCKET', '/run/n8n-by-zabbix/coletas.sock')
+TIMEOUT_SECONDS = 3
+
+if __name__ == "__main__":
+    argumentos = sys.argv[1:]
+    # Com várias seções [N8N:<nome>] o daemon escolhe a instância por "@nome" no início do pedido
+    if "--instance" in argumentos[:-1]:
+        posicao = argumentos.index("--instance")
+        argumentos[posicao:posicao + 2] = []
+        argumentos.insert(0, "@" + sys.argv[1:][posicao + 1])
+    pedido = " ".join(argumentos) + "\n"
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(TIMEOUT_SECONDS)
+            sock.connect(SOCKET_PATH)
+            sock.sendall(pedido.encode("utf-8"))
+            resposta = b""
+            while not resposta.endswith(b"\n"):
+                parte = sock.recv(4096)
+                if not parte:
+                    break
+                resposta += parte
+    except OSError as e:
+        print(f"Erro ao consultar o daemon do coletor em {SOCKET_PATH}: {e}", file=sys.stderr)
+        sys.exit(1)
+    print(resposta.decode("utf-8").strip())
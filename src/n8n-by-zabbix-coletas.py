@@ -1,13 +1,28 @@
 #!/opt/n8n-by-zabbix/venv/bin/python3
 
 import psycopg2
+import os
+import sqlite3
 import sys
+import time
 import configparser
 from datetime import timezone, timedelta
 
+from n8n_instrumentacao import INSTRUMENTACAO, conectar
+from n8n_instancias import instancia_da_linha_de_comando, instancias, selecionar
+from n8n_metricas import FAMILIA_DA_ACAO, SQL_POR_WORKFLOW
+from n8n_orcamento import ERROS_ORCAMENTO, config_orcamento, parametros_conexao
+
 # --- Constantes de Configuração ---
-CONFIG_FILE = '/etc/zabbix/n8n_monitor.conf'
+CONFIG_FILE = os.environ.get('N8N_MONITOR_CONF', '/etc/zabbix/n8n_monitor.conf')
 TIMEZONE_OFFSET_HOURS = -3
+# Ações lidas do rollup de execuções quando [ROLLUP] ENABLED = true
+ACOES_ROLLUP = {"execucao_status": "execucoes", "average_time": "tempos", "max_time": "tempos"}
+# Comandos administrativos e de longa duração: conexões sem o orçamento de [BUDGET]
+COMANDOS_SEM_ORCAMENTO = ("monitor", "daemon", "stream", "check-db", "stream-install", "stream-uninstall",
+                          "rollup-bootstrap", "rollup-refresh")
+# Parâmetros de [BUDGET] das conexões de coleta (n8n_orcamento), ou None
+ORCAMENTO = None
 
 def load_config():
     """Carrega as configurações do arquivo.conf."""
@@ -20,12 +35,13 @@ def load_config():
 def get_db_connection(n8n_config):
     """ Cria e retorna uma conexão com o banco de dados PostgreSQL."""
     try:
-        conn = psycopg2.connect(
+        conn = conectar(
             host=n8n_config['DB_POSTGRESDB_HOST'],
             port=n8n_config['DB_POSTGRESDB_PORT'],
             database=n8n_config['DB_POSTGRESDB_DATABASE'],
             user=n8n_config['DB_POSTGRESDB_USER'],
-            password=n8n_config['DB_POSTGRESDB_PASSWORD']
+            password=n8n_config['DB_POSTGRESDB_PASSWORD'],
+            **(parametros_conexao(ORCAMENTO) if ORCAMENTO else {})
         )
         return conn
     except psycopg2.Error as e:
@@ -39,13 +55,7 @@ def coleta_execucao_status(workflow_id, n8n_config):
 
     try:
         cursor = conn.cursor()
-        cursor.execute("""
-                SELECT count(*) 
-                FROM n8n."execution_entity" 
-                WHERE "workflowId" = %s
-                    AND "startedAt" > NOW() - INTERVAL '24 hours' 
-                    AND status = 'error'
-            """, (workflow_id,))
+        cursor.execute(SQL_POR_WORKFLOW["execucao_status"], (workflow_id,))
         total = cursor.fetchone()
         return total[0]
     except psycopg2.Error as e:
@@ -62,12 +72,11 @@ def coleta_workflow_status(workflow_id, n8n_config):
 
     try:
         cursor = conn.cursor()
-        cursor.execute("""
-                SELECT "active" 
-                FROM n8n."workflow_entity" 
-                WHERE "id" = %s
-            """, (workflow_id,))
+        cursor.execute(SQL_POR_WORKFLOW["workflow_status"], (workflow_id,))
         active = cursor.fetchone()
+        # Workflow excluído do n8n: não há linha (os itens dele aguardam a limpeza)
+        if active is None:
+            return 0
         if active[0] == True:
             ativo = 1
         else:
@@ -88,12 +97,11 @@ def coleta_is_archived(workflow_id, n8n_config):
 
     try:
         cursor = conn.cursor()
-        cursor.execute("""
-                SELECT "isArchived" 
-                FROM n8n."workflow_entity" 
-                WHERE "id" = %s
-            """, (workflow_id,))
+        cursor.execute(SQL_POR_WORKFLOW["is_archived"], (workflow_id,))
         archived = cursor.fetchone()
+        # Workflow excluído do n8n: não há linha (os itens dele aguardam a limpeza)
+        if archived is None:
+            return 0
         if archived[0] == True:
             arquivado = 1
         else:
@@ -114,12 +122,7 @@ def coleta_update(workflow_id, n8n_config):
 
     try:
         cursor = conn.cursor()
-        cursor.execute("""
-                SELECT "updatedAt" 
-                FROM n8n.workflow_entity 
-                WHERE id= %s 
-                LIMIT 1
-            """,(workflow_id,))
+        cursor.execute(SQL_POR_WORKFLOW["update"],(workflow_id,))
         dados = cursor.fetchone()
 
         if dados is None or dados[0] is None:
@@ -146,11 +149,7 @@ def coleta_average_time(workflow_id, n8n_config):
 
     try:
         cursor = conn.cursor()
-        cursor.execute("""
-                SELECT AVG(EXTRACT(EPOCH FROM ("stoppedAt" - "startedAt"))) AS media_tempo_execucao_segundos 
-                FROM n8n."execution_entity" 
-                WHERE "workflowId" = %s AND status IN ('success','error') AND "startedAt" > NOW() - interval '10 MINUTES'
-            """, (workflow_id,))
+        cursor.execute(SQL_POR_WORKFLOW["average_time"], (workflow_id,))
         tempo_medio = cursor.fetchone()
         return tempo_medio[0]
     except psycopg2.Error as e:
@@ -167,11 +166,7 @@ def coleta_max_time(workflow_id, n8n_config):
 
     try:
         cursor = conn.cursor()
-        cursor.execute("""
-                SELECT MAX(EXTRACT(EPOCH FROM ("stoppedAt" - "startedAt"))) AS max_tempo_execucao_segundos 
-                FROM n8n."execution_entity" 
-                WHERE "workflowId" = %s AND status IN ('success','error') AND "startedAt" > NOW() - interval '10 MINUTES' 
-            """, (workflow_id,))
+        cursor.execute(SQL_POR_WORKFLOW["max_time"], (workflow_id,))
         tempo_maximo = cursor.fetchone()
         return tempo_maximo[0]
     except psycopg2.Error as e:
@@ -181,16 +176,488 @@ def coleta_max_time(workflow_id, n8n_config):
         if conn:
             conn.close()
 
+def coleta_rollup(action, workflow_id, n8n_config):
+    """Lê a métrica de um workflow dos buckets do rollup (ver n8n_rollup.py)."""
+    from n8n_metricas import FAMILIAS, valor_metrica
+
+    conn = get_db_connection(n8n_config)
+    if conn is None:
+        return 0
+
+    try:
+        with conn.cursor() as cursor:
+            dados = FAMILIAS[ACOES_ROLLUP[action]](cursor, rollup=True, workflow_id=workflow_id)
+        return valor_metrica(dados, action, workflow_id)
+    except psycopg2.Error as e:
+        print(f"Erro ao acessar o banco de dados PostgreSQL: {e}", file=sys.stderr)
+        return 0
+    finally:
+        if conn:
+            conn.close()
+
+def coleta_duracao(action, workflow_id, n8n_config):
+    """Estatística de duração do workflow (duration_<count|avg|p50|p90|p99|max|le_N>)."""
+    from n8n_metricas import CHAVES_ITENS, coleta_familia_duracao, valor_metrica
+
+    if action not in CHAVES_ITENS:
+        print(f"Erro: estatística de duração desconhecida '{action}'.", file=sys.stderr)
+        return 0
+    conn = get_db_connection(n8n_config)
+    if conn is None:
+        return 0
+
+    try:
+        with conn.cursor() as cursor:
+            dados = coleta_familia_duracao(cursor, workflow_id)
+        return valor_metrica(dados, action, workflow_id)
+    except psycopg2.Error as e:
+        print(f"Erro ao acessar o banco de dados PostgreSQL: {e}", file=sys.stderr)
+        return 0
+    finally:
+        if conn:
+            conn.close()
+
+def coleta_fila(action, workflow_id, n8n_config):
+    """Fila e saturação do workflow (queue_<started|finished|new|running|waiting|oldest_running|wait_time>)."""
+    from n8n_metricas import CHAVES_ITENS, coleta_familia_fila, valor_metrica
+
+    if action not in CHAVES_ITENS:
+        print(f"Erro: estatística da fila desconhecida '{action}'.", file=sys.stderr)
+        return 0
+    conn = get_db_connection(n8n_config)
+    if conn is None:
+        return 0
+
+    try:
+        with conn.cursor() as cursor:
+            dados = coleta_familia_fila(cursor, workflow_id)
+        return valor_metrica(dados, action, workflow_id)
+    except psycopg2.Error as e:
+        print(f"Erro ao acessar o banco de dados PostgreSQL: {e}", file=sys.stderr)
+        return 0
+    finally:
+        if conn:
+            conn.close()
+
+def renovar_familia(familia, configs):
+    """Executa a consulta da família para todos os workflows (renovação do cache)."""
+    from n8n_metricas import FAMILIAS, FAMILIAS_ROLLUP
+    from n8n_rollup import atualizar_rollup, config_rollup
+
+    conn = get_db_connection(configs['N8N'])
+    if conn is None:
+        raise RuntimeError("sem conexão com o banco de dados PostgreSQL")
+    rollup = config_rollup(configs) if familia in FAMILIAS_ROLLUP else None
+    try:
+        if rollup:
+            atualizar_rollup(conn, **rollup)
+        with conn.cursor() as cursor:
+            if rollup:
+                return FAMILIAS[familia](cursor, rollup=True)
+            return FAMILIAS[familia](cursor)
+    finally:
+        conn.close()
+
+def coleta_cache(action, workflow_id, configs):
+    """Lê a métrica do cache em disco compartilhado entre os processos do agente (ver n8n_cache.py)."""
+    from n8n_cache import CacheColetas, config_cache
+
+    try:
+        cache = CacheColetas(**config_cache(configs))
+        valor = cache.valor(FAMILIA_DA_ACAO[action], action, workflow_id,
+                            lambda familia: renovar_familia(familia, configs))
+    except (OSError, sqlite3.Error) as e:
+        print(f"Erro ao acessar o cache das coletas: {e}", file=sys.stderr)
+        return 0
+    if valor is None:
+        return "ZBX_NOTSUPPORTED: cache das coletas ainda não carregado"
+    return valor
+
+def coleta_janela(action, workflow_id, configs):
+    """Erros do workflow numa janela deslizante (errors_<janela>, execucao_status = 24h), ver n8n_janelas.py."""
+    from n8n_janelas import config_janelas, contagens_atualizadas
+    from n8n_metricas import valor_metrica
+
+    conexoes = []
+
+    def conectar():
+        conexoes.append(get_db_connection(configs['N8N']))
+        return conexoes[-1]
+
+    try:
+        parametros = config_janelas(configs)
+        contagens = contagens_atualizadas(conectar, parametros["janelas"], parametros["caminho"],
+                                          parametros["lote"], parametros["idade_maxima"], parametros["atraso"])
+    except (OSError, ValueError, psycopg2.Error) as e:
+        print(f"Erro ao atualizar as janelas de erros: {e}", file=sys.stderr)
+        return 0
+    finally:
+        for conn in conexoes:
+            if conn:
+                conn.close()
+    if contagens is None:
+        return 0
+    if action not in contagens:
+        return f"ZBX_NOTSUPPORTED: janela '{action[len('errors_'):]}' fora de [ERROR_WINDOWS] WINDOWS"
+    return valor_metrica(contagens, action, workflow_id)
+
+def incluir_janelas(snapshot, conn, configs):
+    """Troca execucao_status do snapshot pelas contagens das janelas de erros, se habilitadas."""
+    from n8n_janelas import config_janelas, contagens_atualizadas
+
+    try:
+        parametros = config_janelas(configs)
+        if parametros is None:
+            return
+        contagens = contagens_atualizadas(lambda: conn, parametros["janelas"], parametros["caminho"],
+                                          parametros["lote"], atraso=parametros["atraso"])
+    except (OSError, ValueError) as e:
+        print(f"Erro ao atualizar as janelas de erros: {e}", file=sys.stderr)
+        return
+    except ERROS_ORCAMENTO as e:
+        # Sem execucao_status no snapshot o Zabbix fica com o último valor recebido
+        print(f"Janelas de erros excederam o orçamento: {str(e).strip()}", file=sys.stderr)
+        conn.rollback()
+        return
+    snapshot.update(contagens)
+
+def coleta_linha_base(workflow_id, configs):
+    """Desvio da duração do workflow em relação à sua linha de base, ver n8n_linha_base.py."""
+    from n8n_linha_base import config_linha_base, escores_atualizados
+    from n8n_metricas import valor_metrica
+
+    conexoes = []
+
+    def conectar():
+        conexoes.append(get_db_connection(configs['N8N']))
+        return conexoes[-1]
+
+    try:
+        parametros = config_linha_base(configs)
+        if parametros is None:
+            return "ZBX_NOTSUPPORTED: [DURATION_BASELINE] ENABLED desligado"
+        escores = escores_atualizados(conectar, parametros, parametros["idade_maxima"])
+    except (OSError, ValueError, psycopg2.Error) as e:
+        print(f"Erro ao atualizar a linha de base da duração: {e}", file=sys.stderr)
+        return 0
+    finally:
+        for conn in conexoes:
+            if conn:
+                conn.close()
+    if escores is None:
+        return 0
+    return valor_metrica(escores, "baseline_score", workflow_id)
+
+def incluir_linha_base(snapshot, conn, configs):
+    """Acrescenta ao snapshot o desvio da duração de cada workflow, se [DURATION_BASELINE] estiver ligado."""
+    from n8n_linha_base import config_linha_base, escores_atualizados
+
+    try:
+        parametros = config_linha_base(configs)
+        if parametros is None:
+            return
+        escores = escores_atualizados(lambda: conn, parametros)
+    except (OSError, ValueError) as e:
+        print(f"Erro ao atualizar a linha de base da duração: {e}", file=sys.stderr)
+        return
+    except ERROS_ORCAMENTO as e:
+        print(f"Linha de base da duração excedeu o orçamento: {str(e).strip()}", file=sys.stderr)
+        conn.rollback()
+        return
+    snapshot.update(escores)
+
+def coleta_defasagem(configs):
+    """Idade, em segundos, do dado mais antigo que o coletor está servindo (item n8n.collector.staleness).
+
+    No modo agent vem das famílias do [CACHE]; sem cache, do estado do bulk de [BUDGET].
+    """
+    from n8n_cache import CacheColetas, config_cache
+    from n8n_orcamento import carregar_estado, defasagem
+
+    cache = config_cache(configs)
+    if cache:
+        try:
+            linhas = CacheColetas(**cache).conexao().execute(
+                "SELECT familia, atualizado_em FROM familias WHERE atualizado_em IS NOT NULL").fetchall()
+        except sqlite3.Error as e:
+            print(f"Erro ao acessar o cache das coletas: {e}", file=sys.stderr)
+            return 0
+        return defasagem({familia: {"em": em} for familia, em in linhas})
+    orcamento = config_orcamento(configs)
+    if orcamento:
+        return defasagem(carregar_estado(orcamento["caminho"]).get("familias", {}))
+    return 0
+
+def snapshot_metricas(configs):
+    """Todas as métricas de todos os workflows, ou None em caso de erro.
+
+    Uma consulta só (SQL_METRICAS); com [ROLLUP] ENABLED usa o snapshot do
+    rollup, como o modo bulk.
+    """
+    from n8n_metricas import coleta_metricas, coleta_snapshot
+    from n8n_rollup import atualizar_rollup, config_rollup
+
+    conn = get_db_connection(configs['N8N'])
+    if conn is None:
+        return None
+
+    rollup = config_rollup(configs)
+    try:
+        if rollup:
+            atualizar_rollup(conn, **rollup)
+            snapshot = coleta_snapshot(conn, rollup=True)
+        else:
+            with conn.cursor() as cursor:
+                snapshot = coleta_metricas(cursor)
+        incluir_janelas(snapshot, conn, configs)
+        incluir_linha_base(snapshot, conn, configs)
+    except psycopg2.Error as e:
+        print(f"Erro ao acessar o banco de dados PostgreSQL: {e}", file=sys.stderr)
+        return None
+    finally:
+        conn.close()
+    return snapshot
+
+def coleta_metricas_json(configs):
+    """JSON com todas as métricas de todos os workflows (item mestre n8n.workflows.metrics)."""
+    from n8n_metricas import metricas_json
+
+    snapshot = snapshot_metricas(configs)
+    if snapshot is None:
+        return 1
+    print(metricas_json(snapshot))
+    return 0
+
+def coleta_prometheus(configs, instancia=None):
+    """Todas as métricas no formato texto do Prometheus, as mesmas do /metrics do daemon."""
+    from n8n_prometheus import amostras, exposicao
+
+    snapshot = snapshot_metricas(configs)
+    if snapshot is None:
+        return 1
+    rotulos = {"n8n_instance": instancia} if instancia else {}
+    sys.stdout.buffer.write(b"".join(exposicao([(rotulos, amostras(snapshot, rotulos), time.time())])))
+    return 0
+
+def coleta_bulk(configs, somente_imprimir=False, instancia=None):
+    """Coleta todas as métricas de todos os workflows e envia via Zabbix sender.
+
+    Roda uma consulta agrupada por família de métricas numa única conexão e
+    envia todos os valores num só pacote para os itens trapper do host
+    SENDER_HOST. Com somente_imprimir=True apenas lista chave/valor na saída.
+    `instancia` só identifica as mensagens quando há várias [N8N:<nome>].
+    """
+    from n8n_descarte import carregar_enviados, config_descarte, filtrar_alterados, registrar_envio, salvar_enviados
+    from n8n_janelas import config_janelas
+    from n8n_metricas import FAMILIAS, coleta_snapshot, itens_do_snapshot
+    from n8n_orcamento import (CHAVE_DEFASAGEM, carregar_estado, coleta_limitada, defasagem, pular_ciclo,
+                               registrar_ciclo, salvar_estado)
+    from n8n_rollup import atualizar_rollup, config_rollup
+    from n8n_zabbix_sender import zabbix_send, ZabbixSenderError
+
+    prefixo = f"[{instancia}] " if instancia else ""
+
+    # Intervalo adaptativo de [BUDGET]: com o banco lento as execuções do cron são espaçadas
+    orcamento = config_orcamento(configs)
+    estado_orcamento = carregar_estado(orcamento["caminho"]) if orcamento else {}
+    inicio = time.time()
+    if orcamento and not somente_imprimir and pular_ciclo(estado_orcamento, inicio):
+        print(f"{prefixo}Banco lento: coleta adiada (intervalo {estado_orcamento.get('fator', 1)}x o normal).",
+              file=sys.stderr)
+        return 0
+
+    conn = get_db_connection(configs['N8N'])
+    if conn is None:
+        return 1
+
+    rollup = config_rollup(configs)
+    try:
+        # Com as janelas de erros a família execucoes não é consultada
+        familias = [nome for nome in FAMILIAS if nome != "execucoes"] if config_janelas(configs) else None
+    except ValueError as e:
+        print(f"{prefixo}Erro: {e}", file=sys.stderr)
+        conn.close()
+        return 1
+    try:
+        if rollup:
+            try:
+                atualizar_rollup(conn, **rollup)
+            except ERROS_ORCAMENTO as e:
+                if not orcamento:
+                    raise
+                # Os buckets já gravados continuam valendo: lê o rollup um pouco atrasado
+                print(f"{prefixo}Atualização do rollup excedeu o orçamento: {str(e).strip()}", file=sys.stderr)
+                conn.rollback()
+        if orcamento:
+            snapshot, familias_coletadas, lento = coleta_limitada(
+                conn, familias, estado_orcamento.get("familias", {}), rollup=rollup is not None,
+                limite_lento=orcamento["statement_timeout"] / 2000)
+        else:
+            snapshot = coleta_snapshot(conn, familias, rollup=rollup is not None)
+        incluir_janelas(snapshot, conn, configs)
+        incluir_linha_base(snapshot, conn, configs)
+    except psycopg2.Error as e:
+        print(f"{prefixo}Erro ao acessar o banco de dados PostgreSQL: {e}", file=sys.stderr)
+        return 1
+    finally:
+        conn.close()
+
+    valores = list(itens_do_snapshot(snapshot))
+    if orcamento:
+        valores.append((CHAVE_DEFASAGEM, defasagem(familias_coletadas)))
+        if not somente_imprimir:
+            try:
+                salvar_estado(orcamento["caminho"], registrar_ciclo(estado_orcamento, familias_coletadas, lento,
+                                                                    orcamento, inicio))
+            except OSError as e:
+                print(f"{prefixo}Erro ao gravar o estado do orçamento em {orcamento['caminho']}: {e}",
+                      file=sys.stderr)
+    if INSTRUMENTACAO.ativa:
+        from n8n_instrumentacao import valores_monitor
+        valores.extend(valores_monitor(INSTRUMENTACAO.caminho, INSTRUMENTACAO.janela))
+    # [THROTTLING]: só os valores que mudaram ou cujo último envio passou do heartbeat
+    try:
+        descarte = config_descarte(configs)
+    except ValueError as e:
+        print(f"{prefixo}Erro: {e}", file=sys.stderr)
+        return 1
+    inalterados = 0
+    if descarte:
+        enviados = carregar_enviados(descarte["caminho"])
+        coletados = len(valores)
+        valores = filtrar_alterados(valores, enviados, descarte["heartbeats"])
+        inalterados = coletados - len(valores)
+    if somente_imprimir:
+        for chave, valor in valores:
+            print(f"{prefixo}{chave} {valor}")
+        if descarte:
+            print(f"{prefixo}Inalterados (não enviados): {inalterados}.", file=sys.stderr)
+        return 0
+
+    zabbix_config = configs['ZABBIX']
+    try:
+        resultado = zabbix_send(
+            zabbix_config.get('SENDER_SERVER', 'localhost'),
+            zabbix_config.getint('SENDER_PORT', 10051),
+            zabbix_config['SENDER_HOST'],
+            valores,
+            timeout=zabbix_config.getfloat('SENDER_TIMEOUT', 10.0),
+            lote=zabbix_config.getint('SENDER_BATCH_SIZE', 0),
+        )
+    except KeyError:
+        print(f"{prefixo}Erro: SENDER_HOST não definido na seção [ZABBIX] do arquivo de configuração.", file=sys.stderr)
+        return 1
+    except ZabbixSenderError as e:
+        print(f"{prefixo}Erro: {e}", file=sys.stderr)
+        return 1
+    if descarte:
+        try:
+            salvar_enviados(descarte["caminho"], registrar_envio(enviados, valores))
+        except OSError as e:
+            print(f"{prefixo}Erro ao gravar os últimos valores enviados em {descarte['caminho']}: {e}",
+                  file=sys.stderr)
+
+    print(f"{prefixo}Valores enviados: {resultado['processed']} processados, {resultado['failed']} com falha, "
+          f"{resultado['total']} no total" + (f"; inalterados: {inalterados}." if descarte else "."))
+    return 0
+
+def coleta_bulk_instancias(instancias, somente_imprimir=False):
+    """Modo bulk de várias instâncias em paralelo, uma thread (e uma conexão) por [N8N:<nome>].
+
+    Um banco lento só atrasa o envio da própria instância. Retorna 1 se alguma falhou.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    with ThreadPoolExecutor(max_workers=len(instancias)) as executor:
+        resultados = list(executor.map(lambda item: coleta_bulk(item[1], somente_imprimir, item[0]), instancias))
+    return 1 if any(resultados) else 0
+
 if __name__ == "__main__":
 
     configs = load_config()
+    INSTANCIA = instancia_da_linha_de_comando(sys.argv)
+    if len(sys.argv) > 1 and sys.argv[1] not in COMANDOS_SEM_ORCAMENTO:
+        ORCAMENTO = config_orcamento(configs)
+
+    if len(sys.argv) > 1 and sys.argv[1] == "daemon":
+        from n8n_daemon import executar_daemon
+        sys.exit(executar_daemon(configs, INSTANCIA))
+    if len(sys.argv) > 1 and sys.argv[1] == "bulk" and INSTANCIA is None and len(instancias(configs)) > 1:
+        INSTRUMENTACAO.configurar(configs, "coletor")
+        sys.exit(coleta_bulk_instancias(instancias(configs), somente_imprimir="--print" in sys.argv[2:]))
+
+    configs = selecionar(configs, INSTANCIA)
     n8n_config = configs['N8N']
 
+    if len(sys.argv) > 1 and sys.argv[1] == "monitor":
+        from n8n_instrumentacao import config_instrumentacao, resumir
+        parametros = config_instrumentacao(configs)
+        if parametros is None:
+            print("ZBX_NOTSUPPORTED: [INSTRUMENTATION] ENABLED desligado")
+            sys.exit(0)
+        print(resumir(parametros["caminho"], sys.argv[2], sys.argv[3] if len(sys.argv) > 3 else "avg",
+                      parametros["janela"]))
+        sys.exit(0)
+    if len(sys.argv) > 1 and sys.argv[1] == "stream":
+        from n8n_stream import executar_stream
+        sys.exit(executar_stream(configs, lambda: get_db_connection(n8n_config)))
+
+    # O item monitor, o daemon e o stream (processos de longa duração) ficam fora das medições
+    INSTRUMENTACAO.configurar(configs, "coletor")
+
+    if len(sys.argv) > 1 and sys.argv[1] == "bulk":
+        sys.exit(coleta_bulk(configs, somente_imprimir="--print" in sys.argv[2:], instancia=INSTANCIA))
+    if len(sys.argv) > 1 and sys.argv[1] == "metrics_json":
+        sys.exit(coleta_metricas_json(configs))
+    if len(sys.argv) > 1 and sys.argv[1] == "prometheus":
+        sys.exit(coleta_prometheus(configs, INSTANCIA))
+    if len(sys.argv) > 1 and sys.argv[1] == "staleness":
+        print(coleta_defasagem(configs))
+        sys.exit(0)
+    if len(sys.argv) > 1 and sys.argv[1] == "failures":
+        from n8n_falhas import executar_falhas
+        sys.exit(executar_falhas(configs, lambda: get_db_connection(n8n_config),
+                                 somente_imprimir="--print" in sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == "check-db":
+        from n8n_verificacao_db import executar_verificacao
+        conn = get_db_connection(n8n_config)
+        if conn is None:
+            sys.exit(1)
+        try:
+            sys.exit(executar_verificacao(conn, configs, sys.argv[2:]))
+        finally:
+            conn.close()
+    if len(sys.argv) > 1 and sys.argv[1] in ("stream-install", "stream-uninstall"):
+        from n8n_stream import executar_comando
+        conn = get_db_connection(n8n_config)
+        if conn is None:
+            sys.exit(1)
+        try:
+            sys.exit(executar_comando(sys.argv[1], conn))
+        finally:
+            conn.close()
+    if len(sys.argv) > 1 and sys.argv[1] in ("rollup-bootstrap", "rollup-refresh"):
+        from n8n_rollup import executar_comando
+        conn = get_db_connection(n8n_config)
+        if conn is None:
+            sys.exit(1)
+        try:
+            sys.exit(executar_comando(sys.argv[1], conn, configs))
+        finally:
+            conn.close()
+
     if len(sys.argv) > 1:
         action = sys.argv[1]
         workflow = sys.argv[2]
 
-        if action == "execucao_status":
+        if (action.startswith("errors_") or action == "execucao_status") and configs.has_section('ERROR_WINDOWS') \
+                and configs['ERROR_WINDOWS'].getboolean('ENABLED', False):
+            print(coleta_janela(action, workflow, configs))
+        elif action in FAMILIA_DA_ACAO and configs.has_section('CACHE') and configs['CACHE'].getboolean('ENABLED', False):
+            print(coleta_cache(action, workflow, configs))
+        elif action in ACOES_ROLLUP and configs.has_section('ROLLUP') and configs['ROLLUP'].getboolean('ENABLED', False):
+            print(coleta_rollup(action, workflow, n8n_config))
+        elif action == "execucao_status":
             print(coleta_execucao_status(workflow, n8n_config))
         elif action == "workflow_status":
             print(coleta_workflow_status(workflow, n8n_config))
@@ -202,4 +669,14 @@ if __name__ == "__main__":
             print(coleta_average_time(workflow, n8n_config))
         elif action == "max_time":
             print(coleta_max_time(workflow, n8n_config))
-
+        elif action.startswith("duration_"):
+            print(coleta_duracao(action, workflow, n8n_config))
+        elif action.startswith("queue_"):
+            print(coleta_fila(action, workflow, n8n_config))
+        elif action.startswith("errors_"):
+            print("ZBX_NOTSUPPORTED: [ERROR_WINDOWS] ENABLED desligado")
+        elif action == "baseline_score":
+            print(coleta_linha_base(workflow, configs))
+        elif action.startswith("failure_"):
+            from n8n_falhas import valor_falha
+            print(valor_falha(configs, action, workflow))
@@ -0,0 +1,140 @@
+#!/opt/n8n-by-zabbix/venv/bin/python3
+
+import argparse
+import os
+import sys
+import configparser
+
+from n8n_descarte import HEARTBEATS_PADRAO, config_descarte
+from n8n_falhas import falhas_habilitadas
+from n8n_janelas import config_janelas
+from n8n_linha_base import config_linha_base
+from n8n_metricas import JANELAS_ERROS
+from n8n_zabbix_itens import limites_fila
+from n8n_zabbix_template import (CHAVE_DESCOBERTA_PADRAO, FORMATOS, TEMPLATE_NOME_PADRAO, converter_host,
+                                 montar_template, vincular_template)
+
+# --- Constantes de Configuração ---
+CONFIG_FILE = os.environ.get('N8N_MONITOR_CONF', '/etc/zabbix/n8n_monitor.conf')
+
+def load_config():
+    """Carrega as configurações do arquivo.conf (opcional na exportação)."""
+    config = configparser.ConfigParser()
+    config.read(CONFIG_FILE)
+    return config
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Gera o template do Zabbix com LLD dos workflows do n8n "
+                                                 "e converte hosts provisionados pela descoberta.")
+    subparsers = parser.add_subparsers(dest="comando", required=True)
+
+    exportar = subparsers.add_parser("export", help="escreve o template (YAML, XML ou JSON) para importar no Zabbix")
+    exportar.add_argument("--format", choices=sorted(FORMATOS), default="yaml")
+    exportar.add_argument("--output", "-o", help="arquivo de saída (padrão: stdout)")
+    exportar.add_argument("--template-name", default=TEMPLATE_NOME_PADRAO)
+    exportar.add_argument("--discovery-key", default=CHAVE_DESCOBERTA_PADRAO,
+                          help="chave da regra de LLD (UserParameter que roda n8n-by-zabbix-via-API.py)")
+    exportar.add_argument("--item-type", choices=["agent", "trapper", "dependent"],
+                          help="tipo dos protótipos (padrão: [ZABBIX] ITEM_TYPE ou agent)")
+    exportar.add_argument("--histogram", action="store_true",
+                          help="inclui os protótipos do histograma de duração")
+    exportar.add_argument("--error-windows",
+                          help="janelas dos protótipos n8n.workflow.errors, ex.: 1h,24h,7d "
+                               "(padrão: [ERROR_WINDOWS] WINDOWS, se ENABLED)")
+    exportar.add_argument("--queue", action="store_true",
+                          help="inclui os protótipos da fila (n8n.workflow.queue) e suas triggers "
+                               "(padrão: [DISCOVERY] QUEUE_METRICS)")
+    exportar.add_argument("--failures", action="store_true",
+                          help="inclui os protótipos da última falha (n8n.workflow.failure) "
+                               "(padrão: [FAILURES] ENABLED)")
+    exportar.add_argument("--throttling", action="store_true",
+                          help="descarta valores inalterados nos protótipos, com os heartbeats padrão "
+                               "(padrão: [THROTTLING] ENABLED)")
+    exportar.add_argument("--baseline", action="store_true",
+                          help="inclui o protótipo do desvio da duração (n8n.workflow.duration.score) e a "
+                               "trigger de lentidão (padrão: [DURATION_BASELINE] ENABLED)")
+
+    converter = subparsers.add_parser("convert", help="renomeia para legacy.* e desativa os itens criados pela "
+                                                      "descoberta no HOST_ID, liberando as chaves para a LLD")
+    converter.add_argument("--dry-run", action="store_true", help="só conta o que seria alterado")
+    converter.add_argument("--link", action="store_true",
+                           help="vincula ao host o template já importado após a conversão")
+    converter.add_argument("--template-name", default=TEMPLATE_NOME_PADRAO)
+    return parser.parse_args()
+
+def exportar(args, config):
+    zabbix_config = config['ZABBIX'] if config.has_section('ZABBIX') else {}
+    discovery_config = config['DISCOVERY'] if config.has_section('DISCOVERY') else {}
+    modo = args.item_type or zabbix_config.get('ITEM_TYPE', 'agent').strip().lower()
+    histograma = args.histogram or str(discovery_config.get('DURATION_HISTOGRAM', 'false')).strip().lower() in (
+        '1', 'true', 'yes', 'on')
+    if args.error_windows is not None:
+        janelas = [janela.strip() for janela in args.error_windows.split(",") if janela.strip()]
+    else:
+        try:
+            janelas = (config_janelas(config) or {}).get("janelas", [])
+        except ValueError as e:
+            print(f"Erro: {e}", file=sys.stderr)
+            return 1
+    invalidas = [janela for janela in janelas if janela not in JANELAS_ERROS]
+    if invalidas:
+        print(f"Erro: janelas inválidas: {', '.join(invalidas)} (use {', '.join(JANELAS_ERROS)})", file=sys.stderr)
+        return 1
+    fila = limites_fila(discovery_config, forcar=args.queue)
+    try:
+        descarte = config_descarte(config)
+        linha_base = config_linha_base(config, forcar=args.baseline)
+    except ValueError as e:
+        print(f"Erro: {e}", file=sys.stderr)
+        return 1
+    heartbeats = descarte["heartbeats"] if descarte else (dict(HEARTBEATS_PADRAO) if args.throttling else None)
+    exportacao = montar_template(args.template_name, args.discovery_key, modo,
+                                 zabbix_config.get('SENDER_ALLOWED_HOSTS'), histograma, janelas=janelas, fila=fila,
+                                 falhas=args.failures or falhas_habilitadas(config), descarte=heartbeats,
+                                 linha_base=linha_base)
+    texto = FORMATOS[args.format](exportacao)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as arquivo:
+            arquivo.write(texto)
+        print(f"Template '{args.template_name}' gravado em {args.output}.", file=sys.stderr)
+    else:
+        sys.stdout.write(texto)
+    return 0
+
+def converter(args, config):
+    from n8n_http import ClienteHttp, ClienteZabbix
+    from n8n_zabbix_provisionamento import LOTE_PADRAO
+
+    if not config.has_section('ZABBIX'):
+        print(f"Erro: seção [ZABBIX] não encontrada em {CONFIG_FILE}", file=sys.stderr)
+        return 1
+    zabbix_config = config['ZABBIX']
+    cliente = ClienteZabbix(zabbix_config['API_URL'], zabbix_config['AUTH_TOKEN'],
+                            ClienteHttp.da_configuracao(zabbix_config))
+    try:
+        resultado = converter_host(cliente.chamar, zabbix_config['HOST_ID'],
+                                   zabbix_config.getint('API_BATCH_SIZE', LOTE_PADRAO), args.dry_run)
+        if resultado is None:
+            print("Erro: não foi possível ler os itens/triggers atuais do host no Zabbix.", file=sys.stderr)
+            return 1
+        itens, triggers, falhas = resultado
+        acao = "seriam convertidos" if args.dry_run else "convertidos"
+        print(f"Itens {acao} para legacy.*: {itens}; triggers desativadas: {triggers}; lotes com falha: {falhas}.")
+        if falhas:
+            return 1
+        if args.link and not args.dry_run:
+            if not vincular_template(cliente.chamar, zabbix_config['HOST_ID'], args.template_name):
+                print(f"Erro: não foi possível vincular o template '{args.template_name}' "
+                      f"(ele já foi importado?).", file=sys.stderr)
+                return 1
+            print(f"Template '{args.template_name}' vinculado ao host {zabbix_config['HOST_ID']}.")
+        return 0
+    finally:
+        cliente.http.fechar()
+
+if __name__ == "__main__":
+    args = parse_args()
+    config = load_config()
+    if args.comando == "export":
+        sys.exit(exportar(args, config))
+    sys.exit(converter(args, config))
@@ -1,54 +1,53 @@
 #!/opt/n8n-by-zabbix/venv/bin/python3
 
 import os
-import json
 import requests
 import sys
 import configparser
 
+from n8n_api import PAGE_SIZE_PADRAO, CachePaginas, escrever_lld, iterar_workflows
+from n8n_http import ClienteHttp
+
 N8N_URL = 'http://localhost:5678'
-CREDENTIALS_FILE = '/etc/zabbix/.n8n_api_creds'
+CREDENTIALS_FILE = os.environ.get('N8N_API_CREDS', '/etc/zabbix/.n8n_api_creds')
 
 def load_credentials():
     config = configparser.ConfigParser()
     try:
         config.read(CREDENTIALS_FILE)
         return {
-            'API_KEY_SECRET': config.get('API', 'N8N_API_KEY_SECRET')
+            'API_KEY_SECRET': config.get('API', 'N8N_API_KEY_SECRET'),
+            # Opcionais: URL do n8n, tamanho da página e cache das páginas com ETag
+            'N8N_URL': config.get('API', 'N8N_URL', fallback=N8N_URL),
+            'PAGE_SIZE': config.getint('API', 'PAGE_SIZE', fallback=PAGE_SIZE_PADRAO),
+            'CACHE_FILE': config.get('API', 'CACHE_FILE', fallback=None),
         }
     except (configparser.NoSectionError, configparser.NoOptionError) as e:
         print(f"Error reading credentials file {CREDENTIALS_FILE}: {e}", file=sys.stderr)
         return None
 
 def discover_workflows():
+    """Writes the LLD JSON of the active workflows to stdout, page by page."""
     creds = load_credentials()
     if not creds:
         print("Error: API credentials not loaded or incomplete.", file=sys.stderr)
-        return []
-
-    headers = {
-        #'X-N8N-API-KEY-ID': creds['API_KEY_LABEL'],
-        'accept': 'application/json',
-        'X-N8N-API-KEY': creds['API_KEY_SECRET']
-    }
-    url = f"{N8N_URL}/api/v1/workflows?active=true"
+        return False
 
+    http = ClienteHttp()
+    cache = CachePaginas(creds['CACHE_FILE']) if creds['CACHE_FILE'] else None
     try:
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        workflows = response.json()
-
-        zabbix_data = []
-        for wf in workflows['data']:
-            zabbix_data.append({
-                "{#WORKFLOW_ID}": wf['id'],
-                "{#WORKFLOW_NAME}": wf['name']
-            })
-        return zabbix_data
-    except requests.exceptions.RequestException as e:
-        print(f"Error fetching n8n workflows: {e}", file=sys.stderr)
-        return []
+        workflows = iterar_workflows(http, creds['N8N_URL'], creds['API_KEY_SECRET'], ativos=True,
+                                     page_size=creds['PAGE_SIZE'], cache=cache)
+        escrever_lld(workflows)
+        if cache is not None:
+            cache.salvar()
+        return True
+    except (requests.exceptions.RequestException, ValueError, KeyError) as e:
+        # Sem o "]" final o JSON fica inválido: o Zabbix não descarta os workflows já descobertos
+        print(f"\nError fetching n8n workflows: {e}", file=sys.stderr)
+        return False
+    finally:
+        http.fechar()
 
 if __name__ == "__main__":
-    discovery_result = discover_workflows()
-    print(json.dumps(discovery_result, indent=4))
\ No newline at end of file
+    sys.exit(0 if discover_workflows() else 1)
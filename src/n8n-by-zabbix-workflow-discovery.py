@@ -2,13 +2,37 @@
 
 import psycopg2
 import requests
+import argparse
+import os
 import sys
+import time
 import configparser
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from n8n_api import PAGE_SIZE_PADRAO, CachePaginas, data_api, iterar_workflows
+from n8n_http import ClienteHttp, ClienteZabbix
+from n8n_instancias import instancia_da_linha_de_comando, nomes_instancias, selecionar
+from n8n_instrumentacao import INSTRUMENTACAO, conectar
+from n8n_descarte import HEARTBEATS_PADRAO, config_descarte, imprimir_projecao, projecao
+from n8n_falhas import falhas_habilitadas
+from n8n_janelas import config_janelas
+from n8n_linha_base import config_linha_base
+from n8n_discovery_estado import carregar_estado, estado_vazio, hash_parametros, salvar_estado
+from n8n_orcamento import config_orcamento
+from n8n_zabbix_limpeza import config_limpeza, limpar
+from n8n_zabbix_itens import (acoes_provisionadas, definicoes_workflow, item_defasagem, item_mestre, itens_monitor,
+                              itens_workflow, limites_fila, triggers_workflow)
+from n8n_zabbix_provisionamento import (LOTE_PADRAO, LimitadorTaxa, aplicar_plano, buscar_itens_existentes,
+                                        buscar_triggers_existentes, garantir_item, imprimir_plano, planejar)
 
 # --- Constantes de Configuração ---
-CONFIG_FILE = '/etc/zabbix/n8n_monitor.conf'
+CONFIG_FILE = os.environ.get('N8N_MONITOR_CONF', '/etc/zabbix/n8n_monitor.conf')
 ZABBIX_ITEM_PREFIX = "n8n.workflow."
 COLLECTION_INTERVAL_SECONDS = 3600  # 1 hora
+STATE_FILE_PADRAO = '/var/lib/n8n-by-zabbix/discovery_state.json'
+CAMPOS_LIMPEZA = ("removido", "arquivado", "limpo")
 
 # --- Funções de Configuração e Zabbix API ---
 def load_config():
@@ -19,36 +43,86 @@ def load_config():
         sys.exit(1)
     return config
 
-config = load_config()
+def descoberta_das_instancias(nomes):
+    """Roda a descoberta de cada [N8N:<nome>] em paralelo (um processo por instância).
+
+    Cada processo tem o seu estado, o seu host de destino e a sua sessão com a
+    API; a saída é repassada por instância. Retorna o maior código de saída.
+    """
+    def executar(nome):
+        comando = [sys.executable, os.path.abspath(__file__), "--instance", nome] + sys.argv[1:]
+        return nome, subprocess.run(comando, capture_output=True, text=True)
+
+    codigo = 0
+    with ThreadPoolExecutor(max_workers=len(nomes)) as executor:
+        for nome, resultado in executor.map(executar, nomes):
+            print(f"=== Instância {nome} ===")
+            print(resultado.stdout, end="")
+            print(resultado.stderr, end="", file=sys.stderr)
+            codigo = max(codigo, resultado.returncode)
+    return codigo
+
+CONFIG_COMPLETA = load_config()
+INSTANCIA = instancia_da_linha_de_comando(sys.argv)
+if __name__ == "__main__" and INSTANCIA is None and len(nomes_instancias(CONFIG_COMPLETA)) > 1 \
+        and not {"-h", "--help"} & set(sys.argv[1:]):
+    sys.exit(descoberta_das_instancias(nomes_instancias(CONFIG_COMPLETA)))
+config = selecionar(CONFIG_COMPLETA, INSTANCIA)
 n8n_config = config['N8N']
 zabbix_config = config['ZABBIX']
+discovery_config = config['DISCOVERY'] if config.has_section('DISCOVERY') else {}
+# db (padrão): consulta direta ao PostgreSQL; api: API REST do n8n
+DISCOVERY_SOURCE = discovery_config.get('SOURCE', 'db').strip().lower()
+# agent (padrão), trapper (exige o coletor em modo bulk no cron) ou dependent
+# (itens dependentes do item mestre n8n.workflows.metrics)
+ITEM_MODE = zabbix_config.get('ITEM_TYPE', 'agent').strip().lower()
+# Intervalo do item mestre no modo dependent
+METRICS_INTERVAL = zabbix_config.get('METRICS_INTERVAL', '60s').strip()
+# Itens do histograma de duração (n8n.workflow.duration[<id>,le_<n>]) por workflow
+DURATION_HISTOGRAM = str(discovery_config.get('DURATION_HISTOGRAM', 'false')).strip().lower() in ('1', 'true', 'yes', 'on')
+# Itens n8n.workflow.errors[<id>,<janela>] das janelas de [ERROR_WINDOWS] WINDOWS
+try:
+    ERROR_WINDOWS = (config_janelas(config) or {}).get("janelas", [])
+except ValueError as e:
+    print(f"Erro: {e}", file=sys.stderr)
+    sys.exit(1)
+# Itens n8n.workflow.queue[<id>,<estatística>] e triggers de saturação (None = desligado)
+QUEUE_LIMITS = limites_fila(discovery_config)
+# Itens n8n.workflow.failure[<id>,node|message|execution] da última falha ([FAILURES] ENABLED)
+FAILURES = falhas_habilitadas(config)
+# Item n8n.workflow.duration.score[<id>] e trigger de lentidão ([DURATION_BASELINE] ENABLED)
+try:
+    BASELINE = config_linha_base(config)
+except ValueError as e:
+    print(f"Erro: {e}", file=sys.stderr)
+    sys.exit(1)
+LIMITE_ESCORE = BASELINE["limite"] if BASELINE else None
+# Descarte de valores inalterados nos itens dos workflows ([THROTTLING] ENABLED)
+try:
+    THROTTLING = config_descarte(config)
+except ValueError as e:
+    print(f"Erro: {e}", file=sys.stderr)
+    sys.exit(1)
+HEARTBEATS = THROTTLING["heartbeats"] if THROTTLING else None
+# Limpeza dos itens de workflows excluídos/arquivados depois do prazo ([CLEANUP] ENABLED)
+try:
+    CLEANUP = config_limpeza(config)
+except ValueError as e:
+    print(f"Erro: {e}", file=sys.stderr)
+    sys.exit(1)
+# Item n8n.collector.staleness do modo de custo limitado ([BUDGET] ENABLED)
+BUDGET = config_orcamento(config) is not None
+# Chamadas simultâneas à API do Zabbix ao aplicar as mudanças (1 = serial)
+WORKERS = int(discovery_config.get('WORKERS', 1))
+# Medições da própria descoberta e itens n8n.monitor[*] ([INSTRUMENTATION] ENABLED)
+INSTRUMENTACAO.configurar(config, "descoberta")
+
+# Sessão keep-alive reaproveitada por todas as chamadas da execução
+zabbix_client = ClienteZabbix(zabbix_config['API_URL'], zabbix_config['AUTH_TOKEN'],
+                              ClienteHttp.da_configuracao(zabbix_config, pool_size=max(10, WORKERS)))
 
 def zabbix_api_request(method, params):
-    headers = {
-        'Authorization': f'Bearer {zabbix_config['AUTH_TOKEN']}',
-        'Content-Type': 'application/json'
-    }
-    payload = {
-        "jsonrpc": "2.0",
-        "method": method,
-        "params": params,
-        "id": 1 # ID da requisicao
-    }
-    url = zabbix_config['API_URL']
-    try:
-        response = requests.post(url, headers=headers, json=payload, timeout=500.0)
-        response.raise_for_status()
-        result = response.json()
-        if 'error' in result:
-            print(f"Erro na API do Zabbix ({method}): {result['error']['data']}", file=sys.stderr)
-            return None
-        return result.get('result')
-    except requests.exceptions.RequestException as e:
-        print(f"Erro de rede ao chamar API Zabbix ({method}): {e}", file=sys.stderr)
-        return None
-    except KeyError:
-        print(f"Erro: Resposta inesperada da API do Zabbix para {method}.", file=sys.stderr)
-        return None
+    return zabbix_client.chamar(method, params)
 
 # Obtem a interfaceid associada ao host
 def zabbix_get_interface_id(hostid):
@@ -70,86 +144,40 @@ def zabbix_get_hostname(hostid):
     resultado = zabbix_api_request("host.get", params)
     return resultado[0]['name']
 
-# Cria ou atualiza um item no zabbix
-def zabbix_create_item(params):
-    """Cria ou atualiza um item no Zabbix."""
-
-    # Verifica se o item já existe
-    existing_items = zabbix_api_request("item.get", {
-        "output": ["itemid", "name", "key_"],
-        "hostids": params['hostid'],
-        "filter": {"key_": params['key_']}
-    })
-
-    if existing_items:
-        # Se o item existe, atualiza-o
-        item_id = existing_items[0]['itemid']
-        params.pop("hostid", None)
-        params["itemid"] = item_id
-        update_response = zabbix_api_request("item.update", params)
-        if update_response:
-            print(f"Item atualizado: {update_response['itemids'][0]} - {params['name']} (Key: {params['key_']})")
-            return update_response['itemids'][0]
-        else:
-            print(f"Falha ao atualizar item: {update_response['itemids'][0]} - {params['name']} (Key: {params['key_']})", file=sys.stderr)
-            return None
-    else:
-        # Se o item não existe, cria-o
-        print("Cria")
-        create_response = zabbix_api_request("item.create", params)
-        if create_response:
-            print(f"Item criado: {params['name']} (Key: {params['key_']})")
-            return create_response['itemids'][0]
-        else:
-            print(f"Falha ao criar item: {params['name']} (Key: {params['key']})", file=sys.stderr)
-            return None
-
-# Cria ou atualiza as triggers
-def zabbix_create_trigger(trigger_params):
-    """Cria ou atualiza uma trigger no Zabbix."""
-    # Verifica se a trigger já existe
-    existing_triggers = zabbix_api_request("trigger.get", {
-        "output": ["triggerid", "description"],
-        "filter": {"description": trigger_params['description']}
-    })
-    if existing_triggers:
-        trigger_id = existing_triggers[0]['triggerid']
-        trigger_params['triggerid'] = trigger_id
-        update_response = zabbix_api_request("trigger.update", trigger_params)
-        # if update_response:
-        #     print(f"Trigger atualizada: '{trigger_name}'")
-        return update_response
-    else:
-        create_response = zabbix_api_request("trigger.create", trigger_params)
-        return create_response
-
 # --- Funções de Banco de Dados ---
-def get_workflows_from_db():
-    """Busca todos os workflows ativos do banco de dados SQLite."""
+def get_db_connection():
+    """Cria e retorna uma conexão com o banco de dados PostgreSQL do n8n."""
+    return conectar(
+        host=n8n_config['DB_POSTGRESDB_HOST'],
+        port=n8n_config['DB_POSTGRESDB_PORT'],
+        database=n8n_config['DB_POSTGRESDB_DATABASE'],
+        user=n8n_config['DB_POSTGRESDB_USER'],
+        password=n8n_config['DB_POSTGRESDB_PASSWORD']
+    )
+
+def get_workflows_from_db(desde=None):
+    """Busca os workflows do banco de dados PostgreSQL, inclusive os arquivados.
+
+    Com `desde` (datetime), retorna só os alterados a partir dessa data.
+    """
     workflows_data = []
     conn = None
     try:
-        # Extrai os dados de conexão do arquivo de configuração
-        db_host = n8n_config['DB_POSTGRESDB_HOST']
-        db_port = n8n_config['DB_POSTGRESDB_PORT']
-        db_database = n8n_config['DB_POSTGRESDB_DATABASE']
-        db_user = n8n_config['DB_POSTGRESDB_USER']
-        db_password = n8n_config['DB_POSTGRESDB_PASSWORD']
-
-        # Conecta ao banco de dados PostgreSQL
-        conn = psycopg2.connect(
-            host=db_host,
-            port=db_port,
-            database=db_database,
-            user=db_user,
-            password=db_password
-        )
+        conn = get_db_connection()
         cursor = conn.cursor()
-        cursor.execute("""
-            SELECT id, name, active, "updatedAt", "isArchived"
-            FROM n8n.workflow_entity
-            WHERE "isArchived" = false
-        """)
+        if desde is None:
+            cursor.execute("""
+                SELECT id, name, active, "updatedAt", "isArchived"
+                FROM n8n.workflow_entity
+            """)
+        else:
+            # >= para não perder alterações no mesmo milissegundo da marca d'água;
+            # o hash dos parâmetros evita reprovisionar o que já foi processado
+            cursor.execute("""
+                SELECT id, name, active, "updatedAt", "isArchived"
+                FROM n8n.workflow_entity
+                WHERE "updatedAt" >= %s
+            """, (desde,))
         rows = cursor.fetchall()
 
         for row in rows:
@@ -163,210 +191,307 @@ def get_workflows_from_db():
         return workflows_data
     except psycopg2.Error as e:
         print(f"Erro ao acessar o banco de dados PostgreSQL: {e}", file=sys.stderr)
-        return []
+        return None
+    finally:
+        if conn:
+            conn.close()
+
+def get_workflow_ids_from_db():
+    """Conjunto de ids de todos os workflows, para detectar os excluídos."""
+    conn = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT id FROM n8n.workflow_entity")
+        return {row[0] for row in cursor.fetchall()}
+    except psycopg2.Error as e:
+        print(f"Erro ao acessar o banco de dados PostgreSQL: {e}", file=sys.stderr)
+        return None
     finally:
         if conn:
             conn.close()
 
+# --- Fonte alternativa: API REST do n8n ---
+def get_workflows_from_api(desde=None):
+    """Busca os workflows pela API do n8n (SOURCE = api em [DISCOVERY]).
+
+    Retorna (workflows alterados desde `desde`, ids de todos os workflows), no
+    mesmo formato de get_workflows_from_db, ou (None, None) em caso de erro.
+    A API não filtra por updatedAt: a lista completa é percorrida página a
+    página e filtrada aqui.
+    """
+    http = ClienteHttp.da_configuracao(n8n_config)
+    cache = CachePaginas(discovery_config.get('API_CACHE_FILE')) if discovery_config.get('API_CACHE_FILE') else None
+    workflows_data = []
+    ids = set()
+    try:
+        for wf in iterar_workflows(http, n8n_config.get('N8N_URL', 'http://localhost:5678'),
+                                   n8n_config['N8N_API_KEY'],
+                                   page_size=int(discovery_config.get('API_PAGE_SIZE', PAGE_SIZE_PADRAO)),
+                                   cache=cache):
+            ids.add(wf['id'])
+            atualizado = data_api(wf.get('updatedAt'))
+            if desde is not None and atualizado is not None and atualizado < desde:
+                continue
+            workflows_data.append({
+                'id': wf['id'],
+                'name': wf.get('name'),
+                'active': wf.get('active', False),
+                'updatedAt': atualizado,
+                'isArchived': wf.get('isArchived', False)
+            })
+        if cache is not None:
+            cache.salvar()
+        return workflows_data, ids
+    except KeyError:
+        print("Erro: N8N_API_KEY não definido na seção [N8N] do arquivo de configuração.", file=sys.stderr)
+        return None, None
+    except (requests.exceptions.RequestException, ValueError) as e:
+        print(f"Erro ao acessar a API do n8n: {e}", file=sys.stderr)
+        return None, None
+    finally:
+        http.fechar()
+
+def carregar_workflows(desde=None):
+    """Workflows alterados desde `desde` (todos se None) e ids de todos, da fonte configurada."""
+    if DISCOVERY_SOURCE == "api":
+        return get_workflows_from_api(desde)
+    workflows = get_workflows_from_db(desde)
+    if workflows is None:
+        return None, None
+    if desde is None:
+        return workflows, {wf['id'] for wf in workflows}
+    return workflows, get_workflow_ids_from_db()
+
 # --- Lógica Principal ---
-def main():
-    workflows = get_workflows_from_db()
+def parse_args():
+    parser = argparse.ArgumentParser(description="Cria/atualiza no Zabbix os itens e triggers dos workflows do n8n.")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="apenas mostra o plano de mudanças, sem alterar nada no Zabbix")
+    parser.add_argument("--full", action="store_true",
+                        help="ignora o estado local e compara todos os workflows com o Zabbix")
+    parser.add_argument("--stats", action="store_true",
+                        help="mostra ao final a latência das chamadas à API do Zabbix por método")
+    parser.add_argument("--workers", type=int, default=WORKERS,
+                        help="workflows provisionados em paralelo (padrão: [DISCOVERY] WORKERS ou 1)")
+    # Lida antes (instancia_da_linha_de_comando); declarada aqui só para o --help
+    parser.add_argument("--instance", metavar="NOME",
+                        help="só a seção [N8N:NOME] (padrão: todas as instâncias, em paralelo)")
+    return parser.parse_args()
+
+def renderizar_workflow(wf, host_id, host_interface_id, hostname, master_itemid=None):
+    """Itens e triggers desejados de um workflow."""
+    workflow_id = wf['id']
+    workflow_name = wf['name'] if wf['name'] else f"Workflow_{workflow_id}"
+    itens = itens_workflow(workflow_id, workflow_name, host_id, host_interface_id,
+                           ITEM_MODE, zabbix_config.get('SENDER_ALLOWED_HOSTS'), DURATION_HISTOGRAM, master_itemid,
+                           ERROR_WINDOWS, QUEUE_LIMITS is not None, FAILURES, HEARTBEATS, BASELINE is not None)
+    triggers = triggers_workflow(workflow_id, workflow_name, hostname, QUEUE_LIMITS, FAILURES, LIMITE_ESCORE)
+    return itens, triggers
+
+def provisionar_monitor(host_id, host_interface_id, args):
+    """Cria/atualiza os itens do host (n8n.monitor[*], n8n.collector.staleness); devolve os lotes com falha."""
+    itens = []
+    if INSTRUMENTACAO.ativa:
+        itens.extend(itens_monitor(host_id, host_interface_id, ITEM_MODE, zabbix_config.get('SENDER_ALLOWED_HOSTS')))
+    if BUDGET:
+        itens.append(item_defasagem(host_id, host_interface_id, ITEM_MODE, zabbix_config.get('SENDER_ALLOWED_HOSTS')))
+    existentes = buscar_itens_existentes(zabbix_api_request, host_id, [item['key_'] for item in itens])
+    if existentes is None:
+        print("Erro: não foi possível ler os itens n8n.monitor e n8n.collector do host no Zabbix.", file=sys.stderr)
+        return 1
+    plano = planejar(itens, [], existentes, {})
+    for params in plano.criar_itens:
+        print(f"+ item    {params['key_']} - {params['name']}")
+    for chave, atualizacao, _ in plano.atualizar_itens:
+        print(f"~ item    {chave} ({', '.join(c for c in atualizacao if c != 'itemid')})")
+    if args.dry_run or plano.vazio():
+        return 0
+    return aplicar_plano(plano, zabbix_api_request, zabbix_config.getint('API_BATCH_SIZE', LOTE_PADRAO))
+
+def imprimir_projecao_descarte(estado_workflows):
+    """Resumo do --dry-run: valores por segundo gravados no Zabbix sem e com o descarte de inalterados."""
+    ativos = sum(1 for info in estado_workflows.values() if not info.get("isArchived") and not info.get("removido"))
+    heartbeats = HEARTBEATS or HEARTBEATS_PADRAO
+    definicoes = definicoes_workflow(DURATION_HISTOGRAM, ERROR_WINDOWS, QUEUE_LIMITS is not None, FAILURES,
+                                     BASELINE is not None)
+    imprimir_projecao(projecao(definicoes, ativos, ITEM_MODE, heartbeats, METRICS_INTERVAL), ativos, heartbeats)
+
+def provisionar(args):
     host_id = zabbix_config['HOST_ID']
-    host_interface_id = zabbix_get_interface_id(host_id)
-    hostname = zabbix_get_hostname(host_id)
-
-    if not workflows:
-        print("Nenhum workflow encontrado no banco de dados ou erro ao acessá-lo.", file=sys.stderr)
+    caminho_estado = discovery_config.get('STATE_FILE', STATE_FILE_PADRAO)
+
+    # Mudou o host, o tipo ou o conjunto de itens: o estado salvo não vale mais
+    contexto = {"host_id": host_id, "item_mode": ITEM_MODE,
+                "trapper_hosts": zabbix_config.get('SENDER_ALLOWED_HOSTS', ''),
+                "acoes": ",".join(acoes_provisionadas(DURATION_HISTOGRAM, ERROR_WINDOWS, QUEUE_LIMITS is not None,
+                                                     FAILURES, BASELINE is not None))}
+    if ITEM_MODE == "dependent":
+        contexto["metrics_interval"] = METRICS_INTERVAL
+    if INSTRUMENTACAO.ativa:
+        contexto["monitor"] = True
+    if BUDGET:
+        contexto["budget"] = True
+    if QUEUE_LIMITS:
+        contexto["fila"] = QUEUE_LIMITS
+    if BASELINE:
+        contexto["limite_escore"] = LIMITE_ESCORE
+    if HEARTBEATS:
+        contexto["descarte"] = HEARTBEATS
+    estado = carregar_estado(caminho_estado)
+    completo = args.full or estado["watermark"] is None or any(estado["contexto"].get(k) != v for k, v in contexto.items())
+    if completo:
+        # Datas de exclusão/arquivamento e limpeza continuam valendo para o prazo da limpeza
+        anteriores = estado["workflows"]
+        estado = estado_vazio()
+        for workflow_id, info in anteriores.items():
+            marcas = {campo: info[campo] for campo in CAMPOS_LIMPEZA if campo in info}
+            if marcas:
+                estado["workflows"][workflow_id] = marcas
+
+    if completo:
+        workflows, ids_atuais = carregar_workflows()
+        if not workflows:
+            print("Nenhum workflow encontrado no banco de dados ou erro ao acessá-lo.", file=sys.stderr)
+            return
+        # Itens trapper não usam interface; hosts só com trapper podem nem ter uma
+        contexto["interfaceid"] = zabbix_get_interface_id(host_id) if ITEM_MODE != "trapper" else None
+        contexto["hostname"] = zabbix_get_hostname(host_id)
+        if ITEM_MODE == "dependent":
+            contexto["master_itemid"] = garantir_item(
+                zabbix_api_request, item_mestre(host_id, contexto["interfaceid"], METRICS_INTERVAL), args.dry_run)
+            if contexto["master_itemid"] is None and not args.dry_run:
+                print("Erro: não foi possível criar/atualizar o item mestre no Zabbix.", file=sys.stderr)
+                sys.exit(1)
+        if (INSTRUMENTACAO.ativa or BUDGET) and provisionar_monitor(host_id, contexto["interfaceid"], args):
+            sys.exit(1)
+    else:
+        workflows, ids_atuais = carregar_workflows(datetime.fromisoformat(estado["watermark"]))
+        if workflows is None or ids_atuais is None:
+            sys.exit(1)
+        contexto["interfaceid"] = estado["contexto"].get("interfaceid")
+        contexto["hostname"] = estado["contexto"]["hostname"]
+        contexto["master_itemid"] = estado["contexto"].get("master_itemid")
+
+    agora = datetime.now(timezone.utc).isoformat()
+    estado_workflows = estado["workflows"]
+
+    # Excluídos do n8n: só registra; a limpeza dos itens fica para depois do prazo de [CLEANUP]
+    removidos = [wid for wid, info in estado_workflows.items() if wid not in ids_atuais and not info.get("removido")]
+    for workflow_id in removidos:
+        estado_workflows[workflow_id]["removido"] = agora
+
+    pendentes = []
+    arquivados = []
+    for wf in workflows:
+        anterior = estado_workflows.get(wf['id'], {})
+        atualizado = wf['updatedAt'].isoformat() if wf['updatedAt'] else None
+        info = dict(anterior, name=wf['name'], updatedAt=atualizado, isArchived=bool(wf['isArchived']))
+        info.pop("removido", None)
+        estado_workflows[wf['id']] = info
+        if wf['isArchived']:
+            if not anterior.get("isArchived"):
+                arquivados.append(wf['id'])
+            info.setdefault("arquivado", agora)
+            continue
+        info.pop("arquivado", None)
+        itens, triggers = renderizar_workflow(wf, host_id, contexto["interfaceid"], contexto["hostname"],
+                                              contexto.get("master_itemid"))
+        hash_atual = hash_parametros(itens, triggers)
+        if info.get("limpo"):
+            # Voltou depois da limpeza: recria ou reativa os itens desativados (a marca só sai
+            # quando o provisionamento dá certo, abaixo)
+            for item in itens:
+                item["status"] = 0
+        # Alterações que não mudam nome/id (ex.: nós do workflow) não tocam o Zabbix
+        if not completo and anterior.get("hash") == hash_atual and not anterior.get("isArchived"):
+            continue
+        info["hash"] = None
+        pendentes.append((wf['id'], itens, triggers, hash_atual))
+
+    print(f"Workflows lidos: {len(workflows)}; a provisionar: {len(pendentes)}; "
+          f"arquivados: {len(arquivados)}; removidos: {len(removidos)}.")
+
+    if CLEANUP:
+        # Falhas da limpeza não seguram a marca d'água: o workflow só fica "limpo" quando ela dá certo
+        limpar(zabbix_api_request, host_id, estado_workflows, ids_atuais, CLEANUP, agora, completo,
+               zabbix_config.getint('API_BATCH_SIZE', LOTE_PADRAO), args.dry_run)
+
+    falhas = 0
+    if pendentes:
+        itens_desejados = [item for _, itens, _, _ in pendentes for item in itens]
+        triggers_desejadas = [trigger for _, _, triggers, _ in pendentes for trigger in triggers]
+
+        if completo:
+            # Estado atual: uma chamada para todos os itens e outra para todas as triggers
+            itens_existentes = buscar_itens_existentes(zabbix_api_request, host_id)
+            triggers_existentes = buscar_triggers_existentes(zabbix_api_request, host_id)
+        else:
+            # Só os itens dos workflows alterados e as triggers que dependem deles
+            itens_existentes = buscar_itens_existentes(zabbix_api_request, host_id,
+                                                       [item['key_'] for item in itens_desejados])
+            triggers_existentes = None
+            if itens_existentes is not None:
+                triggers_existentes = buscar_triggers_existentes(
+                    zabbix_api_request, host_id, [item['itemid'] for item in itens_existentes.values()])
+        if itens_existentes is None or triggers_existentes is None:
+            print("Erro: não foi possível ler os itens/triggers atuais do host no Zabbix.", file=sys.stderr)
+            sys.exit(1)
+
+        plano = planejar(itens_desejados, triggers_desejadas, itens_existentes, triggers_existentes)
+        imprimir_plano(plano, detalhado=args.dry_run)
+        if args.dry_run:
+            imprimir_projecao_descarte(estado_workflows)
+            return
+        if not plano.vazio():
+            limitador = LimitadorTaxa(float(discovery_config.get('API_RATE_LIMIT', 0)))
+            falhas = aplicar_plano(plano, zabbix_api_request, zabbix_config.getint('API_BATCH_SIZE', LOTE_PADRAO),
+                                   args.workers, limitador)
+
+        for workflow_id, itens, triggers, hash_atual in pendentes:
+            ids_itens = {item['key_']: plano.ids_itens.get(item['key_']) for item in itens}
+            ids_triggers = {t['expression']: plano.ids_triggers.get(t['expression']) for t in triggers}
+            info = estado_workflows[workflow_id]
+            if info.get("limpo") and falhas:
+                # O item.update que reativa os itens pode ter falhado: tenta de novo na próxima execução
+                continue
+            if all(ids_itens.values()) and all(ids_triggers.values()):
+                info.update(hash=hash_atual, itemids=ids_itens, triggerids=ids_triggers)
+                info.pop("limpo", None)
+    elif args.dry_run:
+        imprimir_projecao_descarte(estado_workflows)
         return
 
-    for wf in workflows:
-        workflow_id = wf['id']
-        workflow_name = wf['name'] if wf['name'] else f"Workflow_{workflow_id}"
-
-        # Cria ou atualiza o item 'Status'
-        if wf['isArchived'] == 0:
-            """Cria ou atualiza o item com o status de execucao do workflow."""
-            params = {
-                "name": f"Workflow - {workflow_name} - Status Execução",
-                "key_": f"n8n.workflow.execution.status[{workflow_id}]",
-                "type": 0,  # Zabbix Agent (passive) para que o Zabbix colete o valor
-                "value_type": 3,
-                "interfaceid": host_interface_id,
-                "hostid": host_id,
-                "delay": "60s",
-                "history": "90d",
-                "trends": "400d",
-                "preprocessing": {"type": 5, "params": "(\\d+)\n\\1", "error_handler": 0},
-                "description": "Coleta qual o status das execuções do workflow."
-                               "\n\n***Não altere este item no Zabbix o item é gerado/atualizado automaticamente via script***.",
-                "tags": {"tag": "component", "value": "Cron"}
-            }
-            zabbix_create_item(params)
-
-            trigger_params = {
-                "description": f"Workflow {workflow_name} falhou",
-                "expression": f"last(/{hostname}/n8n.workflow.execution.status[{workflow_id}])>0",
-                "priority": 4,
-                "status": 0,
-                "recovery_mode": 0,
-                "manual_close": 1,
-                "comments": "A trigger irá ficar ativa caso haja pelo menos 1 erro de execução dentro das últimas 24h "
-                            "e irá desativar automaticamente após 24h do último erro."
-                            "\n\n***Não altere este item no Zabbix o item é gerado/atualizado automaticamente via script***."
-            }
-            print(zabbix_create_trigger(trigger_params))
-            ###########################################################################################################
-            """Cria ou atualiza o item de status do workflow"""
-            params = {
-                "name": f"Workflow - {workflow_name} - Status",
-                "key_": f"n8n.workflow.status[{workflow_id}]",
-                "type": 0,  # Zabbix Agent (passive) para que o Zabbix colete o valor
-                "value_type": 3,
-                "interfaceid": host_interface_id,
-                "hostid": host_id,
-                "delay": "60s",
-                "history": "90d",
-                "trends": "400d",
-                "preprocessing": {"type": 5, "params": "(\\d+)\n\\1", "error_handler": 0},
-                "description": "Coleta se o workflow está ativo ou não."
-                               "\n\n***Não altere este item no Zabbix o item é gerado/atualizado automaticamente via script***.",
-                "tags": {"tag": "component", "value": "Cron"}
-            }
-            zabbix_create_item(params)
-            ###########################################################################################################
-            """Cria ou atualiza o item de isArchived"""
-            params = {
-                "name": f"Workflow - {workflow_name} - Arquivado",
-                "key_": f"n8n.workflow.is.archived[{workflow_id}]",
-                "type": 0,  # Zabbix Agent (passive) para que o Zabbix colete o valor
-                "value_type": 3,
-                "interfaceid": host_interface_id,
-                "hostid": host_id,
-                "delay": "60s",
-                "history": "90d",
-                "trends": "400d",
-                "preprocessing": {"type": 5, "params": "(\\d+)\n\\1", "error_handler": 0},
-                "description": "Coleta se o workflow foi arquivado. Workflows arquivados significam que não devem ser mais "
-                               "monitorados, desative ou exclua todos os itens deste workflow para que não haja alarmes."
-                               "\n\n***Não altere este item no Zabbix o item é gerado/atualizado automaticamente via script***.",
-                "tags": {"tag": "component", "value": "Cron"}
-            }
-            zabbix_create_item(params)
-
-            trigger_params = {
-                "description": f"Workflow {workflow_name} foi Arquivado",
-                "expression": f"change(/{hostname}/n8n.workflow.is.archived[{workflow_id}])<>0",
-                "priority": 1,
-                "status": 0,
-                "recovery_mode": 2,
-                "manual_close": 1,
-                "comments": "Se esta trigger estiver ligada significa que o workflow foi arquivado no n8n, caso seja porque "
-                            "o workflow não será mais utilizado, desative ou exclua todos os itens deste workflow. "
-                            "Esta trigger não desativa sozinha, deve ser feita pelo reconhecimento do alarme."
-                            "\n\n***Não altere este item no Zabbix o item é gerado/atualizado automaticamente via script***."
-            }
-            print(zabbix_create_trigger(trigger_params))
-            ###########################################################################################################
-            """Cria ou atualiza o item 'updatedAt'"""
-            params = {
-                "name": f"Workflow - {workflow_name} - Update",
-                "key_": f"n8n.workflow.update[{workflow_id}]",
-                "type": 0,  # Zabbix Agent (passive) para que o Zabbix colete o valor
-                "value_type": 3,
-                "interfaceid": host_interface_id,
-                "hostid": host_id,
-                "units": "unixtime",
-                "delay": "60s",
-                "history": "90d",
-                "trends": "400d",
-                "description": "Coleta a data da última alteração do workflow."
-                                "\n\n***Não altere este item no Zabbix o item é gerado/atualizado automaticamente via script***.",
-                "tags": {"tag": "component", "value": "Cron"}
-            }
-            zabbix_create_item(params)
-
-            trigger_params = {
-                "description": f"Workflow {workflow_name} foi alterado",
-                "expression": f"change(/{hostname}/n8n.workflow.update[{workflow_id}])<>0",
-                "priority": 1,
-                "status": 0,
-                "recovery_mode": 2,
-                "manual_close": 1,
-                "comments": "Esta trigger ativa se a data da última alteração do workflow foi alterado. É mais um aviso "
-                            "para ciência de que houve alterações. Ela não desativa sozinha, sendo necessário ação manual. "
-                            "Recomenda-se descrever as alterações para referência futura."
-                            "\n\n***Não altere este item no Zabbix o item é gerado/atualizado automaticamente via script***."
-            }
-            print(zabbix_create_trigger(trigger_params))
-            ###########################################################################################################
-            """Cria ou atualiza o item com o tempo médio de execução do workflow."""
-            params = {
-                "name": f"Workflow - {workflow_name} - Tempo médio",
-                "key_": f"n8n.workflow.average.time[{workflow_id}]",
-                "type": 0,  # Zabbix Agent (passive) para que o Zabbix colete o valor
-                "value_type": 0,
-                "interfaceid": host_interface_id,
-                "hostid": host_id,
-                "units": "s",
-                "delay": "300s",
-                "history": "90d",
-                "trends": "400d",
-                "description": "Coleta o tempo médio de execução dos últimos ."
-                               "\n\n***Não altere este item no Zabbix o item é gerado/atualizado automaticamente via script***.",
-                "tags": {"tag": "component", "value": "Cron"}
-            }
-            zabbix_create_item(params)
-
-            ###########################################################################################################
-            """Cria ou atualiza o item com o tempo máximo de execução do workflow."""
-            params = {
-                "name": f"Workflow - {workflow_name} - Tempo máximo",
-                "key_": f"n8n.workflow.max.time[{workflow_id}]",
-                "type": 0,  # Zabbix Agent (passive) para que o Zabbix colete o valor
-                "value_type": 0,
-                "interfaceid": host_interface_id,
-                "hostid": host_id,
-                "units": "s",
-                "delay": "300s",
-                "history": "90d",
-                "trends": "400d",
-                "description": "Coleta o tempo máximo de execução dos últimos 10min ."
-                               "\n\n***Não altere este item no Zabbix o item é gerado/atualizado automaticamente via script***.",
-                "tags": {"tag": "component", "value": "Cron"}
-            }
-            zabbix_create_item(params)
+    # Só avança a marca d'água se tudo foi aplicado; senão os pendentes voltam na próxima execução
+    datas = [wf['updatedAt'] for wf in workflows if wf['updatedAt']]
+    if datas and not falhas:
+        maior = max(datas)
+        if estado["watermark"]:
+            maior = max(maior, datetime.fromisoformat(estado["watermark"]))
+        estado["watermark"] = maior.isoformat()
+    estado["contexto"] = contexto
+    salvar_estado(caminho_estado, estado)
+
+def imprimir_resumo_execucao(duracao):
+    """Tempo total, chamadas por segundo e erros da API do Zabbix na execução."""
+    contadores = zabbix_client.http.resumo().values()
+    chamadas = sum(dados["chamadas"] for dados in contadores)
+    erros = sum(dados["erros"] for dados in contadores) + zabbix_client.erros_api
+    taxa = chamadas / duracao if duracao > 0 else 0.0
+    print(f"Tempo total: {duracao:.2f} s; chamadas à API do Zabbix: {chamadas} ({taxa:.1f}/s); erros: {erros}.",
+          file=sys.stderr)
+
+def main():
+    args = parse_args()
+    inicio = time.monotonic()
+    try:
+        provisionar(args)
+    finally:
+        if args.stats:
+            zabbix_client.http.imprimir_resumo("API Zabbix")
+        imprimir_resumo_execucao(time.monotonic() - inicio)
+        INSTRUMENTACAO.registrar_http(zabbix_client.http)
+        zabbix_client.http.fechar()
 
 if __name__ == "__main__":
     main()
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
@@ -0,0 +1,127 @@
+"""Leitura dos workflows pela API REST pública do n8n (/api/v1/workflows).
+
+Segue o nextCursor página a página, entregando os workflows conforme chegam
+(memória proporcional a uma página), e pode reaproveitar páginas inalteradas
+com If-None-Match quando o n8n (ou um proxy na frente dele) devolve ETag.
+"""
+
+import json
+import os
+import sys
+import tempfile
+from datetime import datetime
+
+PAGE_SIZE_PADRAO = 100
+# Limite da API pública do n8n por página
+PAGE_SIZE_MAXIMO = 250
+
+
+def limpar_valor(valor):
+    """Remove comentário na mesma linha (ex.: 'http://localhost:5678 # ...')."""
+    return valor.split(" #", 1)[0].strip() if valor else valor
+
+
+class CachePaginas:
+    """Cache local das páginas com ETag, indexado pela URL completa da página."""
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self.paginas = {}
+        self.usadas = {}
+        if caminho:
+            try:
+                with open(caminho, encoding="utf-8") as arquivo:
+                    self.paginas = json.load(arquivo)
+            except (OSError, ValueError):
+                self.paginas = {}
+
+    def etag(self, chave):
+        return self.paginas.get(chave, {}).get("etag")
+
+    def corpo(self, chave):
+        return self.paginas[chave]["corpo"]
+
+    def guardar(self, chave, etag, corpo):
+        self.usadas[chave] = {"etag": etag, "corpo": corpo}
+
+    def reaproveitar(self, chave):
+        self.usadas[chave] = self.paginas[chave]
+
+    def salvar(self):
+        """Grava só as páginas vistas nesta execução (descarta cursores antigos)."""
+        if not self.caminho:
+            return
+        diretorio = os.path.dirname(self.caminho) or "."
+        os.makedirs(diretorio, exist_ok=True)
+        fd, temporario = tempfile.mkstemp(dir=diretorio, prefix=".cache-")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as arquivo:
+                json.dump(self.usadas, arquivo)
+            os.replace(temporario, self.caminho)
+        except BaseException:
+            os.unlink(temporario)
+            raise
+
+
+def iterar_workflows(http, base_url, api_key, ativos=None, page_size=PAGE_SIZE_PADRAO, cache=None):
+    """Gera os workflows da API seguindo nextCursor.
+
+    `http` é um n8n_http.ClienteHttp. Levanta requests.exceptions.RequestException
+    (ou ValueError para JSON inválido) se alguma página falhar.
+    """
+    url = f"{limpar_valor(base_url).rstrip('/')}/api/v1/workflows"
+    headers = {'accept': 'application/json', 'X-N8N-API-KEY': api_key}
+    params = {"limit": min(int(page_size), PAGE_SIZE_MAXIMO), "excludePinnedData": "true"}
+    if ativos is not None:
+        params["active"] = "true" if ativos else "false"
+
+    cursor = None
+    while True:
+        if cursor:
+            params["cursor"] = cursor
+        chave = json.dumps([url, sorted(params.items())])
+        headers_pagina = dict(headers)
+        if cache is not None and cache.etag(chave):
+            headers_pagina["If-None-Match"] = cache.etag(chave)
+
+        response = http.requisitar("GET", url, "workflows", headers=headers_pagina, params=params)
+        if response.status_code == 304 and cache is not None:
+            corpo = cache.corpo(chave)
+            cache.reaproveitar(chave)
+        else:
+            response.raise_for_status()
+            corpo = response.json()
+            if cache is not None and response.headers.get("ETag"):
+                cache.guardar(chave, response.headers["ETag"], corpo)
+
+        yield from corpo.get("data", [])
+        cursor = corpo.get("nextCursor")
+        if not cursor:
+            break
+
+
+def data_api(valor):
+    """Converte datas ISO da API ('2024-05-01T12:00:00.000Z') em datetime com fuso."""
+    if not valor:
+        return None
+    return datetime.fromisoformat(valor.replace("Z", "+00:00"))
+
+
+def escrever_lld(workflows, saida=sys.stdout):
+    """Escreve o JSON de LLD em streaming: um elemento por vez, sem montar a lista.
+
+    O colchete final só é escrito se todas as páginas chegarem; uma falha no
+    meio deixa o JSON inválido e o Zabbix marca a regra como não suportada em
+    vez de tratar os workflows restantes como removidos.
+    """
+    saida.write("[")
+    primeiro = True
+    total = 0
+    for wf in workflows:
+        elemento = json.dumps({"{#WORKFLOW_ID}": wf['id'], "{#WORKFLOW_NAME}": wf['name']},
+                              indent=4, ensure_ascii=False)
+        saida.write(("\n" if primeiro else ",\n") + "\n".join("    " + linha for linha in elemento.splitlines()))
+        primeiro = False
+        total += 1
+    saida.write("\n]\n" if total else "]\n")
+    return total
@@ -0,0 +1,185 @@
+"""Cache em disco (SQLite) das famílias de métricas para o coletor por workflow.
+
+No modo agent cada item inicia um processo do coletor; workflow_status,
+is_archived e update, por exemplo, leem a mesma linha de workflow_entity em
+conexões separadas. Com [CACHE] ENABLED o primeiro processo que encontra a
+família vencida a renova inteira (todos os workflows, n8n_metricas.FAMILIAS)
+e os demais leem o valor do arquivo.
+
+Política (stale-while-revalidate):
+- dentro do TTL da família o valor é devolvido direto do cache;
+- vencido há menos de MAX_STALE segundos, o valor antigo é devolvido na hora
+  e a renovação roda num processo filho (fork), sem segurar o agente;
+- sem valor ou vencido há mais de MAX_STALE, espera a renovação por até
+  WAIT_SECONDS (abaixo do Timeout do agente); se ela não terminar, devolve o
+  valor antigo, se houver.
+
+Um flock por família garante uma única renovação por vez entre os processos
+do agente. A renovação sempre roda no filho, então um PostgreSQL lento nunca
+prende o processo que responde ao Zabbix além de WAIT_SECONDS.
+"""
+
+import fcntl
+import os
+import sqlite3
+import sys
+import time
+
+CAMINHO_PADRAO = '/var/lib/n8n-by-zabbix/coletas_cache.sqlite'
+TTL_PADRAO = 50
+MAX_STALE_PADRAO = 600
+ESPERA_PADRAO = 2.5
+INTERVALO_ESPERA = 0.05
+
+DDL = """
+CREATE TABLE IF NOT EXISTS familias (
+    familia TEXT PRIMARY KEY,
+    atualizado_em REAL,
+    erro TEXT
+);
+CREATE TABLE IF NOT EXISTS valores (
+    acao TEXT NOT NULL,
+    workflow_id TEXT NOT NULL,
+    valor TEXT NOT NULL,
+    PRIMARY KEY (acao, workflow_id)
+) WITHOUT ROWID;
+"""
+
+SQL_LER = """
+    SELECT f.atualizado_em, f.erro, v.valor
+    FROM familias f LEFT JOIN valores v ON v.acao = ? AND v.workflow_id = ?
+    WHERE f.familia = ?
+"""
+
+
+def config_cache(configs):
+    """Parâmetros da seção [CACHE], ou None se ENABLED não estiver ligado."""
+    if not configs.has_section('CACHE') or not configs['CACHE'].getboolean('ENABLED', False):
+        return None
+    secao = configs['CACHE']
+    ttl = float(secao.get('TTL', TTL_PADRAO))
+    return {
+        "caminho": secao.get('PATH', CAMINHO_PADRAO),
+        # TTL_<FAMILIA> (ex.: TTL_WORKFLOWS = 300) sobrepõe o TTL geral
+        "ttls": {chave[len('ttl_'):]: float(valor) for chave, valor in secao.items()
+                 if chave.startswith('ttl_')},
+        "ttl": ttl,
+        "max_stale": float(secao.get('MAX_STALE', MAX_STALE_PADRAO)),
+        "espera": float(secao.get('WAIT_SECONDS', ESPERA_PADRAO)),
+    }
+
+
+class CacheColetas:
+    """Acesso ao arquivo SQLite do cache; uma instância por processo."""
+
+    def __init__(self, caminho, ttl=TTL_PADRAO, ttls=None, max_stale=MAX_STALE_PADRAO, espera=ESPERA_PADRAO):
+        self.caminho = caminho
+        self.ttl = ttl
+        self.ttls = ttls or {}
+        self.max_stale = max_stale
+        self.espera = espera
+        self._conn = None
+
+    def conexao(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.caminho, timeout=self.espera, isolation_level=None)
+            # WAL: leitores não esperam a gravação de uma renovação
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(DDL)
+        return self._conn
+
+    def ttl_familia(self, familia):
+        return self.ttls.get(familia, self.ttl)
+
+    def ler(self, familia, acao, workflow_id):
+        """(valor, atualizado_em, último erro); atualizado_em None se a família nunca foi carregada."""
+        linha = self.conexao().execute(SQL_LER, (acao, workflow_id, familia)).fetchone()
+        if linha is None:
+            return None, None, None
+        atualizado_em, erro, valor = linha
+        # Família carregada sem linha para o workflow: mesmo padrão 0 do coletor
+        return (valor if valor is not None else "0"), atualizado_em, erro
+
+    def gravar(self, familia, dados):
+        """Substitui todos os valores da família ({acao: {workflow_id: valor}})."""
+        conn = self.conexao()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for acao, valores in dados.items():
+                conn.execute("DELETE FROM valores WHERE acao = ?", (acao,))
+                conn.executemany("INSERT INTO valores (acao, workflow_id, valor) VALUES (?, ?, ?)",
+                                 ((acao, workflow_id, str(valor)) for workflow_id, valor in valores.items()))
+            conn.execute("INSERT INTO familias (familia, atualizado_em, erro) VALUES (?, ?, NULL) "
+                         "ON CONFLICT (familia) DO UPDATE SET atualizado_em = excluded.atualizado_em, erro = NULL",
+                         (familia, time.time()))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def registrar_erro(self, familia, erro):
+        self.conexao().execute("INSERT INTO familias (familia, erro) VALUES (?, ?) "
+                               "ON CONFLICT (familia) DO UPDATE SET erro = excluded.erro", (familia, erro))
+
+    def travar(self, familia):
+        """Tenta o flock exclusivo da família sem bloquear; devolve o fd ou None."""
+        fd = os.open(f"{self.caminho}.{familia}.lock", os.O_CREAT | os.O_RDWR, 0o660)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return None
+        return fd
+
+    def revalidar(self, familia, renovar):
+        """Renova a família num processo filho, se ninguém estiver renovando.
+
+        O filho herda o flock e se desliga do stdout/stderr do agente, que
+        senão esperaria o fim da renovação para ler a resposta.
+        """
+        fd = self.travar(familia)
+        if fd is None:
+            return False
+        sys.stdout.flush()
+        sys.stderr.flush()
+        if os.fork() > 0:
+            os.close(fd)
+            return True
+        try:
+            os.setsid()
+            nulo = os.open(os.devnull, os.O_RDWR)
+            for alvo in (0, 1, 2):
+                os.dup2(nulo, alvo)
+            # Conexão SQLite do pai não pode ser usada depois do fork
+            self._conn = None
+            try:
+                self.gravar(familia, renovar(familia))
+            except Exception as e:
+                self.registrar_erro(familia, str(e).strip())
+        finally:
+            os._exit(0)
+
+    def valor(self, familia, acao, workflow_id, renovar):
+        """Valor da ação para o workflow segundo a política do cache, ou None se indisponível.
+
+        `renovar(familia)` devolve {acao: {workflow_id: valor}} da família
+        para todos os workflows; só é chamada no processo filho.
+        """
+        valor, atualizado_em, erro = self.ler(familia, acao, workflow_id)
+        idade = time.time() - atualizado_em if atualizado_em is not None else None
+        if idade is not None and idade < self.ttl_familia(familia):
+            return valor
+        if erro:
+            print(f"Última renovação do cache ({familia}) falhou: {erro}", file=sys.stderr)
+        self.revalidar(familia, renovar)
+        if idade is not None and idade < self.max_stale:
+            return valor
+
+        limite = time.monotonic() + self.espera
+        while time.monotonic() < limite:
+            time.sleep(INTERVALO_ESPERA)
+            novo, novo_em, _ = self.ler(familia, acao, workflow_id)
+            if novo_em is not None and novo_em != atualizado_em:
+                return novo
+        # Renovação não terminou a tempo: um valor muito antigo ainda é melhor que nenhum
+        return valor if atualizado_em is not None else None
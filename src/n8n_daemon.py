@@ -0,0 +1,303 @@
+"""Daemon residente do coletor: snapshot em memória servido por socket Unix.
+
+Mantém um pool de conexões com o PostgreSQL do n8n, atualiza o snapshot de
+todas as métricas (n8n_metricas.coleta_snapshot) a cada REFRESH_INTERVAL
+segundos e responde, pelo socket, pedidos de uma linha no mesmo formato dos
+argumentos do coletor ("execucao_status <workflow_id>", ou "metrics_json" para
+o JSON do item mestre). A resposta é o valor seguido de quebra de linha, lida
+direto da memória.
+
+Com várias seções [N8N:<nome>] (n8n_instancias) há um ColetorDaemon por
+instância, cada um com o seu pool e o seu intervalo de atualização; o pedido
+escolhe a instância com "@nome" como primeira palavra (sem ela, a primeira).
+
+Com [PROMETHEUS] ENABLED o mesmo snapshot também é servido em HTTP, no
+formato do Prometheus (n8n_prometheus).
+"""
+
+import os
+import signal
+import socketserver
+import sys
+import threading
+import time
+
+import psycopg2
+import psycopg2.pool
+
+from n8n_instancias import instancias, selecionar
+from n8n_janelas import ContadorErros, config_janelas, trava_do_estado
+from n8n_linha_base import LinhaBase, config_linha_base
+from n8n_metricas import ACAO_METRICAS, CHAVES_ITENS, FAMILIAS, coleta_snapshot, metricas_json, valor_metrica
+from n8n_orcamento import (ACAO_DEFASAGEM, ERROS_ORCAMENTO, coleta_limitada, config_orcamento, defasagem,
+                           parametros_conexao, proximo_fator)
+from n8n_prometheus import amostras, config_prometheus, iniciar_servidor
+from n8n_rollup import atualizar_rollup, config_rollup
+
+SOCKET_PATH_PADRAO = '/run/n8n-by-zabbix/coletas.sock'
+REFRESH_INTERVAL_PADRAO = 30
+TAMANHO_MAXIMO_PEDIDO = 1024
+
+
+class ColetorDaemon:
+    """Guarda o snapshot atual e o pool de conexões usado para renová-lo."""
+
+    def __init__(self, n8n_config, intervalo=REFRESH_INTERVAL_PADRAO, pool_size=2, rollup=None, janelas=None,
+                 orcamento=None, prometheus=None, linha_base=None):
+        self.intervalo = intervalo
+        # Parâmetros de [BUDGET] (n8n_orcamento): consultas com orçamento e intervalo adaptativo
+        self.orcamento = orcamento
+        self.fator = 1
+        self.familias = {}
+        # Parâmetros do rollup de execuções (n8n_rollup), ou None para ler execution_entity
+        self.rollup = rollup
+        # Parâmetros de [ERROR_WINDOWS] (n8n_janelas): erros contados em memória em vez da família execucoes
+        self.janelas = janelas
+        self.contador = None
+        if janelas:
+            try:
+                self.contador = ContadorErros.carregar(janelas["caminho"], janelas["janelas"], janelas["atraso"])
+            except ValueError as e:
+                print(f"Erro: {e}; recomeçando a contagem.", file=sys.stderr)
+                self.contador = ContadorErros(janelas["janelas"], janelas["atraso"])
+        # Parâmetros de [DURATION_BASELINE] (n8n_linha_base): desvio da duração de cada workflow
+        self.parametros_linha_base = linha_base
+        self.linha_base = None
+        if linha_base:
+            try:
+                self.linha_base = LinhaBase.carregar(linha_base["caminho"], linha_base)
+            except ValueError as e:
+                print(f"Erro: {e}; recomeçando a linha de base.", file=sys.stderr)
+                self.linha_base = LinhaBase(linha_base)
+        self.pool = psycopg2.pool.ThreadedConnectionPool(
+            1, pool_size,
+            host=n8n_config['DB_POSTGRESDB_HOST'],
+            port=n8n_config['DB_POSTGRESDB_PORT'],
+            database=n8n_config['DB_POSTGRESDB_DATABASE'],
+            user=n8n_config['DB_POSTGRESDB_USER'],
+            password=n8n_config['DB_POSTGRESDB_PASSWORD'],
+            **(parametros_conexao(orcamento) if orcamento else {})
+        )
+        self.snapshot = {}
+        self._json = None
+        # Rótulos fixos das métricas Prometheus ({} ou {"n8n_instance": nome}), ou None sem [PROMETHEUS]
+        self.prometheus = prometheus
+        self.amostras = {}
+        self.atualizado_em = 0.0
+        self.parar = threading.Event()
+
+    def atualizar(self):
+        """Renova o snapshot; em caso de erro mantém o anterior."""
+        familias = [nome for nome in FAMILIAS if nome != "execucoes"] if self.contador else None
+        conn = self.pool.getconn()
+        try:
+            if self.rollup:
+                try:
+                    atualizar_rollup(conn, **self.rollup)
+                except ERROS_ORCAMENTO as e:
+                    if not self.orcamento:
+                        raise
+                    print(f"Atualização do rollup excedeu o orçamento: {str(e).strip()}", file=sys.stderr)
+                    conn.rollback()
+            if self.orcamento:
+                snapshot, self.familias, lento = coleta_limitada(
+                    conn, familias, self.familias, rollup=self.rollup is not None,
+                    limite_lento=self.orcamento["statement_timeout"] / 2000)
+                self.fator = proximo_fator(self.fator, lento, self.orcamento["fator_maximo"])
+            else:
+                snapshot = coleta_snapshot(conn, familias, rollup=self.rollup is not None)
+            if self.contador:
+                try:
+                    self.contador.atualizar(conn, self.janelas["lote"])
+                    snapshot.update(self.contador.contagens())
+                except ERROS_ORCAMENTO as e:
+                    if not self.orcamento:
+                        raise
+                    print(f"Janelas de erros excederam o orçamento: {str(e).strip()}", file=sys.stderr)
+                    conn.rollback()
+                    snapshot.update({acao: self.snapshot[acao] for acao in self.contador.contagens()
+                                     if acao in self.snapshot})
+            if self.linha_base:
+                try:
+                    self.linha_base.atualizar(conn, self.parametros_linha_base["lote"])
+                except ERROS_ORCAMENTO as e:
+                    if not self.orcamento:
+                        raise
+                    print(f"Linha de base da duração excedeu o orçamento: {str(e).strip()}", file=sys.stderr)
+                    conn.rollback()
+                snapshot.update(self.linha_base.escores())
+        except psycopg2.Error as e:
+            print(f"Erro ao acessar o banco de dados PostgreSQL: {e}", file=sys.stderr)
+            # Descarta a conexão: pode ter sido derrubada pelo servidor
+            self.pool.putconn(conn, close=True)
+            return False
+        self.pool.putconn(conn)
+        if self.contador:
+            try:
+                # Mesma trava do bulk/agent (contagens_atualizadas) no mesmo STATE_FILE
+                with trava_do_estado(self.janelas["caminho"]):
+                    self.contador.salvar(self.janelas["caminho"])
+            except OSError as e:
+                print(f"Erro ao gravar o estado das janelas de erros: {e}", file=sys.stderr)
+        if self.linha_base:
+            try:
+                with trava_do_estado(self.parametros_linha_base["caminho"]):
+                    self.linha_base.salvar(self.parametros_linha_base["caminho"])
+            except OSError as e:
+                print(f"Erro ao gravar o estado da linha de base da duração: {e}", file=sys.stderr)
+        # O /metrics renderizado aqui, fora do scrape
+        if self.prometheus is not None:
+            self.amostras = amostras(snapshot, self.prometheus)
+        # Troca a referência inteira: leitores nunca veem um snapshot pela metade
+        self.snapshot = snapshot
+        self.atualizado_em = time.time()
+        return True
+
+    def loop_atualizacao(self):
+        while not self.parar.is_set():
+            inicio = time.monotonic()
+            self.atualizar()
+            # Com [BUDGET], ciclos lentos multiplicam o intervalo (self.fator)
+            self.parar.wait(max(0.0, self.intervalo * self.fator - (time.monotonic() - inicio)))
+
+    def json_metricas(self):
+        """JSON do item mestre, renderizado uma vez por snapshot."""
+        snapshot = self.snapshot
+        renderizado = self._json
+        if renderizado is None or renderizado[0] is not snapshot:
+            renderizado = self._json = (snapshot, metricas_json(snapshot))
+        return renderizado[1]
+
+    def responder(self, pedido):
+        """Responde um pedido "acao [workflow_id]" a partir do snapshot."""
+        partes = pedido.split()
+        if not partes:
+            return "ZBX_NOTSUPPORTED: pedido vazio"
+        acao = partes[0]
+        if acao == "idade":
+            # Segundos desde a última atualização bem-sucedida do snapshot
+            return str(int(time.time() - self.atualizado_em)) if self.atualizado_em else "-1"
+        if acao == ACAO_METRICAS:
+            return self.json_metricas()
+        if acao == ACAO_DEFASAGEM:
+            # Com [BUDGET] famílias canceladas mantêm valores antigos; sem ele, é a idade do snapshot
+            if self.orcamento:
+                return str(defasagem(self.familias))
+            return str(int(time.time() - self.atualizado_em)) if self.atualizado_em else "0"
+        if acao not in CHAVES_ITENS or len(partes) != 2:
+            return f"ZBX_NOTSUPPORTED: pedido inválido '{pedido}'"
+        # Mesmas respostas do modo agent (coleta_janela) para janelas desligadas ou fora de WINDOWS
+        if acao.startswith("errors_") and not self.janelas:
+            return "ZBX_NOTSUPPORTED: [ERROR_WINDOWS] ENABLED desligado"
+        if acao.startswith("errors_") and acao[len("errors_"):] not in self.janelas["janelas"]:
+            return f"ZBX_NOTSUPPORTED: janela '{acao[len('errors_'):]}' fora de [ERROR_WINDOWS] WINDOWS"
+        # Antes da primeira atualização o snapshot está vazio: mantém o 0 de sempre
+        if self.atualizado_em and acao not in self.snapshot:
+            return f"ZBX_NOTSUPPORTED: '{acao}' fora do snapshot do daemon"
+        return str(valor_metrica(self.snapshot, acao, partes[1]))
+
+    def fechar(self):
+        self.parar.set()
+        self.pool.closeall()
+
+
+class PedidoHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        pedido = self.rfile.readline(TAMANHO_MAXIMO_PEDIDO).decode("utf-8", "replace").strip()
+        self.wfile.write((responder(self.server.coletores, pedido) + "\n").encode("utf-8"))
+
+
+def responder(coletores, pedido):
+    """Encaminha o pedido ao coletor da instância "@nome" (ou ao primeiro)."""
+    if pedido.startswith("@"):
+        nome, _, pedido = pedido[1:].partition(" ")
+        if nome not in coletores:
+            return f"ZBX_NOTSUPPORTED: instância desconhecida '{nome}'"
+        return coletores[nome].responder(pedido)
+    return next(iter(coletores.values())).responder(pedido)
+
+
+class SocketServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+
+def criar_coletor(configs, nome=None):
+    """ColetorDaemon de uma instância, com REFRESH_INTERVAL e POOL_SIZE da sua seção [DAEMON]."""
+    daemon_config = configs['DAEMON'] if configs.has_section('DAEMON') else {}
+    intervalo = int(daemon_config.get('REFRESH_INTERVAL', REFRESH_INTERVAL_PADRAO))
+    pool_size = int(daemon_config.get('POOL_SIZE', 2))
+    prometheus = None
+    if config_prometheus(configs):
+        prometheus = {"n8n_instance": nome} if nome else {}
+    return ColetorDaemon(configs['N8N'], intervalo, pool_size, config_rollup(configs), config_janelas(configs),
+                         config_orcamento(configs), prometheus, config_linha_base(configs))
+
+
+def executar_daemon(configs, instancia=None):
+    """Ponto de entrada do modo daemon (n8n-by-zabbix-coletas.py daemon).
+
+    Sem `instancia` atende todas as seções [N8N:<nome>] no mesmo socket.
+    """
+    daemon_config = configs['DAEMON'] if configs.has_section('DAEMON') else {}
+    socket_path = daemon_config.get('SOCKET_PATH', SOCKET_PATH_PADRAO)
+    if instancia is None:
+        selecionadas = instancias(configs)
+    else:
+        selecionadas = [(instancia, selecionar(configs, instancia))]
+
+    coletores = {}
+    try:
+        for nome, config_instancia in selecionadas:
+            coletores[nome] = criar_coletor(config_instancia, nome)
+    except (ValueError, psycopg2.Error) as e:
+        if isinstance(e, psycopg2.Error):
+            print(f"Erro de conexão com o banco de dados PostgreSQL{f' ({nome})' if nome else ''}: {e}",
+                  file=sys.stderr)
+        else:
+            print(f"Erro: {e}", file=sys.stderr)
+        for coletor in coletores.values():
+            coletor.fechar()
+        return 1
+
+    # Primeira carga antes de aceitar pedidos, para não responder zeros
+    for coletor in coletores.values():
+        coletor.atualizar()
+        threading.Thread(target=coletor.loop_atualizacao, daemon=True).start()
+
+    servidor_metricas = None
+    prometheus = config_prometheus(configs)
+    if prometheus:
+        servidor_metricas = iniciar_servidor(coletores, prometheus)
+        if servidor_metricas is None:
+            for coletor in coletores.values():
+                coletor.fechar()
+            return 1
+
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    servidor = SocketServer(socket_path, PedidoHandler)
+    servidor.coletores = coletores
+    os.chmod(socket_path, int(daemon_config.get('SOCKET_MODE', '0660'), 8))
+
+    def encerrar(signum, frame):
+        # shutdown() bloqueia até o serve_forever sair: roda fora da thread principal
+        threading.Thread(target=servidor.shutdown).start()
+
+    signal.signal(signal.SIGTERM, encerrar)
+    signal.signal(signal.SIGINT, encerrar)
+
+    for nome, coletor in coletores.items():
+        print(f"Coletor n8n{f' [{nome}]' if nome else ''} escutando em {socket_path} "
+              f"(atualização a cada {coletor.intervalo}s)", file=sys.stderr)
+    try:
+        servidor.serve_forever()
+    finally:
+        servidor.server_close()
+        if servidor_metricas:
+            servidor_metricas.shutdown()
+            servidor_metricas.server_close()
+        for coletor in coletores.values():
+            coletor.fechar()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+    return 0
@@ -0,0 +1,191 @@
+"""Descarte de valores inalterados: menos gravações de histórico no Zabbix.
+
+Status, arquivado e data de alteração de um workflow quase nunca mudam, mas
+cada item grava um valor por minuto. Com [THROTTLING] ENABLED:
+
+- a descoberta e o template acrescentam aos itens de cada workflow o
+  pré-processamento "Descartar inalterados com heartbeat" com o heartbeat da
+  família (HEARTBEAT_<FAMILIA>, 0 = sem descarte) e tiram as tendências dos
+  itens em que elas não fazem sentido (data da alteração, id da execução);
+- o bulk e o stream enviam ao trapper só os valores que mudaram ou cujo último
+  envio passou do heartbeat (o bulk guarda os últimos enviados em STATE_FILE).
+
+O heartbeat da fila fica abaixo da janela de 5 minutos das suas triggers
+(min(...,5m)) para que sempre haja um valor dentro dela; o do desvio da
+duração, abaixo dos 15 minutos da sua.
+"""
+
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+
+from n8n_metricas import ACOES_FALHAS, ACOES_JANELAS, ACOES_LINHA_BASE, CHAVES_ITENS, FAMILIA_DA_ACAO
+
+# Tipo de pré-processamento do Zabbix "Discard unchanged with heartbeat"
+PREPROCESSAMENTO_DESCARTE = 20
+CAMINHO_PADRAO = '/var/lib/n8n-by-zabbix/enviados.json'
+
+# Heartbeat por família de métricas (sufixos de tempo do Zabbix)
+HEARTBEATS_PADRAO = {
+    "workflows": "1h",
+    "execucoes": "15m",
+    "tempos": "15m",
+    "duracao": "15m",
+    "fila": "3m",
+    "janelas": "15m",
+    "falhas": "1d",
+    "linha_base": "5m",
+}
+
+# Itens sem tendências com o descarte ligado: valores que são datas ou ids
+ACOES_SEM_TENDENCIAS = ("update", "failure_execution")
+
+UNIDADES = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+_TEMPO = re.compile(r"^(\d+)([smhdw]?)$")
+
+# Chave do item -> ação do coletor: "n8n.workflow.duration[" + ",p50]"
+_ACAO_DO_MODELO = {tuple(modelo.split("{}")): acao for acao, modelo in CHAVES_ITENS.items()}
+
+
+def segundos(texto):
+    """'1h' -> 3600 (sufixos s, m, h, d, w do Zabbix; sem sufixo = segundos)."""
+    achado = _TEMPO.match(str(texto).strip())
+    if achado is None:
+        raise ValueError(f"intervalo inválido: '{texto}' (use, por exemplo, 30s, 15m, 1h ou 1d)")
+    return int(achado.group(1)) * UNIDADES[achado.group(2) or "s"]
+
+
+def config_descarte(configs):
+    """Parâmetros da seção [THROTTLING], ou None se ENABLED não estiver ligado."""
+    if not configs.has_section('THROTTLING') or not configs['THROTTLING'].getboolean('ENABLED', False):
+        return None
+    return parametros_descarte(configs['THROTTLING'])
+
+
+def parametros_descarte(secao):
+    """Heartbeats das famílias (HEARTBEAT_<FAMILIA> sobrepõe o padrão; 0 tira a família) e STATE_FILE."""
+    heartbeats = dict(HEARTBEATS_PADRAO)
+    for chave, valor in secao.items():
+        if chave.startswith('heartbeat_'):
+            familia = chave[len('heartbeat_'):]
+            if familia not in HEARTBEATS_PADRAO:
+                raise ValueError(f"[THROTTLING] {chave.upper()}: família desconhecida "
+                                 f"(use {', '.join(f.upper() for f in HEARTBEATS_PADRAO)})")
+            segundos(valor)
+            heartbeats[familia] = valor.strip()
+    return {
+        "heartbeats": {familia: hb for familia, hb in heartbeats.items() if segundos(hb) > 0},
+        "caminho": secao.get('STATE_FILE', CAMINHO_PADRAO),
+    }
+
+
+def familia_da_acao(acao):
+    if acao in ACOES_JANELAS:
+        return "janelas"
+    if acao in ACOES_FALHAS:
+        return "falhas"
+    if acao in ACOES_LINHA_BASE:
+        return "linha_base"
+    return FAMILIA_DA_ACAO.get(acao)
+
+
+def acao_da_chave(chave):
+    """Ação do coletor da chave n8n.workflow.*[<id>,...] (None para as demais chaves)."""
+    prefixo, _, resto = chave.partition("[")
+    if not resto:
+        return None
+    sufixo = resto[resto.index(","):] if "," in resto else "]"
+    return _ACAO_DO_MODELO.get((prefixo + "[", sufixo))
+
+
+def passo_descarte(heartbeat):
+    """Passo de pré-processamento "Descartar inalterados com heartbeat"."""
+    return {"type": PREPROCESSAMENTO_DESCARTE, "params": heartbeat, "error_handler": 0, "error_handler_params": ""}
+
+
+def filtrar_alterados(valores, enviados, heartbeats, agora=None):
+    """Pares (chave, valor) a enviar: os que mudaram ou cujo último envio passou do heartbeat.
+
+    `enviados` é {chave: [valor, epoch]} dos últimos envios confirmados. Chaves
+    fora das famílias (n8n.monitor, staleness) sempre vão.
+    """
+    agora = agora or time.time()
+    limites = {familia: segundos(heartbeat) for familia, heartbeat in heartbeats.items()}
+    alterados = []
+    for chave, valor in valores:
+        limite = limites.get(familia_da_acao(acao_da_chave(chave)))
+        anterior = enviados.get(chave)
+        if limite is None or anterior is None or anterior[0] != str(valor) or agora - anterior[1] >= limite:
+            alterados.append((chave, valor))
+    return alterados
+
+
+def registrar_envio(enviados, valores, agora=None):
+    agora = agora or time.time()
+    for chave, valor in valores:
+        enviados[chave] = [str(valor), agora]
+    return enviados
+
+
+def carregar_enviados(caminho):
+    try:
+        with open(caminho, encoding="utf-8") as arquivo:
+            return json.load(arquivo)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        print(f"Aviso: últimos valores enviados ilegíveis em {caminho} ({e}); enviando todos.", file=sys.stderr)
+        return {}
+
+
+def salvar_enviados(caminho, enviados):
+    """Grava os últimos envios de forma atômica (arquivo temporário + rename)."""
+    diretorio = os.path.dirname(caminho) or "."
+    fd, temporario = tempfile.mkstemp(dir=diretorio, prefix=".enviados-")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as arquivo:
+            json.dump(enviados, arquivo, ensure_ascii=False, separators=(",", ":"))
+        os.replace(temporario, caminho)
+    except BaseException:
+        os.unlink(temporario)
+        raise
+
+
+def projecao(definicoes, workflows, modo, heartbeats, intervalo_mestre="60s", intervalo_envio=60):
+    """Valores gravados por segundo por família, sem e com o descarte: {familia: (antes, depois)}.
+
+    `depois` supõe valores inalterados, o caso de status/arquivado/alteração;
+    nas demais famílias é o mínimo. Itens trapper usam o intervalo do bulk e
+    os enviados só na mudança (última falha) ficam de fora.
+    """
+    resultado = {}
+    for definicao in definicoes:
+        familia = familia_da_acao(definicao["acao"])
+        if modo == "trapper" and familia == "falhas":
+            continue
+        if modo == "trapper":
+            periodo = intervalo_envio
+        elif modo == "dependent" and not definicao.get("sem_mestre"):
+            periodo = segundos(intervalo_mestre)
+        else:
+            periodo = segundos(definicao["delay"])
+        antes = workflows / periodo
+        depois = workflows / max(periodo, segundos(heartbeats[familia])) if familia in heartbeats else antes
+        soma = resultado.get(familia, (0.0, 0.0))
+        resultado[familia] = (soma[0] + antes, soma[1] + depois)
+    return resultado
+
+
+def imprimir_projecao(projecao_familias, workflows, heartbeats):
+    total_antes = sum(antes for antes, _ in projecao_familias.values())
+    total_depois = sum(depois for _, depois in projecao_familias.values())
+    print(f"Valores por segundo gravados no Zabbix ({workflows} workflows), sem -> com [THROTTLING]:")
+    for familia, (antes, depois) in projecao_familias.items():
+        heartbeat = f"heartbeat {heartbeats[familia]}" if familia in heartbeats else "sem descarte"
+        print(f"  {familia:<10} {antes:9.2f} -> {depois:9.2f}  ({heartbeat})")
+    reducao = (1 - total_depois / total_antes) * 100 if total_antes else 0.0
+    print(f"  {'total':<10} {total_antes:9.2f} -> {total_depois:9.2f}  "
+          f"(-{reducao:.0f}% se nenhum valor mudar)")
@@ -0,0 +1,56 @@
+"""Estado local da descoberta incremental.
+
+Guarda, por workflow, o nome, o updatedAt, se está arquivado, os ids dos
+itens/triggers provisionados e o hash dos parâmetros renderizados, além da
+marca d'água (maior updatedAt já processado). Com isso as execuções seguintes
+leem do banco só os workflows alterados e só chamam a API do Zabbix quando
+algo precisa mudar.
+"""
+
+import hashlib
+import json
+import os
+import sys
+import tempfile
+
+VERSAO_ESTADO = 1
+
+
+def estado_vazio():
+    return {"versao": VERSAO_ESTADO, "watermark": None, "contexto": {}, "workflows": {}}
+
+
+def carregar_estado(caminho):
+    """Lê o arquivo de estado; arquivo ausente ou inválido força uma execução completa."""
+    try:
+        with open(caminho, encoding="utf-8") as arquivo:
+            estado = json.load(arquivo)
+    except FileNotFoundError:
+        return estado_vazio()
+    except (OSError, ValueError) as e:
+        print(f"Aviso: estado da descoberta ilegível em {caminho} ({e}); fazendo execução completa.",
+              file=sys.stderr)
+        return estado_vazio()
+    if estado.get("versao") != VERSAO_ESTADO:
+        return estado_vazio()
+    return estado
+
+
+def salvar_estado(caminho, estado):
+    """Grava o estado de forma atômica (arquivo temporário + rename)."""
+    diretorio = os.path.dirname(caminho) or "."
+    os.makedirs(diretorio, exist_ok=True)
+    fd, temporario = tempfile.mkstemp(dir=diretorio, prefix=".estado-")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as arquivo:
+            json.dump(estado, arquivo, ensure_ascii=False, sort_keys=True)
+        os.replace(temporario, caminho)
+    except BaseException:
+        os.unlink(temporario)
+        raise
+
+
+def hash_parametros(itens, triggers):
+    """Hash estável dos parâmetros renderizados de um workflow."""
+    conteudo = json.dumps([itens, triggers], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(conteudo.encode("utf-8")).hexdigest()
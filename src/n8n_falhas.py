@@ -0,0 +1,400 @@
+"""Detalhe das falhas: nó que falhou e mensagem de erro de cada execução com erro.
+
+O comando `n8n-by-zabbix-coletas.py failures` (no cron, como o bulk) lê só as
+execuções novas por uma marca d'água de id (n8n_marca: as em andamento ficam
+pendentes até terminarem, como em n8n_janelas) e, para cada uma que
+terminou com erro, lê n8n.execution_data em pedaços (substr de CHUNK_SIZE
+caracteres) passando-os a um parser incremental do formato flatted que o n8n
+grava: um array JSON em que cada objeto e cada string é um elemento e as
+referências são índices. O parser percorre o array guardando só os elementos
+pedidos (raiz -> resultData -> error -> message/node.name, lastNodeExecuted),
+que o flatted grava antes dos dados dos nós, e para de ler assim que os
+encontra; o resto do blob (saídas dos nós, às vezes centenas de MB) nunca
+chega inteiro à memória nem, em geral, ao cliente. MAX_BYTES limita a leitura
+de um blob sem erro.
+
+A última falha de cada workflow fica em STATE_FILE: o modo trapper envia
+n8n.workflow.failure[<id>,node|message|execution] dos workflows com falhas
+novas e os itens agent leem o arquivo, sem consultar o banco.
+"""
+
+import json
+import os
+import re
+import sys
+import tempfile
+
+import psycopg2
+
+from n8n_marca import ATRASO_PADRAO, MarcaExecucoes
+from n8n_metricas import CHAVES_ITENS
+from n8n_zabbix_sender import ZabbixSenderError, zabbix_send
+
+CAMINHO_PADRAO = '/var/lib/n8n-by-zabbix/falhas.json'
+LOTE_PADRAO = 50000
+PEDACO_PADRAO = 65536
+LIMITE_BYTES_PADRAO = 16 * 1024 * 1024
+TAMANHO_MENSAGEM_PADRAO = 1024
+# Execuções em andamento há mais que isto deixam de ser acompanhadas
+HORIZONTE_PENDENTES = 24 * 3600
+# Maior elemento guardado pelo parser; strings maiores são truncadas
+LIMITE_ELEMENTO = 64 * 1024
+
+COLUNAS = '"workflowId", status'
+
+SQL_PEDACO = """
+    SELECT substr(data, %(posicao)s, %(tamanho)s) FROM n8n."execution_data" WHERE "executionId" = %(execucao)s
+"""
+
+# Fora de strings: estrutura do JSON; dentro: fim da string ou escape
+_ESTRUTURA = re.compile(r'["\[\]{},]')
+_STRING = re.compile(r'[\\"]')
+# \uXXXX cortado no fim de uma string truncada
+_UNICODE_PARCIAL = re.compile(r'\\u[0-9a-fA-F]{0,3}$')
+
+
+def config_falhas(configs):
+    """Parâmetros da seção [FAILURES] (ENABLED só controla a descoberta)."""
+    secao = configs['FAILURES'] if configs.has_section('FAILURES') else {}
+    return {
+        "caminho": secao.get('STATE_FILE', CAMINHO_PADRAO),
+        "lote": int(secao.get('BATCH_SIZE', LOTE_PADRAO)),
+        "pedaco": int(secao.get('CHUNK_SIZE', PEDACO_PADRAO)),
+        "limite_bytes": int(secao.get('MAX_BYTES', LIMITE_BYTES_PADRAO)),
+        "tamanho_mensagem": int(secao.get('MAX_MESSAGE', TAMANHO_MENSAGEM_PADRAO)),
+        "atraso": int(secao.get('LAG_SECONDS', ATRASO_PADRAO)),
+    }
+
+
+def falhas_habilitadas(configs):
+    return configs.has_section('FAILURES') and configs['FAILURES'].getboolean('ENABLED', False)
+
+
+class LeitorFlatted:
+    """Percorre o array de topo de um JSON flatted recebido em pedaços.
+
+    Só os elementos cujo índice está em `procurados` são guardados (até
+    LIMITE_ELEMENTO caracteres) e decodificados; `ao_encontrar(indice, valor)`
+    pode pedir índices posteriores. Os demais são pulados sem serem montados,
+    então a memória não depende do tamanho do blob.
+    """
+
+    def __init__(self, ao_encontrar, limite_elemento=LIMITE_ELEMENTO):
+        self.ao_encontrar = ao_encontrar
+        self.limite_elemento = limite_elemento
+        self.procurados = {}
+        self.indice = 0
+        self.profundidade = 0  # 1 = dentro do array de topo, entre elementos
+        self.em_string = False
+        self.escape = False
+        self.partes = []
+        self.tamanho = 0
+        self.truncado = False
+        self.terminado = False
+
+    def _guardar(self, texto, inicio, fim):
+        if self.indice not in self.procurados or inicio >= fim:
+            return
+        resta = self.limite_elemento - self.tamanho
+        if fim - inicio > resta:
+            fim = inicio + max(resta, 0)
+            self.truncado = True
+        if fim > inicio:
+            self.partes.append(texto[inicio:fim])
+            self.tamanho += fim - inicio
+
+    def _fechar_elemento(self):
+        if self.indice in self.procurados:
+            bruto = "".join(self.partes).strip()
+            valor = None
+            if self.truncado and bruto.startswith('"'):
+                # String longa (ex.: stack trace): decodifica o começo
+                if (len(bruto) - len(bruto.rstrip("\\"))) % 2:
+                    bruto = bruto[:-1]
+                bruto = _UNICODE_PARCIAL.sub("", bruto) + '"'
+            if bruto and not (self.truncado and not bruto.startswith('"')):
+                try:
+                    valor = json.loads(bruto)
+                except ValueError:
+                    valor = None
+            self.ao_encontrar(self.indice, valor)
+        self.partes = []
+        self.tamanho = 0
+        self.truncado = False
+        self.indice += 1
+
+    def alimentar(self, texto):
+        """Processa o próximo pedaço do blob."""
+        posicao = 0
+        fim = len(texto)
+        while posicao < fim and not self.terminado:
+            if self.em_string:
+                if self.escape:
+                    self._guardar(texto, posicao, posicao + 1)
+                    self.escape = False
+                    posicao += 1
+                    continue
+                achado = _STRING.search(texto, posicao)
+                if achado is None:
+                    self._guardar(texto, posicao, fim)
+                    return
+                self._guardar(texto, posicao, achado.end())
+                posicao = achado.end()
+                if achado.group() == "\\":
+                    self.escape = True
+                else:
+                    self.em_string = False
+                continue
+            achado = _ESTRUTURA.search(texto, posicao)
+            if achado is None:
+                self._guardar(texto, posicao, fim)
+                return
+            caractere = achado.group()
+            if self.profundidade == 0:
+                # Antes do array de topo: só espaços são aceitos
+                if caractere != "[" or texto[posicao:achado.start()].strip():
+                    raise ValueError("o blob não é um array JSON (flatted)")
+                self.profundidade = 1
+            elif caractere == '"':
+                self._guardar(texto, posicao, achado.end())
+                self.em_string = True
+            elif caractere in "[{":
+                self._guardar(texto, posicao, achado.end())
+                self.profundidade += 1
+            elif caractere in "]}" and self.profundidade > 1:
+                self._guardar(texto, posicao, achado.end())
+                self.profundidade -= 1
+            elif caractere in "]}":
+                # Fim do array de topo
+                self._guardar(texto, posicao, achado.start())
+                self._fechar_elemento()
+                self.terminado = True
+            elif self.profundidade == 1:
+                # Vírgula entre elementos do topo
+                self._guardar(texto, posicao, achado.start())
+                self._fechar_elemento()
+            else:
+                self._guardar(texto, posicao, achado.end())
+            posicao = achado.end()
+
+
+class ExtratorFalha:
+    """Segue as referências raiz -> resultData -> error até o nó e a mensagem do erro."""
+
+    def __init__(self):
+        self.leitor = LeitorFlatted(self._encontrado)
+        self.leitor.procurados[0] = ["raiz"]
+        self.encontrados = {}
+        self.valores = {}
+
+    @property
+    def concluido(self):
+        return not self.leitor.procurados or self.leitor.terminado
+
+    def alimentar(self, texto):
+        self.leitor.alimentar(texto)
+
+    def _pedir(self, referencia, papel):
+        # No flatted toda string e todo objeto aninhado viram o índice (em texto) do elemento
+        if not (isinstance(referencia, str) and referencia.isdigit()):
+            return
+        indice = int(referencia)
+        if indice < self.leitor.indice:
+            # Strings repetidas apontam para a primeira ocorrência (ex.: o nome do nó em lastNodeExecuted)
+            if indice in self.encontrados:
+                self._tratar(papel, self.encontrados[indice])
+            return
+        self.leitor.procurados.setdefault(indice, []).append(papel)
+
+    def _encontrado(self, indice, valor):
+        self.encontrados[indice] = valor
+        for papel in self.leitor.procurados.pop(indice):
+            self._tratar(papel, valor)
+
+    def _tratar(self, papel, valor):
+        if papel == "raiz" and isinstance(valor, dict):
+            self._pedir(valor.get("resultData"), "resultado")
+        elif papel == "resultado" and isinstance(valor, dict):
+            self._pedir(valor.get("lastNodeExecuted"), "ultimo_no")
+            self._pedir(valor.get("error"), "erro")
+        elif papel == "erro" and isinstance(valor, dict):
+            self._pedir(valor.get("message"), "mensagem")
+            self._pedir(valor.get("description"), "descricao")
+            self._pedir(valor.get("node"), "no")
+        elif papel == "no" and isinstance(valor, dict):
+            self._pedir(valor.get("name"), "nome_no")
+        elif isinstance(valor, str):
+            self.valores[papel] = valor
+
+    def resultado(self, tamanho_mensagem=TAMANHO_MENSAGEM_PADRAO):
+        """{"no": ..., "mensagem": ...} (strings vazias se o blob não trouxer)."""
+        mensagem = self.valores.get("mensagem", "")
+        descricao = self.valores.get("descricao", "")
+        if descricao and descricao != mensagem:
+            mensagem = f"{mensagem} - {descricao}" if mensagem else descricao
+        return {
+            "no": self.valores.get("nome_no") or self.valores.get("ultimo_no", ""),
+            "mensagem": mensagem[:tamanho_mensagem],
+        }
+
+
+def ler_falha(cursor, execucao_id, pedaco=PEDACO_PADRAO, limite_bytes=LIMITE_BYTES_PADRAO,
+              tamanho_mensagem=TAMANHO_MENSAGEM_PADRAO):
+    """Nó e mensagem do erro da execução, lendo execution_data em pedaços até achá-los."""
+    extrator = ExtratorFalha()
+    posicao = 1
+    while posicao <= limite_bytes and not extrator.concluido:
+        cursor.execute(SQL_PEDACO, {"posicao": posicao, "tamanho": pedaco, "execucao": execucao_id})
+        linha = cursor.fetchone()
+        if linha is None or not linha[0]:
+            break
+        extrator.alimentar(linha[0])
+        if len(linha[0]) < pedaco:
+            break
+        posicao += pedaco
+    return extrator.resultado(tamanho_mensagem)
+
+
+def carregar_estado(caminho):
+    try:
+        with open(caminho, encoding="utf-8") as arquivo:
+            return json.load(arquivo)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        print(f"Aviso: estado das falhas ilegível em {caminho} ({e}); recomeçando da execução mais recente.",
+              file=sys.stderr)
+        return {}
+
+
+def salvar_estado(caminho, estado):
+    """Grava o estado de forma atômica (arquivo temporário + rename)."""
+    diretorio = os.path.dirname(caminho) or "."
+    fd, temporario = tempfile.mkstemp(dir=diretorio, prefix=".falhas-")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as arquivo:
+            json.dump(estado, arquivo, ensure_ascii=False, separators=(",", ":"))
+        os.replace(temporario, caminho)
+    except BaseException:
+        os.unlink(temporario)
+        raise
+
+
+def execucoes_com_erro(cursor, estado, lote, atraso=ATRASO_PADRAO):
+    """[(id, workflow_id)] das execuções que terminaram com erro desde a última leitura.
+
+    Atualiza a marca, os pendentes e as vistas do estado. Sem estado, começa
+    da execução mais recente: só falhas novas são lidas.
+    """
+    leitura = MarcaExecucoes(COLUNAS, HORIZONTE_PENDENTES, atraso)
+    leitura.restaurar(estado)
+    if leitura.marca is None:
+        leitura.iniciar(cursor)
+    erros = [(execucao_id, workflow_id)
+             for execucao_id, workflow_id, status in leitura.finalizadas(cursor, lote) if status == "error"]
+    estado.update(leitura.estado())
+    return sorted(erros)
+
+
+def atualizar_falhas(conn, parametros, estado):
+    """Lê as falhas novas e grava a última de cada workflow em estado["ultimas"].
+
+    Retorna {workflow_id: falha} dos workflows com falha nova.
+    """
+    novas = {}
+    with conn.cursor() as cursor:
+        for execucao_id, workflow_id in execucoes_com_erro(cursor, estado, parametros["lote"], parametros["atraso"]):
+            falha = ler_falha(cursor, execucao_id, parametros["pedaco"], parametros["limite_bytes"],
+                              parametros["tamanho_mensagem"])
+            falha["execucao"] = execucao_id
+            novas[workflow_id] = falha
+    conn.rollback()
+    estado.setdefault("ultimas", {}).update(novas)
+    return novas
+
+
+def valores_falhas(falhas):
+    """Pares (chave do item, valor) das falhas {workflow_id: falha}."""
+    for workflow_id, falha in sorted(falhas.items()):
+        yield CHAVES_ITENS["failure_node"].format(workflow_id), falha["no"]
+        yield CHAVES_ITENS["failure_message"].format(workflow_id), falha["mensagem"]
+        yield CHAVES_ITENS["failure_execution"].format(workflow_id), falha["execucao"]
+
+
+def valor_falha(configs, acao, workflow_id):
+    """Valor do item agent failure_<node|message|execution> lido do estado (sem consultar o banco)."""
+    campo = {"failure_node": "no", "failure_message": "mensagem", "failure_execution": "execucao"}.get(acao)
+    if campo is None:
+        return f"ZBX_NOTSUPPORTED: ação desconhecida '{acao}'"
+    falha = carregar_estado(config_falhas(configs)["caminho"]).get("ultimas", {}).get(workflow_id)
+    if falha is None:
+        return 0 if campo == "execucao" else ""
+    return falha[campo]
+
+
+def _gravar_estado(caminho, estado):
+    try:
+        salvar_estado(caminho, estado)
+    except OSError as e:
+        print(f"Erro ao gravar o estado das falhas em {caminho}: {e}", file=sys.stderr)
+        return False
+    return True
+
+
+def executar_falhas(configs, conectar, somente_imprimir=False):
+    """Ponto de entrada do comando failures do coletor.
+
+    Envia ao trapper as falhas novas quando [ZABBIX] ITEM_TYPE = trapper; nos
+    demais modos só atualiza o estado lido pelos itens agent.
+    """
+    parametros = config_falhas(configs)
+    estado = carregar_estado(parametros["caminho"])
+    conn = conectar()
+    if conn is None:
+        return 1
+    try:
+        novas = atualizar_falhas(conn, parametros, estado)
+    except psycopg2.Error as e:
+        print(f"Erro ao acessar o banco de dados PostgreSQL: {e}", file=sys.stderr)
+        return 1
+    except ValueError as e:
+        print(f"Erro ao ler os dados da execução: {e}", file=sys.stderr)
+        return 1
+    finally:
+        conn.close()
+
+    valores = list(valores_falhas(novas))
+    if somente_imprimir:
+        for chave, valor in valores:
+            print(f"{chave} {valor}")
+        return 0
+
+    zabbix_config = configs['ZABBIX']
+    if not valores or zabbix_config.get('ITEM_TYPE', 'agent').strip().lower() != "trapper":
+        if not _gravar_estado(parametros["caminho"], estado):
+            return 1
+        print(f"Falhas novas: {len(novas)} workflow(s).")
+        return 0
+    # O estado (marca d'água e pendentes) só avança depois do envio: se o
+    # trapper falhar, as mesmas falhas são lidas e enviadas de novo na próxima
+    # execução (reenviar a última falha é inofensivo)
+    try:
+        resultado = zabbix_send(
+            zabbix_config.get('SENDER_SERVER', 'localhost'),
+            zabbix_config.getint('SENDER_PORT', 10051),
+            zabbix_config['SENDER_HOST'],
+            valores,
+            timeout=zabbix_config.getfloat('SENDER_TIMEOUT', 10.0),
+            lote=zabbix_config.getint('SENDER_BATCH_SIZE', 0),
+        )
+    except KeyError:
+        print("Erro: SENDER_HOST não definido na seção [ZABBIX] do arquivo de configuração.", file=sys.stderr)
+        return 1
+    except ZabbixSenderError as e:
+        print(f"Erro: {e}", file=sys.stderr)
+        return 1
+    if not _gravar_estado(parametros["caminho"], estado):
+        return 1
+    print(f"Falhas novas: {len(novas)} workflow(s); valores enviados: {resultado['processed']} processados, "
+          f"{resultado['failed']} com falha.")
+    return 0
@@ -0,0 +1,166 @@
+"""Camada HTTP compartilhada pelos clientes da API do Zabbix e do n8n.
+
+Usa uma requests.Session com pool de conexões keep-alive, de modo que o
+handshake TCP/TLS é pago uma vez por execução e não a cada chamada. Timeouts
+de conexão e de leitura são separados, falhas transitórias (5xx, conexão
+recusada/resetada) são repetidas com backoff exponencial e cada chamada
+alimenta contadores de latência por rótulo (método JSON-RPC ou endpoint).
+"""
+
+import sys
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+
+CONNECT_TIMEOUT_PADRAO = 5.0
+READ_TIMEOUT_PADRAO = 60.0
+TENTATIVAS_PADRAO = 3
+BACKOFF_PADRAO = 0.5
+
+
+def sem_conexao(erro):
+    """True se o erro aconteceu ao abrir a conexão, antes de qualquer byte da requisição ser enviado."""
+    if isinstance(erro, requests.exceptions.ConnectTimeout):
+        return True
+    motivo = erro.args[0] if erro.args else None
+    # requests embrulha o erro do urllib3 num MaxRetryError (max_retries=0)
+    motivo = getattr(motivo, "reason", motivo)
+    return isinstance(motivo, (NewConnectionError, ConnectTimeoutError))
+
+
+class ClienteHttp:
+    """Sessão HTTP com keep-alive, retentativas e contadores de latência."""
+
+    def __init__(self, connect_timeout=CONNECT_TIMEOUT_PADRAO, read_timeout=READ_TIMEOUT_PADRAO,
+                 tentativas=TENTATIVAS_PADRAO, backoff=BACKOFF_PADRAO, pool_size=10, verificar_tls=True):
+        self.timeout = (connect_timeout, read_timeout)
+        self.tentativas = max(1, tentativas)
+        self.backoff = backoff
+        self.verificar_tls = verificar_tls
+        self.sessao = requests.Session()
+        # As retentativas são feitas aqui, sabendo se a chamada é idempotente
+        adaptador = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.sessao.mount("https://", adaptador)
+        self.sessao.mount("http://", adaptador)
+        self.trava = threading.Lock()
+        self.latencias = {}
+        self.erros = {}
+
+    @classmethod
+    def da_configuracao(cls, secao, **extras):
+        """Cria o cliente a partir de uma seção do n8n_monitor.conf."""
+        secao = secao if secao is not None else {}
+        return cls(
+            connect_timeout=float(secao.get('CONNECT_TIMEOUT', CONNECT_TIMEOUT_PADRAO)),
+            read_timeout=float(secao.get('READ_TIMEOUT', READ_TIMEOUT_PADRAO)),
+            tentativas=int(secao.get('RETRIES', TENTATIVAS_PADRAO)),
+            backoff=float(secao.get('RETRY_BACKOFF', BACKOFF_PADRAO)),
+            **extras,
+        )
+
+    def registrar(self, rotulo, duracao, erro=False):
+        with self.trava:
+            contador = self.latencias.setdefault(rotulo, [0, 0.0, 0.0])
+            contador[0] += 1
+            contador[1] += duracao
+            contador[2] = max(contador[2], duracao)
+            if erro:
+                self.erros[rotulo] = self.erros.get(rotulo, 0) + 1
+
+    def requisitar(self, metodo_http, url, rotulo, idempotente=True, **kwargs):
+        """Faz a requisição com retentativas e devolve a requests.Response.
+
+        Chamadas idempotentes são repetidas em 5xx e em qualquer erro de
+        conexão; as demais só quando a conexão nem chegou a ser aberta
+        (recusada, timeout de conexão, erro de DNS), para não duplicar um
+        item.create que o servidor possa ter processado. Uma conexão do pool
+        que o servidor fechou sem aviso falha depois do envio e, nessas
+        chamadas, não é repetida (o urllib3 já descarta as que detecta fechadas
+        antes de reusá-las). Levanta requests.exceptions.RequestException se
+        todas falharem.
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        # Explícito: Session.verify é ignorado quando REQUESTS_CA_BUNDLE está definido
+        kwargs.setdefault("verify", self.verificar_tls)
+        for tentativa in range(self.tentativas):
+            ultima = tentativa == self.tentativas - 1
+            inicio = time.monotonic()
+            try:
+                resposta = self.sessao.request(metodo_http, url, **kwargs)
+            except requests.exceptions.SSLError:
+                # Certificado inválido não se resolve repetindo
+                self.registrar(rotulo, time.monotonic() - inicio, erro=True)
+                raise
+            except requests.exceptions.ConnectionError as e:
+                self.registrar(rotulo, time.monotonic() - inicio, erro=True)
+                if ultima or not (idempotente or sem_conexao(e)):
+                    raise
+            else:
+                falhou = resposta.status_code >= 500
+                self.registrar(rotulo, time.monotonic() - inicio, erro=falhou)
+                if not (falhou and idempotente and not ultima):
+                    return resposta
+            time.sleep(self.backoff * (2 ** tentativa))
+
+    def resumo(self):
+        """Contadores por rótulo: chamadas, erros, média e máximo em ms."""
+        with self.trava:
+            return {
+                rotulo: {
+                    "chamadas": chamadas,
+                    "erros": self.erros.get(rotulo, 0),
+                    "media_ms": round(total / chamadas * 1000, 2),
+                    "max_ms": round(maximo * 1000, 2),
+                    "total_s": round(total, 3),
+                }
+                for rotulo, (chamadas, total, maximo) in self.latencias.items()
+            }
+
+    def imprimir_resumo(self, titulo, saida=sys.stderr):
+        for rotulo, dados in sorted(self.resumo().items()):
+            print(f"{titulo} {rotulo}: {dados['chamadas']} chamadas, {dados['erros']} erros, "
+                  f"média {dados['media_ms']} ms, máx {dados['max_ms']} ms", file=saida)
+
+    def fechar(self):
+        self.sessao.close()
+
+
+class ClienteZabbix:
+    """Cliente JSON-RPC da API do Zabbix sobre um ClienteHttp."""
+
+    def __init__(self, url, token, http=None):
+        self.url = url
+        self.http = http or ClienteHttp()
+        self.http.sessao.headers.update({
+            'Authorization': f'Bearer {token}',
+            'Content-Type': 'application/json',
+        })
+        self.proximo_id = 0
+        self.erros_api = 0
+        self.trava = threading.Lock()
+
+    def chamar(self, method, params):
+        """Chama o método e devolve o campo result, ou None (com erro no stderr)."""
+        with self.trava:
+            self.proximo_id += 1
+            payload = {"jsonrpc": "2.0", "method": method, "params": params, "id": self.proximo_id}
+        try:
+            response = self.http.requisitar("POST", self.url, method, idempotente=method.endswith(".get"),
+                                            json=payload)
+            response.raise_for_status()
+            result = response.json()
+            if 'error' in result:
+                with self.trava:
+                    self.erros_api += 1
+                print(f"Erro na API do Zabbix ({method}): {result['error']['data']}", file=sys.stderr)
+                return None
+            return result.get('result')
+        except requests.exceptions.RequestException as e:
+            print(f"Erro de rede ao chamar API Zabbix ({method}): {e}", file=sys.stderr)
+            return None
+        except (KeyError, ValueError):
+            print(f"Erro: Resposta inesperada da API do Zabbix para {method}.", file=sys.stderr)
+            return None
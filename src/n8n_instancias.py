@@ -0,0 +1,101 @@
+"""Várias instâncias do n8n num único n8n_monitor.conf.
+
+Cada seção [N8N:<nome>] descreve um banco do n8n (mesmas chaves de [N8N], que
+servem de padrão) e pode sobrepor o host do Zabbix de destino (HOST_ID,
+SENDER_HOST, SENDER_ALLOWED_HOSTS) e o agendamento do daemon
+(REFRESH_INTERVAL, POOL_SIZE). instancias() devolve, para cada uma, um
+ConfigParser com o formato de sempre ([N8N], [ZABBIX], ...), então o resto do
+código não muda; os arquivos de estado locais recebem o nome da instância
+(discovery_state.<nome>.json) para que as instâncias não se misturem.
+
+Sem seções [N8N:<nome>] há uma única instância, sem nome, com a configuração
+original.
+"""
+
+import configparser
+import os
+import sys
+
+PREFIXO_SECAO = "N8N:"
+
+# Chaves de [N8N:<nome>] que vão para outras seções da configuração da instância
+SOBREPOSICOES = {
+    "HOST_ID": "ZABBIX",
+    "SENDER_HOST": "ZABBIX",
+    "SENDER_ALLOWED_HOSTS": "ZABBIX",
+    "REFRESH_INTERVAL": "DAEMON",
+    "POOL_SIZE": "DAEMON",
+}
+
+# Arquivos de estado locais, por instância: (seção, chave, caminho padrão)
+ARQUIVOS_POR_INSTANCIA = [
+    ("DISCOVERY", "STATE_FILE", '/var/lib/n8n-by-zabbix/discovery_state.json'),
+    ("DISCOVERY", "API_CACHE_FILE", None),
+    ("CACHE", "PATH", '/var/lib/n8n-by-zabbix/coletas_cache.sqlite'),
+    ("ERROR_WINDOWS", "STATE_FILE", '/var/lib/n8n-by-zabbix/janelas_erros.bin'),
+    ("BUDGET", "STATE_FILE", '/var/lib/n8n-by-zabbix/orcamento.json'),
+    ("FAILURES", "STATE_FILE", '/var/lib/n8n-by-zabbix/falhas.json'),
+    ("THROTTLING", "STATE_FILE", '/var/lib/n8n-by-zabbix/enviados.json'),
+    ("DURATION_BASELINE", "STATE_FILE", '/var/lib/n8n-by-zabbix/linha_base.bin'),
+]
+
+
+def nomes_instancias(configs):
+    return [secao[len(PREFIXO_SECAO):] for secao in configs.sections() if secao.startswith(PREFIXO_SECAO)]
+
+
+def caminho_da_instancia(caminho, nome):
+    """/dir/arquivo.ext -> /dir/arquivo.<nome>.ext"""
+    base, extensao = os.path.splitext(caminho)
+    return f"{base}.{nome}{extensao}"
+
+
+def config_da_instancia(configs, nome):
+    """ConfigParser da instância `nome` no formato de uma configuração de instância única."""
+    secoes = {secao: dict(configs.items(secao, raw=True)) for secao in configs.sections()
+              if not secao.startswith(PREFIXO_SECAO)}
+    instancia = dict(configs.items(PREFIXO_SECAO + nome, raw=True))
+    secoes.setdefault("N8N", {})
+    for chave, valor in instancia.items():
+        destino = SOBREPOSICOES.get(chave.upper(), "N8N")
+        secoes.setdefault(destino, {})[chave] = valor
+    for secao, chave, padrao in ARQUIVOS_POR_INSTANCIA:
+        caminho = secoes.get(secao, {}).get(chave.lower(), padrao)
+        if caminho:
+            secoes.setdefault(secao, {})[chave.lower()] = caminho_da_instancia(caminho, nome)
+    resultado = configparser.ConfigParser()
+    resultado.read_dict(secoes)
+    return resultado
+
+
+def instancias(configs):
+    """Lista de (nome, configuração) das instâncias; [(None, configs)] sem seções [N8N:<nome>]."""
+    nomes = nomes_instancias(configs)
+    if not nomes:
+        return [(None, configs)]
+    return [(nome, config_da_instancia(configs, nome)) for nome in nomes]
+
+
+def instancia_da_linha_de_comando(argv):
+    """Retira `--instance <nome>` de argv (ou lê N8N_MONITOR_INSTANCE) e devolve o nome, ou None."""
+    if "--instance" in argv:
+        posicao = argv.index("--instance")
+        if posicao + 1 >= len(argv):
+            print("Erro: --instance exige o nome de uma seção [N8N:<nome>].", file=sys.stderr)
+            sys.exit(1)
+        nome = argv[posicao + 1]
+        del argv[posicao:posicao + 2]
+        return nome
+    return os.environ.get('N8N_MONITOR_INSTANCE') or None
+
+
+def selecionar(configs, nome):
+    """Configuração da instância `nome` (ou a primeira, se None); sai com erro se ela não existir."""
+    todas = instancias(configs)
+    if nome is None:
+        return todas[0][1]
+    for nome_instancia, config in todas:
+        if nome_instancia == nome:
+            return config
+    print(f"Erro: seção [{PREFIXO_SECAO}{nome}] não encontrada no arquivo de configuração.", file=sys.stderr)
+    sys.exit(1)
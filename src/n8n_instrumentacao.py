@@ -0,0 +1,215 @@
+"""Instrumentação dos próprios scripts: tempos do coletor e da descoberta.
+
+Com [INSTRUMENTATION] ENABLED cada processo mede o tempo de início do
+Python até o main, a conexão e as consultas ao PostgreSQL (via um cursor
+instrumentado passado em cursor_factory), as linhas devolvidas, as chamadas à
+API do Zabbix e o tempo total, e ao sair soma tudo no arquivo de estatísticas
+(STATS_FILE, JSON protegido por flock) em buckets por minuto. As chaves
+n8n.monitor[<métrica>,<estatística>] leem esse arquivo e resumem a janela dos
+últimos WINDOW_MINUTES minutos.
+
+Com LOG_FILE, cada medição também vira uma linha JSON nesse arquivo.
+"""
+
+import atexit
+import fcntl
+import json
+import os
+import sys
+import time
+
+import psycopg2.extensions
+
+STATS_FILE_PADRAO = '/var/lib/n8n-by-zabbix/instrumentacao.json'
+JANELA_MINUTOS_PADRAO = 5
+
+def inicio_do_processo():
+    """time.time() do início do processo (Linux, /proc), ou None."""
+    try:
+        with open("/proc/self/stat") as arquivo:
+            # O nome do processo pode ter espaços: os campos vêm depois do último ')'
+            campos = arquivo.read().rsplit(")", 1)[1].split()
+        with open("/proc/uptime") as arquivo:
+            uptime = float(arquivo.read().split()[0])
+        return time.time() - uptime + int(campos[19]) / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def config_instrumentacao(configs):
+    """Parâmetros da seção [INSTRUMENTATION], ou None se ENABLED não estiver ligado."""
+    if not configs.has_section('INSTRUMENTATION') or not configs['INSTRUMENTATION'].getboolean('ENABLED', False):
+        return None
+    secao = configs['INSTRUMENTATION']
+    return {
+        "caminho": secao.get('STATS_FILE', STATS_FILE_PADRAO),
+        "janela": secao.getint('WINDOW_MINUTES', JANELA_MINUTOS_PADRAO),
+        "log": secao.get('LOG_FILE') or None,
+    }
+
+
+class Instrumentacao:
+    """Medições do processo; inerte até configurar()."""
+
+    def __init__(self):
+        self.ativa = False
+        self.processo = None
+        self.caminho = STATS_FILE_PADRAO
+        self.janela = JANELA_MINUTOS_PADRAO
+        self.log = None
+        self.medicoes = {}
+        self.inicio = None
+
+    def configurar(self, configs, processo):
+        """Ativa a instrumentação conforme a seção [INSTRUMENTATION]; processo = coletor ou descoberta."""
+        parametros = config_instrumentacao(configs)
+        if parametros is None:
+            return self
+        self.ativa = True
+        self.processo = processo
+        self.caminho = parametros["caminho"]
+        self.janela = parametros["janela"]
+        self.log = parametros["log"]
+        self.inicio = inicio_do_processo()
+        if self.inicio is not None:
+            self.registrar("inicio_ms", (time.time() - self.inicio) * 1000)
+        atexit.register(self.finalizar)
+        return self
+
+    def registrar(self, metrica, valor, **campos):
+        """Acumula uma medição do processo (e grava a linha JSON, se houver LOG_FILE)."""
+        if not self.ativa:
+            return
+        self.somar(metrica, 1, valor, valor)
+        if self.log:
+            linha = {"ts": round(time.time(), 3), "processo": self.processo, "pid": os.getpid(),
+                     "metrica": metrica, "valor": round(valor, 3)}
+            linha.update(campos)
+            try:
+                with open(self.log, "a", encoding="utf-8") as arquivo:
+                    arquivo.write(json.dumps(linha, ensure_ascii=False, default=str) + "\n")
+            except OSError:
+                pass
+
+    def somar(self, metrica, quantidade, soma, maximo):
+        if not self.ativa:
+            return
+        atual = self.medicoes.setdefault(f"{self.processo}.{metrica}", [0, 0.0, 0.0, 0.0])
+        atual[0] += quantidade
+        atual[1] += soma
+        atual[2] = max(atual[2], maximo)
+        atual[3] = soma / quantidade if quantidade else 0.0
+
+    def registrar_http(self, cliente):
+        """Soma as latências por chamada de um ClienteHttp (API do Zabbix) como api_ms."""
+        for dados in cliente.resumo().values():
+            self.somar("api_ms", dados["chamadas"], dados["total_s"] * 1000, dados["max_ms"])
+
+    def finalizar(self):
+        """Grava as medições do processo no arquivo de estatísticas (uma vez, na saída)."""
+        if not self.ativa or self.inicio is None and not self.medicoes:
+            return
+        if self.inicio is not None:
+            self.registrar("total_ms", (time.time() - self.inicio) * 1000)
+        medicoes, self.medicoes = self.medicoes, {}
+        try:
+            gravar_medicoes(self.caminho, medicoes, self.janela)
+        except (OSError, ValueError) as e:
+            print(f"Erro ao gravar as estatísticas da instrumentação em {self.caminho}: {e}", file=sys.stderr)
+
+
+INSTRUMENTACAO = Instrumentacao()
+
+
+class CursorMedido(psycopg2.extensions.cursor):
+    """Cursor que mede cada execute() e conta as linhas devolvidas."""
+
+    def execute(self, query, vars=None):
+        inicio = time.monotonic()
+        try:
+            return super().execute(query, vars)
+        except psycopg2.Error:
+            INSTRUMENTACAO.registrar("erros", 1)
+            raise
+        finally:
+            INSTRUMENTACAO.registrar("consulta_ms", (time.monotonic() - inicio) * 1000)
+            if self.rowcount > 0:
+                INSTRUMENTACAO.registrar("linhas", self.rowcount)
+
+
+def conectar(**parametros):
+    """psycopg2.connect medindo o tempo de conexão e com o cursor instrumentado."""
+    if not INSTRUMENTACAO.ativa:
+        return psycopg2.connect(**parametros)
+    inicio = time.monotonic()
+    try:
+        return psycopg2.connect(cursor_factory=CursorMedido, **parametros)
+    except psycopg2.Error:
+        INSTRUMENTACAO.registrar("erros", 1)
+        raise
+    finally:
+        INSTRUMENTACAO.registrar("conexao_ms", (time.monotonic() - inicio) * 1000)
+
+
+def _ler(arquivo):
+    arquivo.seek(0)
+    conteudo = arquivo.read()
+    return json.loads(conteudo) if conteudo.strip() else {}
+
+
+def gravar_medicoes(caminho, medicoes, janela=JANELA_MINUTOS_PADRAO, agora=None):
+    """Soma as medições no bucket do minuto atual e descarta os fora da janela.
+
+    Formato: {métrica: {minuto (epoch): [quantidade, soma, máximo, último]}}.
+    """
+    minuto = int((agora or time.time()) // 60 * 60)
+    with open(os.open(caminho, os.O_CREAT | os.O_RDWR, 0o664), "r+", encoding="utf-8") as arquivo:
+        fcntl.flock(arquivo, fcntl.LOCK_EX)
+        estatisticas = _ler(arquivo)
+        for metrica, (quantidade, soma, maximo, ultimo) in medicoes.items():
+            buckets = estatisticas.setdefault(metrica, {})
+            bucket = buckets.setdefault(str(minuto), [0, 0.0, 0.0, 0.0])
+            bucket[0] += quantidade
+            bucket[1] = round(bucket[1] + soma, 3)
+            bucket[2] = round(max(bucket[2], maximo), 3)
+            bucket[3] = round(ultimo, 3)
+        limite = minuto - janela * 60
+        for buckets in estatisticas.values():
+            for chave in [chave for chave in buckets if int(chave) <= limite]:
+                del buckets[chave]
+        arquivo.seek(0)
+        arquivo.truncate()
+        json.dump(estatisticas, arquivo, separators=(",", ":"))
+
+
+def resumir(caminho, metrica, estatistica, janela=JANELA_MINUTOS_PADRAO, agora=None):
+    """Estatística (count, sum, avg, max, last) da métrica na janela; 0 sem dados."""
+    try:
+        with open(caminho, encoding="utf-8") as arquivo:
+            fcntl.flock(arquivo, fcntl.LOCK_SH)
+            buckets = _ler(arquivo).get(metrica, {})
+    except FileNotFoundError:
+        return 0
+    limite = int((agora or time.time()) // 60 * 60) - janela * 60
+    validos = sorted((int(chave), valores) for chave, valores in buckets.items() if int(chave) > limite)
+    if not validos:
+        return 0
+    quantidade = sum(valores[0] for _, valores in validos)
+    soma = sum(valores[1] for _, valores in validos)
+    if estatistica == "count":
+        return quantidade
+    if estatistica == "sum":
+        return round(soma, 3)
+    if estatistica == "avg":
+        return round(soma / quantidade, 3) if quantidade else 0
+    if estatistica == "max":
+        return max(valores[2] for _, valores in validos)
+    return validos[-1][1][3]
+
+
+def valores_monitor(caminho, janela=JANELA_MINUTOS_PADRAO):
+    """Pares (chave, valor) dos itens n8n.monitor[*] da descoberta, para o envio em modo bulk."""
+    from n8n_zabbix_itens import DEFINICOES_MONITOR, chave_monitor
+
+    return [(chave_monitor(metrica, estatistica), resumir(caminho, metrica, estatistica, janela))
+            for metrica, estatistica, _, _ in DEFINICOES_MONITOR]
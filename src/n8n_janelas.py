@@ -0,0 +1,268 @@
+"""Contagem incremental das execuções com erro em janelas deslizantes (1h, 24h, 7d).
+
+Em vez de recontar as últimas 24h de execution_entity a cada coleta, o
+contador lê só as execuções novas por uma marca d'água de id e soma cada erro
+no bucket do minuto (janelas até 24h) ou da hora (7d) de "startedAt", num anel
+por workflow (array de inteiros). Cada janela guarda a soma corrente por
+workflow: avançar o relógio subtrai o bucket que sai da janela e zera o que
+entra, então a atualização por ciclo é O(1) por workflow, sem depender do
+tamanho da janela.
+
+A leitura (n8n_marca) entrega cada execução uma vez, quando termina: as
+ainda em andamento (new, running, waiting) ficam pendentes e são relidas pela
+chave primária, e a marca fica LAG_SECONDS atrás das execuções mais novas para
+não pular transações que confirmam fora de ordem. As que passam da maior
+janela sem terminar são descartadas, pois não contariam mais.
+
+O estado (anéis só dos workflows com erros na janela, marca, pendentes e vistas) é
+gravado em STATE_FILE em formato binário compacto; um reinício continua da
+marca em vez de reler as 24h. A primeira carga (ou a troca de WINDOWS) faz
+uma única leitura agregada da maior janela.
+
+Os buckets cobrem a janela em minutos (horas, no 7d) completos até o minuto
+atual, então a contagem pode diferir da consulta exata do coletor por
+execuções do minuto mais antigo; execuções apagadas do banco só saem da
+contagem quando saem da janela.
+"""
+
+import fcntl
+import json
+import os
+import tempfile
+import time
+from array import array
+from contextlib import contextmanager
+
+from n8n_marca import ATRASO_PADRAO, MarcaExecucoes
+from n8n_metricas import JANELAS_ERROS
+
+CAMINHO_PADRAO = '/var/lib/n8n-by-zabbix/janelas_erros.bin'
+JANELAS_PADRAO = "1h,24h"
+LOTE_PADRAO = 50000
+IDADE_MAXIMA_PADRAO = 30
+VERSAO = 1
+TIPO_ANEL = 'I'
+
+SQL_CARGA = """
+    SELECT "workflowId", EXTRACT(EPOCH FROM date_trunc('minute', "startedAt"))::float8, count(*)
+    FROM n8n."execution_entity"
+    WHERE id <= %(marca)s
+        AND "startedAt" > NOW() - %(horizonte)s * INTERVAL '1 second'
+        AND status = 'error'
+    GROUP BY 1, 2
+"""
+
+COLUNAS = '"workflowId", EXTRACT(EPOCH FROM "startedAt")::float8, status'
+
+
+def config_janelas(configs):
+    """Parâmetros da seção [ERROR_WINDOWS], ou None se ENABLED não estiver ligado."""
+    if not configs.has_section('ERROR_WINDOWS') or not configs['ERROR_WINDOWS'].getboolean('ENABLED', False):
+        return None
+    secao = configs['ERROR_WINDOWS']
+    janelas = [nome.strip() for nome in secao.get('WINDOWS', JANELAS_PADRAO).split(",") if nome.strip()]
+    invalidas = [nome for nome in janelas if nome not in JANELAS_ERROS]
+    if invalidas:
+        raise ValueError(f"janelas inválidas em [ERROR_WINDOWS] WINDOWS: {', '.join(invalidas)} "
+                         f"(use {', '.join(JANELAS_ERROS)})")
+    return {
+        "janelas": janelas,
+        "caminho": secao.get('STATE_FILE', CAMINHO_PADRAO),
+        "lote": secao.getint('BATCH_SIZE', LOTE_PADRAO),
+        "idade_maxima": secao.getfloat('MAX_AGE', IDADE_MAXIMA_PADRAO),
+        "atraso": secao.getint('LAG_SECONDS', ATRASO_PADRAO),
+    }
+
+
+def resolucao(segundos):
+    """Tamanho do bucket da janela: minuto até 24h, hora acima disso."""
+    return 60 if segundos <= 86400 else 3600
+
+
+class ContadorErros:
+    """Anéis de contagem por workflow e somas correntes de cada janela."""
+
+    def __init__(self, janelas, atraso=ATRASO_PADRAO):
+        # execucao_status é sempre a janela de 24h
+        nomes = sorted(set(janelas) | {"24h"}, key=JANELAS_ERROS.get)
+        self.janelas = {nome: JANELAS_ERROS[nome] for nome in nomes}
+        self.horizonte = max(self.janelas.values())
+        self.tamanhos = {}
+        for segundos in self.janelas.values():
+            r = resolucao(segundos)
+            self.tamanhos[r] = max(self.tamanhos.get(r, 0), segundos // r + 1)
+        self.relogios = {r: None for r in self.tamanhos}
+        self.aneis = {r: {} for r in self.tamanhos}
+        self.somas = {nome: {} for nome in self.janelas}
+        self.leitura = MarcaExecucoes(COLUNAS, self.horizonte, atraso)
+        self.atualizado_em = None
+
+    def _janelas_da_resolucao(self, r):
+        return [(nome, segundos // r) for nome, segundos in self.janelas.items() if resolucao(segundos) == r]
+
+    def avancar(self, agora=None):
+        """Leva os anéis até o bucket atual, tirando das somas o que saiu das janelas."""
+        agora = agora or time.time()
+        for r, tamanho in self.tamanhos.items():
+            novo = int(agora // r)
+            atual = self.relogios[r]
+            janelas = self._janelas_da_resolucao(r)
+            if atual is None or novo - atual >= tamanho:
+                # Parado por mais que a maior janela: nada do que havia vale mais
+                self.aneis[r].clear()
+                for nome, _ in janelas:
+                    self.somas[nome].clear()
+                self.relogios[r] = novo
+                continue
+            while atual < novo:
+                atual += 1
+                posicao = atual % tamanho
+                for workflow_id, anel in self.aneis[r].items():
+                    for nome, n in janelas:
+                        saindo = anel[(atual - n) % tamanho]
+                        if saindo:
+                            self.somas[nome][workflow_id] -= saindo
+                    anel[posicao] = 0
+            self.relogios[r] = novo
+            # Anel sem nada na maior janela da resolução: libera o workflow
+            maior = max(janelas, key=lambda janela: janela[1])[0]
+            for workflow_id in [w for w in self.aneis[r] if not self.somas[maior].get(w)]:
+                del self.aneis[r][workflow_id]
+                for nome, _ in janelas:
+                    self.somas[nome].pop(workflow_id, None)
+
+    def registrar(self, workflow_id, inicio, quantidade=1):
+        """Soma `quantidade` erros iniciados em `inicio` (epoch) nos anéis do workflow."""
+        for r, tamanho in self.tamanhos.items():
+            atual = self.relogios[r]
+            idade = max(0, atual - int(inicio // r))
+            if idade >= tamanho - 1:
+                continue
+            anel = self.aneis[r].get(workflow_id)
+            if anel is None:
+                anel = self.aneis[r][workflow_id] = array(TIPO_ANEL, [0]) * tamanho
+            anel[(atual - idade) % tamanho] += quantidade
+            for nome, n in self._janelas_da_resolucao(r):
+                if idade < n:
+                    self.somas[nome][workflow_id] = self.somas[nome].get(workflow_id, 0) + quantidade
+
+    def recalcular_somas(self):
+        for r, tamanho in self.tamanhos.items():
+            atual = self.relogios[r]
+            for nome, n in self._janelas_da_resolucao(r):
+                self.somas[nome] = {
+                    workflow_id: sum(anel[(atual - k) % tamanho] for k in range(n))
+                    for workflow_id, anel in self.aneis[r].items()
+                }
+
+    def contagens(self):
+        """{acao: {workflow_id: erros}}: errors_<janela> e execucao_status (24h)."""
+        dados = {f"errors_{nome}": dict(somas) for nome, somas in self.somas.items()}
+        dados["execucao_status"] = dict(self.somas["24h"])
+        return dados
+
+    def carregar_do_banco(self, cursor):
+        """Primeira carga: marca d'água, execuções em andamento e uma leitura agregada da maior janela."""
+        self.leitura.iniciar(cursor)
+        cursor.execute(SQL_CARGA, {"marca": self.leitura.marca, "horizonte": self.horizonte})
+        for workflow_id, minuto, quantidade in cursor.fetchall():
+            self.registrar(workflow_id, minuto, quantidade)
+
+    def incorporar_novas(self, cursor, lote=LOTE_PADRAO):
+        """Conta os erros das execuções que terminaram desde a última leitura e devolve quantos foram."""
+        novos = 0
+        for _, workflow_id, inicio, status in self.leitura.finalizadas(cursor, lote):
+            if status == "error" and inicio is not None:
+                self.registrar(workflow_id, inicio)
+                novos += 1
+        return novos
+
+    def atualizar(self, conn, lote=LOTE_PADRAO):
+        """Avança o relógio e incorpora as execuções novas (carga inicial se preciso)."""
+        self.avancar()
+        with conn.cursor() as cursor:
+            if self.leitura.marca is None:
+                self.carregar_do_banco(cursor)
+            novos = self.incorporar_novas(cursor, lote)
+        # Só leitura: não segura a transação aberta
+        conn.rollback()
+        self.atualizado_em = time.time()
+        return novos
+
+    def salvar(self, caminho):
+        """Grava o estado: uma linha JSON de cabeçalho seguida dos anéis em binário."""
+        cabecalho = {
+            "versao": VERSAO,
+            "janelas": list(self.janelas),
+            **self.leitura.estado(),
+            "atualizado_em": self.atualizado_em,
+            "relogios": {str(r): relogio for r, relogio in self.relogios.items()},
+            "workflows": {str(r): list(aneis) for r, aneis in self.aneis.items()},
+        }
+        fd, temporario = tempfile.mkstemp(dir=os.path.dirname(caminho) or ".", prefix=".janelas-")
+        try:
+            # mkstemp cria com 0600; o arquivo é lido pelo agent, pelo bulk e pelo daemon
+            os.fchmod(fd, 0o664)
+            with os.fdopen(fd, "wb") as arquivo:
+                arquivo.write(json.dumps(cabecalho, separators=(",", ":")).encode("utf-8") + b"\n")
+                for r in sorted(self.aneis):
+                    for anel in self.aneis[r].values():
+                        anel.tofile(arquivo)
+            os.replace(temporario, caminho)
+        except BaseException:
+            os.unlink(temporario)
+            raise
+
+    @classmethod
+    def carregar(cls, caminho, janelas, atraso=ATRASO_PADRAO):
+        """Estado gravado por salvar(); um contador vazio se não houver ou as janelas mudaram."""
+        contador = cls(janelas, atraso)
+        try:
+            with open(caminho, "rb") as arquivo:
+                cabecalho = json.loads(arquivo.readline())
+                if cabecalho.get("versao") != VERSAO or cabecalho.get("janelas") != list(contador.janelas):
+                    return contador
+                for r in sorted(contador.tamanhos):
+                    for workflow_id in cabecalho["workflows"][str(r)]:
+                        anel = array(TIPO_ANEL)
+                        anel.fromfile(arquivo, contador.tamanhos[r])
+                        contador.aneis[r][workflow_id] = anel
+        except FileNotFoundError:
+            return contador
+        except (ValueError, KeyError, EOFError) as e:
+            raise ValueError(f"estado das janelas de erros inválido em {caminho}: {e}") from e
+        contador.leitura.restaurar(cabecalho)
+        contador.atualizado_em = cabecalho["atualizado_em"]
+        contador.relogios = {int(r): relogio for r, relogio in cabecalho["relogios"].items()}
+        contador.recalcular_somas()
+        return contador
+
+
+@contextmanager
+def trava_do_estado(caminho):
+    """flock exclusivo em <caminho>.lock: um processo por vez atualiza ou grava o estado."""
+    with open(os.open(f"{caminho}.lock", os.O_CREAT | os.O_RDWR, 0o664), "r+") as trava:
+        fcntl.flock(trava, fcntl.LOCK_EX)
+        yield
+
+
+def contagens_atualizadas(conectar, janelas, caminho=CAMINHO_PADRAO, lote=LOTE_PADRAO, idade_maxima=0,
+                          atraso=ATRASO_PADRAO):
+    """Contagens das janelas a partir do estado em disco, atualizado se mais velho que idade_maxima.
+
+    Para processos de vida curta (bulk, agent): um flock no arquivo garante
+    uma atualização por vez; quem espera lê o estado recém-gravado.
+    `conectar()` devolve a conexão com o banco (ou None) e só é chamada se o
+    estado precisar ser atualizado; quem chama fecha a conexão.
+    """
+    with trava_do_estado(caminho):
+        contador = ContadorErros.carregar(caminho, janelas, atraso)
+        if contador.atualizado_em is None or time.time() - contador.atualizado_em >= idade_maxima:
+            conn = conectar()
+            if conn is None:
+                return None
+            contador.atualizar(conn, lote)
+            contador.salvar(caminho)
+        else:
+            contador.avancar()
+    return contador.contagens()
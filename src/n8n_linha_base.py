@@ -0,0 +1,227 @@
+"""Linha de base incremental da duração de cada workflow e escore de desvio.
+
+Os itens de tempo médio/máximo são absolutos: 30 s é normal para um workflow
+e lentidão para outro, então não há limite fixo para uma trigger. Com
+[DURATION_BASELINE] ENABLED o coletor mantém, por workflow, uma média e uma
+variância móveis exponenciais (EWMA) da duração das execuções e uma média
+recente, mais rápida; o item n8n.workflow.duration.score[<id>] é
+
+    (média recente - média da linha de base) / desvio padrão da linha de base
+
+e a descoberta cria uma trigger quando ele fica acima de TRIGGER_SCORE por 15
+minutos (ex.: uma API externa degradada deixando o workflow mais lento).
+
+Como em n8n_janelas, só as execuções novas são lidas, por uma marca d'água de
+id (n8n_marca); as que estavam em andamento são relidas pela chave primária
+até terminarem. Cada execução atualiza a linha de base em O(1), sem reler o
+histórico; a diferença que uma execução aplica à linha de base é limitada a
+CORTE desvios, para que poucas execuções muito lentas não inflem a variância e
+escondam a própria lentidão. A primeira carga faz uma única leitura agregada
+de INITIAL_DAYS dias (média e variância por workflow). A meia-vida é contada em execuções
+(HALF_LIFE para a linha de base, RECENT_HALF_LIFE para a média recente).
+
+O estado (quatro números por workflow: execuções, média, variância e média
+recente, mais a marca, os pendentes e as vistas) é gravado em STATE_FILE no mesmo formato
+compacto das janelas de erros: cabeçalho JSON e um array binário.
+"""
+
+import json
+import math
+import os
+import tempfile
+import time
+from array import array
+
+from n8n_janelas import trava_do_estado
+from n8n_marca import ATRASO_PADRAO, MarcaExecucoes
+
+CAMINHO_PADRAO = '/var/lib/n8n-by-zabbix/linha_base.bin'
+MEIA_VIDA_PADRAO = 200
+MEIA_VIDA_RECENTE_PADRAO = 5
+MINIMO_EXECUCOES_PADRAO = 30
+LIMITE_ESCORE_PADRAO = 3.0
+DIAS_CARGA_PADRAO = 7
+LOTE_PADRAO = 50000
+IDADE_MAXIMA_PADRAO = 30
+HORIZONTE_PENDENTES = 24 * 3600
+VERSAO = 1
+# Por workflow: execuções, média, variância, média recente
+CAMPOS = 4
+# Desvio mínimo: 10% da média ou 50 ms, para workflows de duração quase constante
+DESVIO_MINIMO_RELATIVO = 0.1
+DESVIO_MINIMO = 0.05
+# Diferença máxima, em desvios, que uma execução aplica à linha de base: poucas
+# execuções muito lentas não inflam a variância a ponto de esconder a lentidão
+CORTE = 3
+
+DURACAO = 'EXTRACT(EPOCH FROM ("stoppedAt" - "startedAt"))::float8'
+
+SQL_CARGA = f"""
+    SELECT "workflowId", count(*), avg({DURACAO}), var_pop({DURACAO})
+    FROM n8n."execution_entity"
+    WHERE id <= %(marca)s
+        AND status IN ('success', 'error') AND "stoppedAt" IS NOT NULL
+        AND "startedAt" > NOW() - %(dias)s * INTERVAL '1 day'
+    GROUP BY 1
+"""
+
+COLUNAS = f'"workflowId", {DURACAO}, status'
+
+
+def alfa(meia_vida):
+    """Peso de cada execução nova para que a anterior valha metade após `meia_vida` execuções."""
+    return 1 - 0.5 ** (1 / meia_vida)
+
+
+def config_linha_base(configs, forcar=False):
+    """Parâmetros da seção [DURATION_BASELINE], ou None se ENABLED não estiver ligado (nem `forcar`)."""
+    secao = configs['DURATION_BASELINE'] if configs.has_section('DURATION_BASELINE') else {}
+    ligado = str(secao.get('ENABLED', 'false')).strip().lower() in ('1', 'true', 'yes', 'on')
+    if not ligado and not forcar:
+        return None
+    parametros = {
+        "meia_vida": float(secao.get('HALF_LIFE', MEIA_VIDA_PADRAO)),
+        "meia_vida_recente": float(secao.get('RECENT_HALF_LIFE', MEIA_VIDA_RECENTE_PADRAO)),
+        "minimo": int(secao.get('MIN_EXECUTIONS', MINIMO_EXECUCOES_PADRAO)),
+        "limite": float(secao.get('TRIGGER_SCORE', LIMITE_ESCORE_PADRAO)),
+        "dias": float(secao.get('INITIAL_DAYS', DIAS_CARGA_PADRAO)),
+        "caminho": secao.get('STATE_FILE', CAMINHO_PADRAO),
+        "lote": int(secao.get('BATCH_SIZE', LOTE_PADRAO)),
+        "idade_maxima": float(secao.get('MAX_AGE', IDADE_MAXIMA_PADRAO)),
+        "atraso": int(secao.get('LAG_SECONDS', ATRASO_PADRAO)),
+    }
+    if parametros["meia_vida"] <= 0 or parametros["meia_vida_recente"] <= 0:
+        raise ValueError("[DURATION_BASELINE] HALF_LIFE e RECENT_HALF_LIFE devem ser maiores que zero")
+    return parametros
+
+
+class LinhaBase:
+    """Média e variância móveis da duração por workflow, atualizadas execução a execução."""
+
+    def __init__(self, parametros):
+        self.parametros = parametros
+        self.alfa = alfa(parametros["meia_vida"])
+        self.alfa_recente = alfa(parametros["meia_vida_recente"])
+        self.workflows = {}
+        self.leitura = MarcaExecucoes(COLUNAS, HORIZONTE_PENDENTES, parametros["atraso"])
+        self.atualizado_em = None
+
+    def registrar(self, workflow_id, duracao):
+        """Incorpora a duração (segundos) de uma execução finalizada."""
+        dados = self.workflows.get(workflow_id)
+        if dados is None:
+            self.workflows[workflow_id] = array('d', [1, duracao, 0.0, duracao])
+            return
+        diferenca = duracao - dados[1]
+        if dados[0] >= self.parametros["minimo"]:
+            limite = CORTE * self.desvio(dados)
+            diferenca = max(-limite, min(limite, diferenca))
+        incremento = self.alfa * diferenca
+        dados[0] += 1
+        dados[1] += incremento
+        # Variância exponencial incremental (mesmo peso da média)
+        dados[2] = (1 - self.alfa) * (dados[2] + diferenca * incremento)
+        dados[3] += self.alfa_recente * (duracao - dados[3])
+
+    @staticmethod
+    def desvio(dados):
+        return max(math.sqrt(dados[2]), DESVIO_MINIMO_RELATIVO * dados[1], DESVIO_MINIMO)
+
+    def escore(self, workflow_id):
+        """Desvio da média recente em desvios padrão da linha de base (0 antes de MIN_EXECUTIONS)."""
+        dados = self.workflows.get(workflow_id)
+        if dados is None or dados[0] < self.parametros["minimo"]:
+            return 0
+        return round((dados[3] - dados[1]) / self.desvio(dados), 2)
+
+    def escores(self):
+        """{acao: {workflow_id: escore}} para o snapshot (ação baseline_score)."""
+        return {"baseline_score": {workflow_id: self.escore(workflow_id) for workflow_id in self.workflows}}
+
+    def carregar_do_banco(self, cursor):
+        """Primeira carga: marca d'água, execuções em andamento e média/variância dos últimos INITIAL_DAYS."""
+        self.leitura.iniciar(cursor)
+        if self.parametros["dias"] <= 0:
+            return
+        cursor.execute(SQL_CARGA, {"marca": self.leitura.marca, "dias": self.parametros["dias"]})
+        for workflow_id, quantidade, media, variancia in cursor.fetchall():
+            self.workflows[workflow_id] = array('d', [quantidade, media, variancia or 0.0, media])
+
+    def incorporar_novas(self, cursor, lote=LOTE_PADRAO):
+        """Incorpora as execuções que terminaram desde a última leitura e devolve quantas foram."""
+        novas = 0
+        for _, workflow_id, duracao, status in self.leitura.finalizadas(cursor, lote):
+            if status in ("success", "error") and duracao is not None:
+                self.registrar(workflow_id, duracao)
+                novas += 1
+        return novas
+
+    def atualizar(self, conn, lote=LOTE_PADRAO):
+        """Incorpora as execuções novas (carga inicial se preciso)."""
+        with conn.cursor() as cursor:
+            if self.leitura.marca is None:
+                self.carregar_do_banco(cursor)
+            novas = self.incorporar_novas(cursor, lote)
+        # Só leitura: não segura a transação aberta
+        conn.rollback()
+        self.atualizado_em = time.time()
+        return novas
+
+    def salvar(self, caminho):
+        """Grava o estado: uma linha JSON de cabeçalho seguida dos números de cada workflow em binário."""
+        cabecalho = {
+            "versao": VERSAO,
+            **self.leitura.estado(),
+            "atualizado_em": self.atualizado_em,
+            "workflows": list(self.workflows),
+        }
+        fd, temporario = tempfile.mkstemp(dir=os.path.dirname(caminho) or ".", prefix=".linha_base-")
+        try:
+            os.fchmod(fd, 0o664)
+            with os.fdopen(fd, "wb") as arquivo:
+                arquivo.write(json.dumps(cabecalho, separators=(",", ":")).encode("utf-8") + b"\n")
+                for dados in self.workflows.values():
+                    dados.tofile(arquivo)
+            os.replace(temporario, caminho)
+        except BaseException:
+            os.unlink(temporario)
+            raise
+
+    @classmethod
+    def carregar(cls, caminho, parametros):
+        """Estado gravado por salvar(); uma linha de base vazia se não houver."""
+        linha_base = cls(parametros)
+        try:
+            with open(caminho, "rb") as arquivo:
+                cabecalho = json.loads(arquivo.readline())
+                if cabecalho.get("versao") != VERSAO:
+                    return linha_base
+                for workflow_id in cabecalho["workflows"]:
+                    dados = array('d')
+                    dados.fromfile(arquivo, CAMPOS)
+                    linha_base.workflows[workflow_id] = dados
+        except FileNotFoundError:
+            return linha_base
+        except (ValueError, KeyError, EOFError) as e:
+            raise ValueError(f"estado da linha de base da duração inválido em {caminho}: {e}") from e
+        linha_base.leitura.restaurar(cabecalho)
+        linha_base.atualizado_em = cabecalho["atualizado_em"]
+        return linha_base
+
+
+def escores_atualizados(conectar, parametros, idade_maxima=0):
+    """Escores a partir do estado em disco, atualizado se mais velho que idade_maxima.
+
+    Para processos de vida curta (bulk, agent), como contagens_atualizadas das
+    janelas de erros: um flock no arquivo garante uma atualização por vez.
+    """
+    caminho = parametros["caminho"]
+    with trava_do_estado(caminho):
+        linha_base = LinhaBase.carregar(caminho, parametros)
+        if linha_base.atualizado_em is None or time.time() - linha_base.atualizado_em >= idade_maxima:
+            conn = conectar()
+            if conn is None:
+                return None
+            linha_base.atualizar(conn, parametros["lote"])
+            linha_base.salvar(caminho)
+    return linha_base.escores()
@@ -0,0 +1,119 @@
+"""Leitura incremental de n8n.execution_entity por marca d'água de id.
+
+Compartilhada pelas janelas de erros (n8n_janelas), pelas falhas (n8n_falhas)
+e pela linha de base da duração (n8n_linha_base): cada ciclo lê só as
+execuções acima da marca e relê pela chave primária as que estavam em
+andamento (`pendentes`) até terminarem, então cada execução é entregue uma
+vez só, quando termina.
+
+O id vem de uma sequência, mas a transação de um id menor pode confirmar
+depois da de um maior (várias instâncias main/worker no modo queue). Por isso
+a marca só avança até o maior id criado há mais de LAG_SECONDS, como a marca
+do rollup (n8n_rollup); as execuções acima dela já lidas ficam em `vistas` e
+são puladas quando relidas no ciclo seguinte.
+"""
+
+ATRASO_PADRAO = 30
+
+# Em andamento: ainda podem terminar (com erro, com duração)
+CONDICAO_PENDENTE = """
+    "stoppedAt" IS NULL AND status IN ('new', 'running', 'waiting')
+        AND COALESCE("startedAt", "createdAt") > NOW() - %(horizonte)s * INTERVAL '1 second'
+"""
+
+SQL_MARCA_INICIAL = """
+    SELECT COALESCE(max(id), 0) FROM n8n."execution_entity"
+    WHERE "createdAt" <= NOW() - %(atraso)s * INTERVAL '1 second'
+"""
+
+SQL_CARGA_PENDENTES = f"""
+    SELECT id FROM n8n."execution_entity" WHERE id <= %(marca)s AND {CONDICAO_PENDENTE}
+"""
+
+_COLUNAS = """
+    SELECT id, {colunas}, {pendente}, "createdAt" <= NOW() - %(atraso)s * INTERVAL '1 second'
+    FROM n8n."execution_entity"
+"""
+
+_NOVAS = """
+    WHERE id > %(ultimo)s
+    ORDER BY id
+    LIMIT %(lote)s
+"""
+
+_PENDENTES = """
+    WHERE id = ANY(%(ids)s)
+"""
+
+
+class MarcaExecucoes:
+    """Marca d'água, execuções pendentes e execuções já lidas acima da marca."""
+
+    def __init__(self, colunas, horizonte, atraso=ATRASO_PADRAO):
+        """`colunas`: expressões SQL devolvidas após o id de cada execução finalizada."""
+        selecao = _COLUNAS.format(colunas=colunas, pendente=CONDICAO_PENDENTE)
+        self.sql_novas = selecao + _NOVAS
+        self.sql_pendentes = selecao + _PENDENTES
+        self.horizonte = horizonte
+        self.atraso = atraso
+        self.marca = None
+        self.pendentes = set()
+        self.vistas = set()
+
+    def iniciar(self, cursor):
+        """Primeira carga: marca no maior id já assentado e as execuções em andamento até ele."""
+        cursor.execute(SQL_MARCA_INICIAL, {"atraso": self.atraso})
+        self.marca = cursor.fetchone()[0]
+        cursor.execute(SQL_CARGA_PENDENTES, {"marca": self.marca, "horizonte": self.horizonte})
+        self.pendentes = {linha[0] for linha in cursor.fetchall()}
+        self.vistas = set()
+
+    def _classificar(self, linha, finalizadas):
+        *dados, pendente, _ = linha
+        if pendente:
+            self.pendentes.add(dados[0])
+        else:
+            finalizadas.append(tuple(dados))
+
+    def finalizadas(self, cursor, lote):
+        """Linhas (id, *colunas) das execuções que terminaram desde a última leitura.
+
+        Pendentes apagadas do banco ou em andamento há mais que o horizonte
+        são descartadas (voltam como finalizadas e quem chama as ignora pelo status).
+        """
+        finalizadas = []
+        if self.pendentes:
+            ids = sorted(self.pendentes)
+            cursor.execute(self.sql_pendentes, {"ids": ids, "horizonte": self.horizonte, "atraso": self.atraso})
+            self.pendentes = set()
+            for linha in cursor.fetchall():
+                self._classificar(linha, finalizadas)
+        ultimo = self.marca
+        while True:
+            cursor.execute(self.sql_novas, {"ultimo": ultimo, "lote": lote, "horizonte": self.horizonte,
+                                            "atraso": self.atraso})
+            linhas = cursor.fetchall()
+            for linha in linhas:
+                execucao_id, assentada = linha[0], linha[-1]
+                if assentada:
+                    self.marca = execucao_id
+                if execucao_id in self.vistas:
+                    continue
+                self.vistas.add(execucao_id)
+                self._classificar(linha, finalizadas)
+            if linhas:
+                ultimo = linhas[-1][0]
+            if len(linhas) < lote:
+                break
+        self.vistas = {execucao_id for execucao_id in self.vistas if execucao_id > self.marca}
+        return finalizadas
+
+    def estado(self):
+        """Marca, pendentes e vistas para o arquivo de estado (JSON)."""
+        return {"marca": self.marca, "pendentes": sorted(self.pendentes), "vistas": sorted(self.vistas)}
+
+    def restaurar(self, estado):
+        """Recupera o que estado() gravou (estados antigos não têm `vistas`)."""
+        self.marca = estado.get("marca")
+        self.pendentes = set(estado.get("pendentes") or [])
+        self.vistas = set(estado.get("vistas") or [])
@@ -0,0 +1,399 @@
+"""Consultas agrupadas (bulk) das métricas dos workflows do n8n.
+
+Cada família de métricas roda UMA consulta para todos os workflows e devolve
+{acao: {workflow_id: valor}}, com as mesmas ações aceitas pelo
+n8n-by-zabbix-coletas.py. Workflows sem linhas na janela consultada ficam de
+fora do dicionário; use valor_metrica() para ler com o padrão 0 do coletor.
+
+Com rollup=True as famílias de execuções leem os buckets por minuto de
+n8n_monitor.execucoes_minuto (ver n8n_rollup) em vez de varrer
+execution_entity; a janela de 24h das execuções com erro passa a começar no
+início do minuto.
+
+O item mestre n8n.workflows.metrics (ação metrics_json) devolve todas as
+métricas de todos os workflows num único JSON {workflow_id: {acao: valor}},
+produzido por uma consulta só (SQL_METRICAS); os itens por workflow passam a
+ser itens dependentes com pré-processamento JSONPath.
+"""
+
+import json
+
+# Item mestre com o JSON de todas as métricas (itens dependentes)
+ACAO_METRICAS = "metrics_json"
+CHAVE_METRICAS = "n8n.workflows.metrics"
+
+# Chave do item no Zabbix para cada ação do coletor
+CHAVES_ITENS = {
+    "execucao_status": "n8n.workflow.execution.status[{}]",
+    "workflow_status": "n8n.workflow.status[{}]",
+    "is_archived": "n8n.workflow.is.archived[{}]",
+    "update": "n8n.workflow.update[{}]",
+    "average_time": "n8n.workflow.average.time[{}]",
+    "max_time": "n8n.workflow.max.time[{}]",
+}
+
+# Estatísticas de duração (últimos 10 minutos) e limites, em segundos, do
+# histograma acumulado: le_<n> = execuções com duração <= n
+ESTATISTICAS_DURACAO = ("count", "avg", "p50", "p90", "p99", "max")
+LIMITES_HISTOGRAMA = (1, 5, 10, 30, 60, 300)
+ESTATISTICAS_HISTOGRAMA = tuple(f"le_{limite}" for limite in LIMITES_HISTOGRAMA)
+CHAVES_ITENS.update({f"duration_{estatistica}": "n8n.workflow.duration[{}," + estatistica + "]"
+                     for estatistica in ESTATISTICAS_DURACAO + ESTATISTICAS_HISTOGRAMA})
+
+# Execuções com erro por janela deslizante (n8n_janelas, [ERROR_WINDOWS]): nome -> segundos
+JANELAS_ERROS = {"1h": 3600, "24h": 86400, "7d": 7 * 86400}
+ACOES_JANELAS = tuple(f"errors_{janela}" for janela in JANELAS_ERROS)
+CHAVES_ITENS.update({f"errors_{janela}": "n8n.workflow.errors[{}," + janela + "]" for janela in JANELAS_ERROS})
+
+# Fila e saturação dos workers (modo queue do n8n): execuções iniciadas e
+# finalizadas no último minuto, em new/running/waiting agora, idade da execução
+# em andamento mais antiga e espera média na fila (startedAt - createdAt) das
+# iniciadas nos últimos 10 minutos
+ESTATISTICAS_FILA = ("started", "finished", "new", "running", "waiting", "oldest_running", "wait_time")
+ACOES_FILA = tuple(f"queue_{estatistica}" for estatistica in ESTATISTICAS_FILA)
+CHAVES_ITENS.update({f"queue_{estatistica}": "n8n.workflow.queue[{}," + estatistica + "]"
+                     for estatistica in ESTATISTICAS_FILA})
+
+# Última falha do workflow (n8n_falhas, [FAILURES]): nó, mensagem de erro e id da execução
+ACOES_FALHAS = ("failure_node", "failure_message", "failure_execution")
+CHAVES_ITENS.update({acao: "n8n.workflow.failure[{}," + acao[len("failure_"):] + "]" for acao in ACOES_FALHAS})
+
+# Desvio da duração em relação à linha de base do workflow (n8n_linha_base, [DURATION_BASELINE])
+ACOES_LINHA_BASE = ("baseline_score",)
+CHAVES_ITENS["baseline_score"] = "n8n.workflow.duration.score[{}]"
+
+# Consultas do coletor por workflow (n8n-by-zabbix-coletas.py <acao> <workflow_id>)
+SQL_POR_WORKFLOW = {
+    "execucao_status": """
+        SELECT count(*)
+        FROM n8n."execution_entity"
+        WHERE "workflowId" = %s
+            AND "startedAt" > NOW() - INTERVAL '24 hours'
+            AND status = 'error'
+    """,
+    "workflow_status": """
+        SELECT "active"
+        FROM n8n."workflow_entity"
+        WHERE "id" = %s
+    """,
+    "is_archived": """
+        SELECT "isArchived"
+        FROM n8n."workflow_entity"
+        WHERE "id" = %s
+    """,
+    "update": """
+        SELECT "updatedAt"
+        FROM n8n.workflow_entity
+        WHERE id= %s
+        LIMIT 1
+    """,
+    "average_time": """
+        SELECT AVG(EXTRACT(EPOCH FROM ("stoppedAt" - "startedAt"))) AS media_tempo_execucao_segundos
+        FROM n8n."execution_entity"
+        WHERE "workflowId" = %s AND status IN ('success','error') AND "startedAt" > NOW() - interval '10 MINUTES'
+    """,
+    "max_time": """
+        SELECT MAX(EXTRACT(EPOCH FROM ("stoppedAt" - "startedAt"))) AS max_tempo_execucao_segundos
+        FROM n8n."execution_entity"
+        WHERE "workflowId" = %s AND status IN ('success','error') AND "startedAt" > NOW() - interval '10 MINUTES'
+    """,
+}
+
+SQL_WORKFLOWS = """
+    SELECT id, "active", "isArchived", "updatedAt"
+    FROM n8n."workflow_entity"
+"""
+
+SQL_EXECUCOES_ERRO = """
+    SELECT "workflowId", count(*)
+    FROM n8n."execution_entity"
+    WHERE "startedAt" > NOW() - INTERVAL '24 hours'
+        AND status = 'error'
+    GROUP BY "workflowId"
+"""
+
+SQL_TEMPOS = """
+    SELECT "workflowId",
+           AVG(EXTRACT(EPOCH FROM ("stoppedAt" - "startedAt"))),
+           MAX(EXTRACT(EPOCH FROM ("stoppedAt" - "startedAt")))
+    FROM n8n."execution_entity"
+    WHERE status IN ('success','error') AND "startedAt" > NOW() - interval '10 MINUTES'
+    GROUP BY "workflowId"
+"""
+
+# Buckets do rollup + execuções finalizadas acima da marca d'água (ainda não
+# incorporadas). %(workflow)s = NULL consulta todos os workflows.
+SQL_EXECUCOES_ERRO_ROLLUP = """
+    SELECT "workflowId", sum(total)::bigint
+    FROM (
+        SELECT "workflowId", total
+        FROM n8n_monitor.execucoes_minuto
+        WHERE minuto >= date_trunc('minute', NOW() - INTERVAL '24 hours')
+            AND status = 'error'
+            AND (%(workflow)s::text IS NULL OR "workflowId" = %(workflow)s)
+        UNION ALL
+        SELECT e."workflowId", 1
+        FROM n8n."execution_entity" e, n8n_monitor.rollup_estado w
+        WHERE e."stoppedAt" >= w.marca_parada AND (e."stoppedAt", e.id) > (w.marca_parada, w.marca_id)
+            AND e."startedAt" > NOW() - INTERVAL '24 hours'
+            AND e.status = 'error'
+            AND (%(workflow)s::text IS NULL OR e."workflowId" = %(workflow)s)
+    ) AS t
+    GROUP BY "workflowId"
+"""
+
+# Minutos completos da janela vêm dos buckets; o minuto da borda e as
+# execuções ainda não incorporadas vêm de execution_entity pelo índice de
+# "stoppedAt" (toda execução iniciada na janela terminou dentro dela).
+SQL_TEMPOS_ROLLUP = """
+    SELECT "workflowId", sum(soma) / sum(total), max(maximo)
+    FROM (
+        SELECT "workflowId", soma_duracao AS soma, total, max_duracao AS maximo
+        FROM n8n_monitor.execucoes_minuto
+        WHERE minuto >= date_trunc('minute', NOW() - interval '10 MINUTES') + interval '1 minute'
+            AND status IN ('success','error')
+            AND (%(workflow)s::text IS NULL OR "workflowId" = %(workflow)s)
+        UNION ALL
+        SELECT e."workflowId", EXTRACT(EPOCH FROM (e."stoppedAt" - e."startedAt"))::float8, 1,
+               EXTRACT(EPOCH FROM (e."stoppedAt" - e."startedAt"))::float8
+        FROM n8n."execution_entity" e, n8n_monitor.rollup_estado w
+        WHERE e."stoppedAt" >= NOW() - interval '10 MINUTES'
+            AND e."startedAt" > NOW() - interval '10 MINUTES'
+            AND (e."startedAt" < date_trunc('minute', NOW() - interval '10 MINUTES') + interval '1 minute'
+                 OR (e."stoppedAt", e.id) > (w.marca_parada, w.marca_id))
+            AND e.status IN ('success','error')
+            AND (%(workflow)s::text IS NULL OR e."workflowId" = %(workflow)s)
+    ) AS t
+    GROUP BY "workflowId"
+"""
+
+# Todas as estatísticas de duração numa passada. O limite em "stoppedAt" é
+# redundante (termina depois de começar), mas deixa o PostgreSQL usar o índice
+# ("stoppedAt", status, "deletedAt") do n8n em vez de varrer a tabela.
+SQL_DURACAO = """
+    SELECT "workflowId", count(*), avg(duracao),
+           percentile_cont(ARRAY[0.5, 0.9, 0.99]) WITHIN GROUP (ORDER BY duracao),
+           max(duracao),
+           {histograma}
+    FROM (
+        SELECT "workflowId", EXTRACT(EPOCH FROM ("stoppedAt" - "startedAt"))::float8 AS duracao
+        FROM n8n."execution_entity"
+        WHERE status IN ('success','error') AND "startedAt" > NOW() - interval '10 MINUTES'
+            AND "stoppedAt" >= NOW() - interval '10 MINUTES'
+            AND (%(workflow)s::text IS NULL OR "workflowId" = %(workflow)s)
+    ) AS t
+    GROUP BY "workflowId"
+""".format(histograma=",\n           ".join(
+    f"count(*) FILTER (WHERE duracao <= {limite})" for limite in LIMITES_HISTOGRAMA))
+
+
+# Fila numa passada. Execuções em andamento/na fila têm "stoppedAt" nulo e as
+# demais janelas são de no máximo 10 minutos: o filtro usa o índice
+# ("stoppedAt", status, "deletedAt") do n8n em vez de varrer a tabela.
+SQL_FILA = """
+    SELECT "workflowId",
+           count(*) FILTER (WHERE "startedAt" > NOW() - interval '1 MINUTE'),
+           count(*) FILTER (WHERE "stoppedAt" > NOW() - interval '1 MINUTE'),
+           count(*) FILTER (WHERE status = 'new'),
+           count(*) FILTER (WHERE status = 'running'),
+           count(*) FILTER (WHERE status = 'waiting'),
+           COALESCE(EXTRACT(EPOCH FROM NOW() - min("startedAt") FILTER (WHERE status = 'running')), 0)::float8,
+           COALESCE(avg(GREATEST(EXTRACT(EPOCH FROM ("startedAt" - "createdAt")), 0))
+               FILTER (WHERE "startedAt" > NOW() - interval '10 MINUTES'), 0)::float8
+    FROM n8n."execution_entity"
+    WHERE ("stoppedAt" IS NULL OR "stoppedAt" >= NOW() - interval '10 MINUTES')
+        AND (%(workflow)s::text IS NULL OR "workflowId" = %(workflow)s)
+    GROUP BY "workflowId"
+"""
+
+# Todas as métricas por workflow numa consulta: workflow_entity + um único
+# agrupamento de execution_entity (erros em 24h e estatísticas de duração dos
+# últimos 10 minutos calculadas com FILTER sobre as mesmas linhas).
+SQL_METRICAS = """
+    SELECT w.id, w."active", w."isArchived", w."updatedAt",
+           COALESCE(e.erros, 0), COALESCE(e.quantidade, 0), e.media, e.percentis, e.maximo,
+           {histograma}
+    FROM n8n."workflow_entity" w
+    LEFT JOIN (
+        SELECT "workflowId",
+               count(*) FILTER (WHERE status = 'error') AS erros,
+               count(*) FILTER (WHERE recente) AS quantidade,
+               avg(duracao) FILTER (WHERE recente) AS media,
+               percentile_cont(ARRAY[0.5, 0.9, 0.99]) WITHIN GROUP (ORDER BY duracao)
+                   FILTER (WHERE recente) AS percentis,
+               max(duracao) FILTER (WHERE recente) AS maximo,
+               {histograma_execucoes}
+        FROM (
+            SELECT "workflowId", status, EXTRACT(EPOCH FROM ("stoppedAt" - "startedAt"))::float8 AS duracao,
+                   status IN ('success','error') AND "startedAt" > NOW() - interval '10 MINUTES' AS recente
+            FROM n8n."execution_entity"
+            WHERE "startedAt" > NOW() - INTERVAL '24 hours'
+                AND (status = 'error' OR "startedAt" > NOW() - interval '10 MINUTES')
+        ) AS t
+        GROUP BY "workflowId"
+    ) AS e ON e."workflowId" = w.id
+""".format(
+    histograma=",\n           ".join(f"COALESCE(e.le_{limite}, 0)" for limite in LIMITES_HISTOGRAMA),
+    histograma_execucoes=",\n               ".join(
+        f"count(*) FILTER (WHERE recente AND duracao <= {limite}) AS le_{limite}" for limite in LIMITES_HISTOGRAMA))
+
+
+def unixtime(data):
+    """Converte um timestamptz do banco em unixtime (0 se nulo)."""
+    if data is None:
+        return 0
+    return int(data.timestamp())
+
+
+def coleta_familia_workflows(cursor):
+    """Status, arquivamento e data de alteração de todos os workflows."""
+    cursor.execute(SQL_WORKFLOWS)
+    dados = {"workflow_status": {}, "is_archived": {}, "update": {}}
+    for workflow_id, ativo, arquivado, atualizado in cursor.fetchall():
+        dados["workflow_status"][workflow_id] = 1 if ativo else 0
+        dados["is_archived"][workflow_id] = 1 if arquivado else 0
+        dados["update"][workflow_id] = unixtime(atualizado)
+    return dados
+
+
+def coleta_familia_execucoes(cursor, rollup=False, workflow_id=None):
+    """Quantidade de execuções com erro nas últimas 24h por workflow."""
+    if rollup:
+        cursor.execute(SQL_EXECUCOES_ERRO_ROLLUP, {"workflow": workflow_id})
+    else:
+        cursor.execute(SQL_EXECUCOES_ERRO)
+    return {"execucao_status": dict(cursor.fetchall())}
+
+
+def coleta_familia_tempos(cursor, rollup=False, workflow_id=None):
+    """Tempo médio e máximo de execução nos últimos 10 minutos por workflow."""
+    if rollup:
+        cursor.execute(SQL_TEMPOS_ROLLUP, {"workflow": workflow_id})
+    else:
+        cursor.execute(SQL_TEMPOS)
+    dados = {"average_time": {}, "max_time": {}}
+    for workflow_id, media, maximo in cursor.fetchall():
+        dados["average_time"][workflow_id] = float(media) if media is not None else 0
+        dados["max_time"][workflow_id] = float(maximo) if maximo is not None else 0
+    return dados
+
+
+def coleta_familia_duracao(cursor, workflow_id=None):
+    """Contagem, média, percentis, máximo e histograma da duração nos últimos 10 minutos."""
+    cursor.execute(SQL_DURACAO, {"workflow": workflow_id})
+    estatisticas = ESTATISTICAS_DURACAO + ESTATISTICAS_HISTOGRAMA
+    dados = {f"duration_{estatistica}": {} for estatistica in estatisticas}
+    for workflow, quantidade, media, percentis, maximo, *histograma in cursor.fetchall():
+        for estatistica, valor in zip(estatisticas, [quantidade, media, *percentis, maximo, *histograma]):
+            dados[f"duration_{estatistica}"][workflow] = valor
+    return dados
+
+
+def coleta_familia_fila(cursor, workflow_id=None):
+    """Vazão, execuções em new/running/waiting, idade da mais antiga em andamento e espera na fila."""
+    cursor.execute(SQL_FILA, {"workflow": workflow_id})
+    dados = {acao: {} for acao in ACOES_FILA}
+    for workflow, *valores in cursor.fetchall():
+        for acao, valor in zip(ACOES_FILA, valores):
+            dados[acao][workflow] = round(valor, 3) if isinstance(valor, float) else valor
+    return dados
+
+
+def coleta_metricas(cursor):
+    """Todas as ações de CHAVES_ITENS para todos os workflows, com SQL_METRICAS (e SQL_FILA)."""
+    cursor.execute(SQL_METRICAS)
+    dados = {acao: {} for acao in CHAVES_ITENS
+             if acao not in ACOES_JANELAS + ACOES_FILA + ACOES_FALHAS + ACOES_LINHA_BASE}
+    estatisticas = ESTATISTICAS_DURACAO + ESTATISTICAS_HISTOGRAMA
+    for (workflow_id, ativo, arquivado, atualizado, erros, quantidade, media, percentis, maximo,
+         *histograma) in cursor.fetchall():
+        media = media if media is not None else 0
+        maximo = maximo if maximo is not None else 0
+        dados["execucao_status"][workflow_id] = erros
+        dados["workflow_status"][workflow_id] = 1 if ativo else 0
+        dados["is_archived"][workflow_id] = 1 if arquivado else 0
+        dados["update"][workflow_id] = unixtime(atualizado)
+        dados["average_time"][workflow_id] = media
+        dados["max_time"][workflow_id] = maximo
+        for estatistica, valor in zip(estatisticas, [quantidade, media, *(percentis or [0, 0, 0]), maximo,
+                                                     *histograma]):
+            dados[f"duration_{estatistica}"][workflow_id] = valor
+    # A fila olha só as execuções sem fim ou recentes: não cabe no agrupamento de 24h acima
+    dados.update(coleta_familia_fila(cursor))
+    return dados
+
+
+def metricas_json(snapshot):
+    """JSON compacto {workflow_id: {acao: valor}} do item mestre, numa linha."""
+    documento = {
+        workflow_id: {acao: valor_metrica(snapshot, acao, workflow_id) for acao in CHAVES_ITENS if acao in snapshot}
+        for workflow_id in workflows_do_snapshot(snapshot)
+    }
+    return json.dumps(documento, separators=(",", ":"), default=float)
+
+
+# Famílias de métricas: cada uma preenche uma ou mais ações do coletor
+FAMILIAS = {
+    "workflows": coleta_familia_workflows,
+    "execucoes": coleta_familia_execucoes,
+    "tempos": coleta_familia_tempos,
+    "duracao": coleta_familia_duracao,
+    "fila": coleta_familia_fila,
+}
+
+# Família que produz cada ação do coletor
+FAMILIA_DA_ACAO = {
+    "execucao_status": "execucoes",
+    "workflow_status": "workflows",
+    "is_archived": "workflows",
+    "update": "workflows",
+    "average_time": "tempos",
+    "max_time": "tempos",
+}
+FAMILIA_DA_ACAO.update({acao: "duracao" for acao in CHAVES_ITENS if acao.startswith("duration_")})
+FAMILIA_DA_ACAO.update({acao: "fila" for acao in ACOES_FILA})
+
+# Famílias que podem ler do rollup de execuções
+FAMILIAS_ROLLUP = {"execucoes", "tempos"}
+
+
+def coleta_snapshot(conn, familias=None, rollup=False):
+    """Executa as famílias pedidas (todas por padrão) numa única conexão.
+
+    Retorna {acao: {workflow_id: valor}}. Levanta psycopg2.Error em caso de
+    falha; quem chama decide se aborta ou reaproveita o snapshot anterior.
+    """
+    snapshot = {}
+    with conn.cursor() as cursor:
+        for nome in familias or FAMILIAS:
+            if rollup and nome in FAMILIAS_ROLLUP:
+                snapshot.update(FAMILIAS[nome](cursor, rollup=True))
+            else:
+                snapshot.update(FAMILIAS[nome](cursor))
+    # Consultas somente leitura: encerra a transação para não segurar snapshot no banco
+    conn.rollback()
+    return snapshot
+
+
+def valor_metrica(snapshot, acao, workflow_id):
+    """Lê um valor do snapshot com o mesmo padrão do coletor (0 quando não há dados)."""
+    return snapshot.get(acao, {}).get(workflow_id, 0)
+
+
+def workflows_do_snapshot(snapshot):
+    """Ids dos workflows do snapshot (os de workflow_entity, quando consultados)."""
+    if "workflow_status" in snapshot:
+        return sorted(snapshot["workflow_status"])
+    ids = set()
+    for valores in snapshot.values():
+        ids.update(valores)
+    return sorted(ids)
+
+
+def itens_do_snapshot(snapshot):
+    """Gera pares (chave do item Zabbix, valor) para todos os workflows."""
+    for workflow_id in workflows_do_snapshot(snapshot):
+        for acao, chave in CHAVES_ITENS.items():
+            if acao in snapshot:
+                yield chave.format(workflow_id), valor_metrica(snapshot, acao, workflow_id)
+
@@ -0,0 +1,170 @@
+"""Modo de custo limitado: o coletor nunca vira o problema de carga do banco.
+
+Com [BUDGET] ENABLED as conexões de coleta (bulk, daemon, itens agent e
+metrics_json) abrem com statement_timeout e lock_timeout por consulta,
+transação somente leitura por padrão (exceto com [ROLLUP] ENABLED, que grava
+os buckets) e ajustes de baixo custo (sem JIT nem workers paralelos), e se
+identificam como application_name = n8n-by-zabbix.
+
+No bulk e no daemon cada família de métricas roda separada: a que estoura o
+orçamento é cancelada pelo PostgreSQL e fica com os últimos valores obtidos
+(STATE_FILE no bulk, memória no daemon). O item n8n.collector.staleness
+informa, em segundos, a idade do dado mais antigo entre os enviados (0 com
+tudo em dia). Um ciclo lento (família cancelada ou acima de metade do
+orçamento) dobra o intervalo até MAX_BACKOFF vezes o normal; um ciclo rápido
+o reduz pela metade. No modo agent o valor anterior vem do [CACHE].
+"""
+
+import json
+import os
+import sys
+import tempfile
+import time
+
+import psycopg2
+import psycopg2.errors
+
+from n8n_metricas import FAMILIAS, FAMILIAS_ROLLUP
+
+STATEMENT_TIMEOUT_PADRAO = 3000  # ms
+LOCK_TIMEOUT_PADRAO = 500  # ms
+CONNECT_TIMEOUT_PADRAO = 5  # s
+FATOR_MAXIMO_PADRAO = 8
+INTERVALO_BASE_PADRAO = 60  # s, o intervalo do cron do bulk
+STATE_FILE_PADRAO = '/var/lib/n8n-by-zabbix/orcamento.json'
+# Folga para a execução do cron que cai exatamente no fim da espera não ser pulada
+FOLGA_SEGUNDOS = 5
+
+CHAVE_DEFASAGEM = "n8n.collector.staleness"
+ACAO_DEFASAGEM = "staleness"
+
+# Consulta cancelada pelo statement_timeout ou lock não obtido dentro do lock_timeout
+ERROS_ORCAMENTO = (psycopg2.errors.QueryCanceled, psycopg2.errors.LockNotAvailable)
+
+
+def config_orcamento(configs):
+    """Parâmetros da seção [BUDGET], ou None se ENABLED não estiver ligado."""
+    if not configs.has_section('BUDGET') or not configs['BUDGET'].getboolean('ENABLED', False):
+        return None
+    secao = configs['BUDGET']
+    rollup = configs.has_section('ROLLUP') and configs['ROLLUP'].getboolean('ENABLED', False)
+    return {
+        "statement_timeout": int(secao.get('STATEMENT_TIMEOUT', STATEMENT_TIMEOUT_PADRAO)),
+        "lock_timeout": int(secao.get('LOCK_TIMEOUT', LOCK_TIMEOUT_PADRAO)),
+        "connect_timeout": int(secao.get('CONNECT_TIMEOUT', CONNECT_TIMEOUT_PADRAO)),
+        "somente_leitura": not rollup,
+        "fator_maximo": int(secao.get('MAX_BACKOFF', FATOR_MAXIMO_PADRAO)),
+        "intervalo_base": float(secao.get('BASE_INTERVAL', INTERVALO_BASE_PADRAO)),
+        "caminho": secao.get('STATE_FILE', STATE_FILE_PADRAO),
+    }
+
+
+def parametros_conexao(orcamento):
+    """Parâmetros extras de psycopg2.connect: configurações da sessão via libpq (sem ida e volta a mais)."""
+    opcoes = [
+        f"-c statement_timeout={orcamento['statement_timeout']}",
+        f"-c lock_timeout={orcamento['lock_timeout']}",
+        "-c jit=off",
+        "-c max_parallel_workers_per_gather=0",
+    ]
+    if orcamento["somente_leitura"]:
+        opcoes.append("-c default_transaction_read_only=on")
+    return {
+        "connect_timeout": orcamento["connect_timeout"],
+        "application_name": "n8n-by-zabbix",
+        "options": " ".join(opcoes),
+    }
+
+
+def coleta_limitada(conn, familias, anteriores, rollup=False, limite_lento=None):
+    """Executa cada família dentro do orçamento; a que estourar fica com o valor anterior.
+
+    `anteriores` é {familia: {"em": epoch, "dados": {acao: {workflow_id: valor}}}}
+    da última coleta. Retorna (snapshot, estado das famílias no mesmo formato,
+    ciclo lento?). Erros que não são de orçamento sobem como psycopg2.Error.
+    """
+    snapshot = {}
+    estado = {}
+    lento = False
+    with conn.cursor() as cursor:
+        for nome in familias or FAMILIAS:
+            inicio = time.monotonic()
+            try:
+                if rollup and nome in FAMILIAS_ROLLUP:
+                    dados = FAMILIAS[nome](cursor, rollup=True)
+                else:
+                    dados = FAMILIAS[nome](cursor)
+            except ERROS_ORCAMENTO as e:
+                conn.rollback()
+                lento = True
+                anterior = anteriores.get(nome)
+                print(f"Família {nome} excedeu o orçamento ({str(e).strip()}); "
+                      f"{'usando os valores anteriores' if anterior else 'sem valores anteriores'}.",
+                      file=sys.stderr)
+                if anterior:
+                    estado[nome] = anterior
+                    snapshot.update(anterior["dados"])
+                continue
+            if limite_lento is not None and time.monotonic() - inicio > limite_lento:
+                lento = True
+            estado[nome] = {"em": time.time(), "dados": dados}
+            snapshot.update(dados)
+    conn.rollback()
+    return snapshot, estado, lento
+
+
+def defasagem(estado, agora=None):
+    """Idade, em segundos, do dado mais antigo entre as famílias do estado (0 sem estado)."""
+    agora = agora or time.time()
+    if not estado:
+        return 0
+    return max(0, int(agora - min(familia["em"] for familia in estado.values())))
+
+
+def proximo_fator(fator, lento, fator_maximo):
+    """Dobra o fator do intervalo num ciclo lento (até fator_maximo) e reduz pela metade num rápido."""
+    return min(fator * 2, fator_maximo) if lento else max(1, fator // 2)
+
+
+def carregar_estado(caminho):
+    """{"familias": {...}, "fator": n, "proxima": epoch} do bulk; vazio se ausente ou ilegível."""
+    try:
+        with open(caminho, encoding="utf-8") as arquivo:
+            return json.load(arquivo)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        print(f"Aviso: estado do orçamento ilegível em {caminho} ({e}); recomeçando.", file=sys.stderr)
+        return {}
+
+
+def salvar_estado(caminho, estado):
+    """Grava o estado de forma atômica (arquivo temporário + rename)."""
+    diretorio = os.path.dirname(caminho) or "."
+    fd, temporario = tempfile.mkstemp(dir=diretorio, prefix=".orcamento-")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as arquivo:
+            json.dump(estado, arquivo, separators=(",", ":"), default=float)
+        os.replace(temporario, caminho)
+    except BaseException:
+        os.unlink(temporario)
+        raise
+
+
+def pular_ciclo(estado, agora=None):
+    """True se o intervalo adaptativo manda pular esta execução do bulk."""
+    return (agora or time.time()) < estado.get("proxima", 0)
+
+
+def registrar_ciclo(estado, familias, lento, orcamento, inicio=None):
+    """Atualiza o estado do bulk com as famílias coletadas e o próximo horário permitido.
+
+    `inicio` é o horário em que o ciclo começou: com fator N a próxima coleta
+    é N intervalos depois dele (N - 1 execuções do cron puladas), como no daemon.
+    """
+    inicio = inicio or time.time()
+    fator = proximo_fator(estado.get("fator", 1), lento, orcamento["fator_maximo"])
+    estado["familias"] = familias
+    estado["fator"] = fator
+    estado["proxima"] = inicio + fator * orcamento["intervalo_base"] - FOLGA_SEGUNDOS if fator > 1 else 0
+    return estado
@@ -0,0 +1,163 @@
+"""Exportador Prometheus (/metrics) do snapshot do daemon do coletor.
+
+Com [PROMETHEUS] ENABLED o daemon (n8n_daemon) também escuta em HTTP e serve,
+no formato texto do Prometheus, as mesmas métricas que responde ao Zabbix pelo
+socket: cada ação do snapshot vira uma métrica gauge com o rótulo workflow_id
+(e n8n_instance com várias seções [N8N:<nome>]).
+
+As linhas de cada métrica são renderizadas e codificadas uma vez por
+atualização do snapshot, na thread de atualização; o scrape só junta os blocos
+prontos, então o custo dele não cresce com o número de workflows.
+`n8n-by-zabbix-coletas.py prometheus` imprime a mesma saída uma vez (para o
+textfile collector do node_exporter ou para conferir a saída).
+"""
+
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from n8n_metricas import (ACOES_FILA, ESTATISTICAS_DURACAO, JANELAS_ERROS, LIMITES_HISTOGRAMA,
+                          workflows_do_snapshot)
+
+ENDERECO_PADRAO = '127.0.0.1'
+PORTA_PADRAO = 9469
+CAMINHO_PADRAO = '/metrics'
+TIPO_CONTEUDO = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Métrica de cada ação do snapshot: acao -> (nome, rótulos fixos)
+METRICAS = {
+    "execucao_status": ("n8n_workflow_errors_24h", {}),
+    "workflow_status": ("n8n_workflow_active", {}),
+    "is_archived": ("n8n_workflow_archived", {}),
+    "update": ("n8n_workflow_updated_timestamp_seconds", {}),
+    "average_time": ("n8n_workflow_execution_time_avg_seconds", {}),
+    "max_time": ("n8n_workflow_execution_time_max_seconds", {}),
+    "duration_count": ("n8n_workflow_executions_10m", {}),
+}
+METRICAS.update({f"duration_{estatistica}": ("n8n_workflow_duration_10m_seconds", {"stat": estatistica})
+                 for estatistica in ESTATISTICAS_DURACAO if estatistica != "count"})
+METRICAS.update({f"duration_le_{limite}": ("n8n_workflow_executions_10m_le", {"le": str(limite)})
+                 for limite in LIMITES_HISTOGRAMA})
+METRICAS.update({f"errors_{janela}": ("n8n_workflow_errors", {"window": janela}) for janela in JANELAS_ERROS})
+METRICAS.update({acao: ("n8n_workflow_queue", {"stat": acao[len("queue_"):]}) for acao in ACOES_FILA})
+METRICAS["baseline_score"] = ("n8n_workflow_duration_score", {})
+
+# Texto do HELP de cada métrica, na ordem da saída
+AJUDA = {
+    "n8n_workflow_errors_24h": "Execuções com erro nas últimas 24 horas.",
+    "n8n_workflow_active": "1 se o workflow está ativo.",
+    "n8n_workflow_archived": "1 se o workflow está arquivado.",
+    "n8n_workflow_updated_timestamp_seconds": "Unixtime da última alteração do workflow.",
+    "n8n_workflow_execution_time_avg_seconds": "Duração média das execuções dos últimos 10 minutos.",
+    "n8n_workflow_execution_time_max_seconds": "Duração máxima das execuções dos últimos 10 minutos.",
+    "n8n_workflow_executions_10m": "Execuções finalizadas nos últimos 10 minutos.",
+    "n8n_workflow_duration_10m_seconds": "Média, percentis e máximo da duração nos últimos 10 minutos.",
+    "n8n_workflow_executions_10m_le": "Execuções dos últimos 10 minutos com duração <= le segundos.",
+    "n8n_workflow_errors": "Execuções com erro na janela deslizante ([ERROR_WINDOWS]).",
+    "n8n_workflow_queue": "Fila e saturação dos workers (modo queue do n8n).",
+    "n8n_workflow_duration_score": "Desvio da duração recente em desvios padrão da linha de base.",
+}
+METRICA_IDADE = "n8n_collector_snapshot_age_seconds"
+
+
+def config_prometheus(configs):
+    """Parâmetros da seção [PROMETHEUS], ou None se ENABLED não estiver ligado."""
+    if not configs.has_section('PROMETHEUS') or not configs['PROMETHEUS'].getboolean('ENABLED', False):
+        return None
+    secao = configs['PROMETHEUS']
+    return {
+        "endereco": secao.get('LISTEN_ADDRESS', ENDERECO_PADRAO),
+        "porta": secao.getint('PORT', PORTA_PADRAO),
+        "caminho": secao.get('PATH', CAMINHO_PADRAO),
+    }
+
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _numero(valor):
+    if isinstance(valor, int):
+        return str(valor)
+    return repr(float(valor))
+
+
+def _rotulos(rotulos):
+    return "".join(f',{chave}="{_escapar(valor)}"' for chave, valor in rotulos.items())
+
+
+def amostras(snapshot, rotulos=None):
+    """Linhas de cada métrica do snapshot, já codificadas: {nome: bytes}."""
+    workflows = workflows_do_snapshot(snapshot)
+    fixos = _rotulos(rotulos or {})
+    linhas = {}
+    for acao, (nome, rotulos_acao) in METRICAS.items():
+        if acao not in snapshot:
+            continue
+        valores = snapshot[acao]
+        sufixo = fixos + _rotulos(rotulos_acao) + "} "
+        linhas.setdefault(nome, []).extend(
+            f'{nome}{{workflow_id="{_escapar(workflow_id)}"{sufixo}{_numero(valores.get(workflow_id, 0))}\n'
+            for workflow_id in workflows)
+    return {nome: "".join(partes).encode("utf-8") for nome, partes in linhas.items()}
+
+
+def exposicao(renderizados, agora=None):
+    """Corpo do /metrics em pedaços de bytes.
+
+    `renderizados` é uma lista de (rótulos, amostras, atualizado_em), uma por
+    instância; as linhas da mesma métrica ficam juntas sob um único HELP/TYPE.
+    """
+    agora = agora or time.time()
+    pedacos = []
+    for nome, ajuda in AJUDA.items():
+        blocos = [linhas[nome] for _, linhas, _ in renderizados if nome in linhas]
+        if blocos:
+            pedacos.append(f"# HELP {nome} {ajuda}\n# TYPE {nome} gauge\n".encode("utf-8"))
+            pedacos.extend(blocos)
+    pedacos.append(f"# HELP {METRICA_IDADE} Segundos desde a última atualização do snapshot (-1 = nunca).\n"
+                   f"# TYPE {METRICA_IDADE} gauge\n".encode("utf-8"))
+    for rotulos, _, atualizado_em in renderizados:
+        idade = round(agora - atualizado_em, 3) if atualizado_em else -1
+        texto_rotulos = f"{{{_rotulos(rotulos)[1:]}}}" if rotulos else ""
+        pedacos.append(f"{METRICA_IDADE}{texto_rotulos} {_numero(idade)}\n".encode("utf-8"))
+    return pedacos
+
+
+class MetricasHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != self.server.caminho:
+            self.send_error(404)
+            return
+        pedacos = exposicao([(coletor.prometheus, coletor.amostras, coletor.atualizado_em)
+                             for coletor in self.server.coletores.values()])
+        self.send_response(200)
+        self.send_header("Content-Type", TIPO_CONTEUDO)
+        self.send_header("Content-Length", str(sum(len(pedaco) for pedaco in pedacos)))
+        self.end_headers()
+        for pedaco in pedacos:
+            self.wfile.write(pedaco)
+
+    def log_message(self, formato, *args):
+        pass
+
+
+class ServidorMetricas(ThreadingHTTPServer):
+    daemon_threads = True
+
+
+def iniciar_servidor(coletores, parametros):
+    """Serve /metrics dos coletores do daemon numa thread; devolve o servidor (ou None em caso de erro)."""
+    try:
+        servidor = ServidorMetricas((parametros["endereco"], parametros["porta"]), MetricasHandler)
+    except OSError as e:
+        print(f"Erro ao escutar em {parametros['endereco']}:{parametros['porta']} ([PROMETHEUS]): {e}",
+              file=sys.stderr)
+        return None
+    servidor.coletores = coletores
+    servidor.caminho = parametros["caminho"]
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    print(f"Métricas Prometheus em http://{parametros['endereco']}:{parametros['porta']}{parametros['caminho']}",
+          file=sys.stderr)
+    return servidor
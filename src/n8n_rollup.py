@@ -0,0 +1,166 @@
+"""Rollup por minuto das execuções do n8n, mantido numa tabela à parte.
+
+A tabela n8n_monitor.execucoes_minuto guarda, por workflow, minuto de início
+e status, a quantidade de execuções finalizadas e a soma/máximo da duração.
+É alimentada de forma incremental a partir de n8n.execution_entity por uma
+marca d'água ("stoppedAt", id): cada execução finalizada entra uma única vez,
+só depois de LAG_SECONDS do fim, para não perder transações que confirmam
+fora de ordem. As consultas do coletor (n8n_metricas, rollup=True) somam os
+buckets e completam com as execuções acima da marca d'água, então o resultado
+não depende de quão recente foi a última atualização.
+"""
+
+import sys
+
+import psycopg2
+
+SCHEMA = "n8n_monitor"
+ATRASO_PADRAO = 30
+LOTE_PADRAO = 50000
+RETENCAO_DIAS_PADRAO = 2
+
+DDL = f"""
+CREATE SCHEMA IF NOT EXISTS {SCHEMA};
+
+CREATE TABLE IF NOT EXISTS {SCHEMA}.execucoes_minuto (
+    "workflowId" varchar(36) NOT NULL,
+    minuto timestamptz NOT NULL,
+    status varchar NOT NULL,
+    total integer NOT NULL,
+    soma_duracao double precision NOT NULL,
+    max_duracao double precision NOT NULL,
+    PRIMARY KEY ("workflowId", minuto, status)
+);
+CREATE INDEX IF NOT EXISTS execucoes_minuto_minuto ON {SCHEMA}.execucoes_minuto (minuto);
+CREATE INDEX IF NOT EXISTS execucoes_minuto_status_minuto
+    ON {SCHEMA}.execucoes_minuto (status, minuto) INCLUDE ("workflowId", total);
+
+CREATE TABLE IF NOT EXISTS {SCHEMA}.rollup_estado (
+    id smallint PRIMARY KEY CHECK (id = 1),
+    marca_parada timestamptz NOT NULL,
+    marca_id bigint NOT NULL,
+    atualizado_em timestamptz
+);
+"""
+
+SQL_REINICIAR = f"""
+    TRUNCATE {SCHEMA}.execucoes_minuto;
+    INSERT INTO {SCHEMA}.rollup_estado (id, marca_parada, marca_id)
+    VALUES (1, NOW() - %(retencao)s * INTERVAL '1 day', 0)
+    ON CONFLICT (id) DO UPDATE SET marca_parada = EXCLUDED.marca_parada, marca_id = 0, atualizado_em = NULL;
+"""
+
+# SKIP LOCKED: se outro processo (cron, daemon) já está atualizando, este desiste
+SQL_TRAVAR_ESTADO = f"""
+    SELECT marca_parada, marca_id FROM {SCHEMA}.rollup_estado WHERE id = 1 FOR UPDATE SKIP LOCKED
+"""
+
+SQL_INCORPORAR = f"""
+    WITH novos AS (
+        SELECT id, "workflowId", "startedAt", "stoppedAt", status
+        FROM n8n."execution_entity"
+        WHERE "stoppedAt" >= %(parada)s AND ("stoppedAt", id) > (%(parada)s, %(id)s)
+            AND "stoppedAt" <= NOW() - %(atraso)s * INTERVAL '1 second'
+            AND "startedAt" IS NOT NULL
+        ORDER BY "stoppedAt", id
+        LIMIT %(lote)s
+    ), gravados AS (
+        INSERT INTO {SCHEMA}.execucoes_minuto AS m
+            ("workflowId", minuto, status, total, soma_duracao, max_duracao)
+        SELECT "workflowId", date_trunc('minute', "startedAt"), status,
+               count(*), sum(duracao), max(duracao)
+        FROM (SELECT *, EXTRACT(EPOCH FROM ("stoppedAt" - "startedAt"))::float8 AS duracao FROM novos) AS n
+        GROUP BY 1, 2, 3
+        ON CONFLICT ("workflowId", minuto, status) DO UPDATE
+            SET total = m.total + EXCLUDED.total,
+                soma_duracao = m.soma_duracao + EXCLUDED.soma_duracao,
+                max_duracao = GREATEST(m.max_duracao, EXCLUDED.max_duracao)
+    )
+    SELECT count(*), (array_agg("stoppedAt" ORDER BY "stoppedAt" DESC, id DESC))[1],
+           (array_agg(id ORDER BY "stoppedAt" DESC, id DESC))[1]
+    FROM novos
+"""
+
+SQL_AVANCAR_ESTADO = f"""
+    UPDATE {SCHEMA}.rollup_estado
+    SET marca_parada = COALESCE(%(parada)s, marca_parada), marca_id = COALESCE(%(id)s, marca_id),
+        atualizado_em = NOW()
+    WHERE id = 1
+"""
+
+SQL_EXPURGAR = f"""
+    DELETE FROM {SCHEMA}.execucoes_minuto WHERE minuto < NOW() - %(retencao)s * INTERVAL '1 day'
+"""
+
+
+def parametros_rollup(configs):
+    """Parâmetros de manutenção da seção [ROLLUP] (ou os padrões)."""
+    secao = configs['ROLLUP'] if configs.has_section('ROLLUP') else {}
+    return {
+        "atraso": int(secao.get('LAG_SECONDS', ATRASO_PADRAO)),
+        "lote": int(secao.get('BATCH_SIZE', LOTE_PADRAO)),
+        "retencao": int(secao.get('RETENTION_DAYS', RETENCAO_DIAS_PADRAO)),
+    }
+
+
+def config_rollup(configs):
+    """Parâmetros do rollup, ou None se [ROLLUP] ENABLED não estiver ligado."""
+    if not configs.has_section('ROLLUP') or not configs['ROLLUP'].getboolean('ENABLED', False):
+        return None
+    return parametros_rollup(configs)
+
+
+def atualizar_rollup(conn, atraso=ATRASO_PADRAO, lote=LOTE_PADRAO, retencao=RETENCAO_DIAS_PADRAO):
+    """Incorpora as execuções finalizadas desde a marca d'água, em lotes.
+
+    Cada lote é uma transação curta (buckets e marca d'água juntos). Retorna
+    quantas execuções foram incorporadas, ou None se outra atualização estava
+    em andamento. Levanta psycopg2.Error em caso de falha.
+    """
+    incorporadas = 0
+    while True:
+        with conn, conn.cursor() as cursor:
+            cursor.execute(SQL_TRAVAR_ESTADO)
+            marca = cursor.fetchone()
+            if marca is None:
+                return None
+            cursor.execute(SQL_INCORPORAR, {"parada": marca[0], "id": marca[1], "atraso": atraso, "lote": lote})
+            quantidade, parada, ultimo_id = cursor.fetchone()
+            cursor.execute(SQL_AVANCAR_ESTADO, {"parada": parada, "id": ultimo_id})
+        incorporadas += quantidade
+        if quantidade < lote:
+            break
+    with conn, conn.cursor() as cursor:
+        cursor.execute(SQL_EXPURGAR, {"retencao": retencao})
+    return incorporadas
+
+
+def bootstrap_rollup(conn, atraso=ATRASO_PADRAO, lote=LOTE_PADRAO, retencao=RETENCAO_DIAS_PADRAO):
+    """Cria o schema/tabelas (se preciso) e recalcula o rollup dos últimos `retencao` dias."""
+    with conn, conn.cursor() as cursor:
+        cursor.execute(DDL)
+        cursor.execute(SQL_REINICIAR, {"retencao": retencao})
+    incorporadas = atualizar_rollup(conn, atraso, lote, retencao)
+    # Sem estatísticas da carga inicial o planejador escolhe planos ruins
+    with conn, conn.cursor() as cursor:
+        cursor.execute(f"ANALYZE {SCHEMA}.execucoes_minuto")
+    return incorporadas
+
+
+def executar_comando(comando, conn, configs):
+    """Comandos rollup-bootstrap e rollup-refresh do coletor."""
+    parametros = parametros_rollup(configs)
+    try:
+        if comando == "rollup-bootstrap":
+            incorporadas = bootstrap_rollup(conn, **parametros)
+        else:
+            incorporadas = atualizar_rollup(conn, **parametros)
+    except psycopg2.Error as e:
+        print(f"Erro ao atualizar o rollup de execuções: {e}", file=sys.stderr)
+        return 1
+    if incorporadas is None:
+        print("Outra atualização do rollup está em andamento.", file=sys.stderr)
+    else:
+        print(f"Execuções incorporadas ao rollup: {incorporadas}.")
+    return 0
+
@@ -0,0 +1,289 @@
+"""Modo stream: eventos de execução via LISTEN/NOTIFY enviados ao trapper.
+
+Um gatilho em n8n.execution_entity (instalado com stream-install, funções no
+schema n8n_monitor) publica no canal n8n_monitor_execucoes cada execução que
+termina ou passa a erro. O processo `n8n-by-zabbix-coletas.py stream` escuta
+o canal, mantém em memória as execuções das janelas do coletor (erros das
+últimas 24h, durações dos últimos 10 minutos) e envia ao trapper do Zabbix só
+os itens execution.status/average.time/max.time cujo valor mudou (ou, com
+[THROTTLING], cujo heartbeat venceu), no máximo a cada FLUSH_INTERVAL
+segundos. Parado, o banco não recebe consulta alguma além da
+ressincronização a cada RESYNC_INTERVAL segundos, que recarrega as janelas do
+banco e cobre notificações perdidas (reconexões, gatilho desligado).
+"""
+
+import json
+import select
+import signal
+import sys
+import threading
+import time
+
+import psycopg2
+
+from n8n_descarte import config_descarte, filtrar_alterados, registrar_envio
+from n8n_metricas import CHAVES_ITENS
+from n8n_rollup import SCHEMA
+from n8n_zabbix_sender import ZabbixSenderError, zabbix_send
+
+CANAL = "n8n_monitor_execucoes"
+INTERVALO_ENVIO_PADRAO = 1.0
+INTERVALO_RESSINCRONIZACAO_PADRAO = 300
+ESPERA_RECONEXAO_PADRAO = 5
+# Janelas das ações do coletor (ver n8n_metricas.SQL_POR_WORKFLOW)
+JANELA_ERROS = 24 * 3600
+JANELA_TEMPOS = 10 * 60
+STATUS_FINALIZADOS = ("success", "error")
+
+# Só execuções finalizadas ou com erro: as em andamento não mudam nenhuma métrica
+DDL = f"""
+CREATE SCHEMA IF NOT EXISTS {SCHEMA};
+
+CREATE OR REPLACE FUNCTION {SCHEMA}.notificar_execucao() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF NEW."stoppedAt" IS NULL AND NEW.status IS DISTINCT FROM 'error' THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP = 'UPDATE' AND OLD.status IS NOT DISTINCT FROM NEW.status
+            AND OLD."stoppedAt" IS NOT DISTINCT FROM NEW."stoppedAt" THEN
+        RETURN NULL;
+    END IF;
+    PERFORM pg_notify('{CANAL}', json_build_object(
+        'id', NEW.id,
+        'workflowId', NEW."workflowId",
+        'status', NEW.status,
+        'startedAt', EXTRACT(EPOCH FROM NEW."startedAt"),
+        'stoppedAt', EXTRACT(EPOCH FROM NEW."stoppedAt"))::text);
+    RETURN NULL;
+END
+$$;
+
+DROP TRIGGER IF EXISTS n8n_monitor_notificar_execucao ON n8n.execution_entity;
+CREATE TRIGGER n8n_monitor_notificar_execucao
+    AFTER INSERT OR UPDATE OF status, "stoppedAt" ON n8n.execution_entity
+    FOR EACH ROW EXECUTE FUNCTION {SCHEMA}.notificar_execucao();
+"""
+
+DDL_REMOVER = f"""
+DROP TRIGGER IF EXISTS n8n_monitor_notificar_execucao ON n8n.execution_entity;
+DROP FUNCTION IF EXISTS {SCHEMA}.notificar_execucao();
+"""
+
+SQL_WORKFLOWS_ATIVOS = """
+    SELECT id FROM n8n."workflow_entity" WHERE NOT "isArchived"
+"""
+
+SQL_ERROS = """
+    SELECT id, "workflowId", EXTRACT(EPOCH FROM "startedAt")::float8
+    FROM n8n."execution_entity"
+    WHERE "startedAt" > NOW() - INTERVAL '24 hours'
+        AND status = 'error'
+"""
+
+SQL_TEMPOS = """
+    SELECT id, "workflowId", EXTRACT(EPOCH FROM "startedAt")::float8,
+           EXTRACT(EPOCH FROM ("stoppedAt" - "startedAt"))::float8
+    FROM n8n."execution_entity"
+    WHERE status IN ('success','error') AND "startedAt" > NOW() - interval '10 MINUTES'
+"""
+
+
+def parametros_stream(configs):
+    """Parâmetros da seção [STREAM] (ou os padrões)."""
+    secao = configs['STREAM'] if configs.has_section('STREAM') else {}
+    return {
+        "intervalo_envio": float(secao.get('FLUSH_INTERVAL', INTERVALO_ENVIO_PADRAO)),
+        "intervalo_ressincronizacao": float(secao.get('RESYNC_INTERVAL', INTERVALO_RESSINCRONIZACAO_PADRAO)),
+        "espera_reconexao": float(secao.get('RECONNECT_SECONDS', ESPERA_RECONEXAO_PADRAO)),
+    }
+
+
+class JanelasExecucoes:
+    """Execuções das janelas do coletor por workflow e os últimos valores enviados.
+
+    As execuções ficam indexadas pelo id: a mesma execução notificada duas
+    vezes (ou vista na ressincronização e na notificação) conta uma vez só.
+    """
+
+    def __init__(self, heartbeats=None):
+        self.workflows = set()
+        self.erros = {}   # workflow_id -> {execucao_id: startedAt}
+        self.tempos = {}  # workflow_id -> {execucao_id: (startedAt, duração)}
+        self.enviados = {}  # chave -> [valor, epoch do envio]
+        # [THROTTLING]: reenvia o valor inalterado quando o último envio passa do heartbeat
+        self.heartbeats = heartbeats or {}
+
+    def carregar(self, cursor):
+        """Substitui as janelas pelo conteúdo atual do banco."""
+        cursor.execute(SQL_WORKFLOWS_ATIVOS)
+        workflows = {linha[0] for linha in cursor.fetchall()}
+        erros = {}
+        cursor.execute(SQL_ERROS)
+        for execucao_id, workflow_id, inicio in cursor.fetchall():
+            erros.setdefault(workflow_id, {})[execucao_id] = inicio
+        tempos = {}
+        cursor.execute(SQL_TEMPOS)
+        for execucao_id, workflow_id, inicio, duracao in cursor.fetchall():
+            tempos.setdefault(workflow_id, {})[execucao_id] = (inicio, duracao)
+        self.workflows, self.erros, self.tempos = workflows, erros, tempos
+
+    def incorporar(self, evento, agora=None):
+        """Registra uma notificação do gatilho (payload JSON já decodificado)."""
+        agora = agora or time.time()
+        workflow_id = evento.get("workflowId")
+        inicio = evento.get("startedAt")
+        if workflow_id is None or inicio is None:
+            return
+        self.workflows.add(workflow_id)
+        if evento.get("status") == "error" and inicio > agora - JANELA_ERROS:
+            self.erros.setdefault(workflow_id, {})[evento["id"]] = inicio
+        parada = evento.get("stoppedAt")
+        if evento.get("status") in STATUS_FINALIZADOS and parada is not None and inicio > agora - JANELA_TEMPOS:
+            self.tempos.setdefault(workflow_id, {})[evento["id"]] = (inicio, parada - inicio)
+
+    def valores(self, agora=None):
+        """{chave do item: valor} de todos os workflows, descartando o que saiu das janelas."""
+        agora = agora or time.time()
+        limite_erros = agora - JANELA_ERROS
+        limite_tempos = agora - JANELA_TEMPOS
+        valores = {}
+        for workflow_id in self.workflows | set(self.erros) | set(self.tempos):
+            erros = {i: inicio for i, inicio in self.erros.get(workflow_id, {}).items() if inicio > limite_erros}
+            tempos = {i: t for i, t in self.tempos.get(workflow_id, {}).items() if t[0] > limite_tempos}
+            self.erros[workflow_id] = erros
+            self.tempos[workflow_id] = tempos
+            duracoes = [duracao for _, duracao in tempos.values()]
+            valores[CHAVES_ITENS["execucao_status"].format(workflow_id)] = len(erros)
+            valores[CHAVES_ITENS["average_time"].format(workflow_id)] = (
+                round(sum(duracoes) / len(duracoes), 6) if duracoes else 0)
+            valores[CHAVES_ITENS["max_time"].format(workflow_id)] = round(max(duracoes), 6) if duracoes else 0
+        return valores
+
+    def alterados(self, agora=None):
+        """Pares (chave, valor) que mudaram desde o último envio confirmado (ou com o heartbeat vencido)."""
+        agora = agora or time.time()
+        valores = self.valores(agora).items()
+        if self.heartbeats:
+            return filtrar_alterados(valores, self.enviados, self.heartbeats, agora)
+        return [(chave, valor) for chave, valor in valores
+                if chave not in self.enviados or self.enviados[chave][0] != str(valor)]
+
+    def confirmar(self, valores, agora=None):
+        registrar_envio(self.enviados, valores, agora)
+
+
+def instalar(conn):
+    with conn, conn.cursor() as cursor:
+        cursor.execute(DDL)
+
+
+def remover(conn):
+    with conn, conn.cursor() as cursor:
+        cursor.execute(DDL_REMOVER)
+
+
+def enviar(zabbix_config, valores):
+    """Envia os valores ao trapper; devolve True se o pacote foi aceito."""
+    try:
+        resultado = zabbix_send(
+            zabbix_config.get('SENDER_SERVER', 'localhost'),
+            zabbix_config.getint('SENDER_PORT', 10051),
+            zabbix_config['SENDER_HOST'],
+            valores,
+            timeout=zabbix_config.getfloat('SENDER_TIMEOUT', 10.0),
+            lote=zabbix_config.getint('SENDER_BATCH_SIZE', 0),
+        )
+    except ZabbixSenderError as e:
+        print(f"Erro: {e}", file=sys.stderr)
+        return False
+    if resultado["failed"]:
+        print(f"Valores enviados: {resultado['processed']} processados, {resultado['failed']} com falha.",
+              file=sys.stderr)
+    return True
+
+
+def escutar(conn, janelas, zabbix_config, intervalo_envio, intervalo_ressincronizacao, parar):
+    """Loop de uma conexão: LISTEN, carga inicial e envio das mudanças até parar ou cair."""
+    conn.set_session(autocommit=True)
+    with conn.cursor() as cursor:
+        # LISTEN antes da carga: nada que confirme entre os dois se perde
+        cursor.execute(f"LISTEN {CANAL}")
+        janelas.carregar(cursor)
+    proxima_ressincronizacao = time.monotonic() + intervalo_ressincronizacao
+    proximo_envio = time.monotonic()
+    while not parar.is_set():
+        # As notificações são incorporadas assim que chegam; o envio (que
+        # recalcula todos os workflows) só acontece a cada intervalo_envio
+        if select.select([conn], [], [], max(0.0, proximo_envio - time.monotonic()))[0]:
+            conn.poll()
+            while conn.notifies:
+                notificacao = conn.notifies.pop(0)
+                try:
+                    janelas.incorporar(json.loads(notificacao.payload))
+                except (ValueError, TypeError, KeyError) as e:
+                    print(f"Notificação inválida em {CANAL}: {e}", file=sys.stderr)
+        if time.monotonic() >= proxima_ressincronizacao:
+            with conn.cursor() as cursor:
+                janelas.carregar(cursor)
+            proxima_ressincronizacao = time.monotonic() + intervalo_ressincronizacao
+        if time.monotonic() < proximo_envio:
+            continue
+        proximo_envio = time.monotonic() + intervalo_envio
+        alterados = janelas.alterados()
+        if alterados and enviar(zabbix_config, alterados):
+            janelas.confirmar(alterados)
+
+
+def executar_stream(configs, conectar):
+    """Ponto de entrada do modo stream (n8n-by-zabbix-coletas.py stream).
+
+    `conectar()` devolve uma conexão nova com o banco do n8n, ou None.
+    """
+    if 'SENDER_HOST' not in configs['ZABBIX']:
+        print("Erro: SENDER_HOST não definido na seção [ZABBIX] do arquivo de configuração.", file=sys.stderr)
+        return 1
+    parametros = parametros_stream(configs)
+    try:
+        descarte = config_descarte(configs)
+    except ValueError as e:
+        print(f"Erro: {e}", file=sys.stderr)
+        return 1
+    janelas = JanelasExecucoes(descarte["heartbeats"] if descarte else None)
+    parar = threading.Event()
+
+    def encerrar(signum, frame):
+        parar.set()
+
+    signal.signal(signal.SIGTERM, encerrar)
+    signal.signal(signal.SIGINT, encerrar)
+
+    print(f"Escutando {CANAL} (envio a cada {parametros['intervalo_envio']}s)", file=sys.stderr)
+    while not parar.is_set():
+        conn = conectar()
+        if conn is not None:
+            try:
+                escutar(conn, janelas, configs['ZABBIX'], parametros["intervalo_envio"],
+                        parametros["intervalo_ressincronizacao"], parar)
+            except psycopg2.Error as e:
+                print(f"Erro ao acessar o banco de dados PostgreSQL: {e}", file=sys.stderr)
+            finally:
+                conn.close()
+        if not parar.is_set():
+            parar.wait(parametros["espera_reconexao"])
+    return 0
+
+
+def executar_comando(comando, conn):
+    """Comandos stream-install e stream-uninstall do coletor."""
+    try:
+        if comando == "stream-install":
+            instalar(conn)
+            print(f"Gatilho instalado: execuções finalizadas são publicadas em {CANAL}.")
+        else:
+            remover(conn)
+            print("Gatilho removido.")
+    except psycopg2.Error as e:
+        print(f"Erro ao alterar o gatilho em n8n.execution_entity: {e}", file=sys.stderr)
+        return 1
+    return 0
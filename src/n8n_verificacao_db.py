@@ -0,0 +1,238 @@
+"""Verificação do custo das consultas do coletor no banco do n8n (check-db).
+
+Roda EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) de cada consulta do coletor
+(por workflow, bulk e, se habilitado, rollup) numa transação somente leitura
+e informa tempo, buffers e as varreduras sequenciais. Uma varredura
+sequencial que examina mais de LIMITE_LINHAS linhas é marcada como alerta.
+
+Com --create-index cria, com CREATE INDEX CONCURRENTLY, um índice de
+cobertura com nome próprio do monitoramento (prefixo n8n_monitor_), que as
+migrações do n8n não tocam. Sem a opção, só mostra o comando sugerido.
+"""
+
+import argparse
+import json
+import sys
+
+import psycopg2
+
+from n8n_metricas import (SQL_DURACAO, SQL_EXECUCOES_ERRO, SQL_EXECUCOES_ERRO_ROLLUP, SQL_FILA, SQL_METRICAS,
+                          SQL_POR_WORKFLOW, SQL_TEMPOS, SQL_TEMPOS_ROLLUP, SQL_WORKFLOWS)
+from n8n_rollup import config_rollup
+
+LIMITE_LINHAS = 10000
+
+# Índices sugeridos: (nome, definição, consultas que atendem)
+INDICES_SUGERIDOS = [
+    ("n8n_monitor_execucoes_workflow_inicio",
+     'n8n."execution_entity" ("workflowId", "startedAt") INCLUDE (status, "stoppedAt")',
+     "por workflow"),
+    ("n8n_monitor_execucoes_inicio",
+     'n8n."execution_entity" ("startedAt") INCLUDE ("workflowId", status, "stoppedAt")',
+     "bulk"),
+]
+
+SQL_AMOSTRA_WORKFLOW = 'SELECT id FROM n8n."workflow_entity" ORDER BY "updatedAt" DESC LIMIT 1'
+
+SQL_INDICE_EXISTENTE = "SELECT 1 FROM pg_indexes WHERE schemaname = 'n8n' AND indexname = %s"
+
+SQL_INDICE_INVALIDO = """
+    SELECT c.relname
+    FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    WHERE n.nspname = 'n8n' AND c.relname = %s AND NOT i.indisvalid
+"""
+
+
+def consultas_coletor(workflow_id, rollup=False):
+    """Lista (nome, grupo, sql, parâmetros) das consultas que o coletor executa."""
+    consultas = [(acao, "por workflow", sql, (workflow_id,)) for acao, sql in SQL_POR_WORKFLOW.items()]
+    consultas += [
+        ("duracao", "por workflow", SQL_DURACAO, {"workflow": workflow_id}),
+        # Depende do índice ("stoppedAt", status, "deletedAt") do n8n
+        ("fila", "por workflow", SQL_FILA, {"workflow": workflow_id}),
+        ("workflows", "bulk", SQL_WORKFLOWS, None),
+        ("execucoes", "bulk", SQL_EXECUCOES_ERRO, None),
+        ("tempos", "bulk", SQL_TEMPOS, None),
+        ("duracao", "bulk", SQL_DURACAO, {"workflow": None}),
+        ("fila", "bulk", SQL_FILA, {"workflow": None}),
+        # Item mestre n8n.workflows.metrics (modo dependent): todas as famílias numa consulta
+        ("metricas", "bulk", SQL_METRICAS, None),
+    ]
+    if rollup:
+        consultas += [
+            ("execucoes", "rollup", SQL_EXECUCOES_ERRO_ROLLUP, {"workflow": None}),
+            ("tempos", "rollup", SQL_TEMPOS_ROLLUP, {"workflow": None}),
+            ("execucoes (por workflow)", "rollup", SQL_EXECUCOES_ERRO_ROLLUP, {"workflow": workflow_id}),
+            ("tempos (por workflow)", "rollup", SQL_TEMPOS_ROLLUP, {"workflow": workflow_id}),
+        ]
+    return consultas
+
+
+def percorrer_plano(no, varreduras):
+    """Acumula as varreduras sequenciais do nó e dos filhos do plano."""
+    if no.get("Node Type") == "Seq Scan":
+        lacos = no.get("Actual Loops", 1)
+        examinadas = (no.get("Actual Rows", 0) + no.get("Rows Removed by Filter", 0)) * lacos
+        varreduras.append({
+            "tabela": f'{no.get("Schema", "")}.{no.get("Relation Name", "")}',
+            "linhas_examinadas": int(examinadas),
+            "alerta": examinadas > LIMITE_LINHAS,
+        })
+    for filho in no.get("Plans", []):
+        percorrer_plano(filho, varreduras)
+
+
+def analisar(cursor, sql, parametros):
+    """Executa o EXPLAIN ANALYZE da consulta e resume o plano."""
+    cursor.execute("EXPLAIN (ANALYZE, BUFFERS, VERBOSE, FORMAT JSON) " + sql, parametros)
+    explicado = cursor.fetchone()[0]
+    if isinstance(explicado, str):
+        explicado = json.loads(explicado)
+    plano = explicado[0]
+    varreduras = []
+    percorrer_plano(plano["Plan"], varreduras)
+    return {
+        "tempo_ms": round(plano.get("Execution Time", 0.0), 2),
+        "planejamento_ms": round(plano.get("Planning Time", 0.0), 2),
+        "buffers_cache": plano["Plan"].get("Shared Hit Blocks", 0),
+        "buffers_disco": plano["Plan"].get("Shared Read Blocks", 0),
+        "varreduras_sequenciais": varreduras,
+    }
+
+
+def verificar(conn, workflow_id=None, rollup=False):
+    """Analisa todas as consultas do coletor; devolve a lista de resultados.
+
+    Tudo roda numa transação somente leitura desfeita ao final: o EXPLAIN
+    ANALYZE executa as consultas de verdade.
+    """
+    resultados = []
+    conn.set_session(readonly=True)
+    try:
+        with conn.cursor() as cursor:
+            if workflow_id is None:
+                cursor.execute(SQL_AMOSTRA_WORKFLOW)
+                linha = cursor.fetchone()
+                workflow_id = linha[0] if linha else ""
+            for nome, grupo, sql, parametros in consultas_coletor(workflow_id, rollup):
+                resultado = {"consulta": nome, "grupo": grupo}
+                try:
+                    resultado.update(analisar(cursor, sql, parametros))
+                except psycopg2.Error as e:
+                    conn.rollback()
+                    resultado["erro"] = str(e).strip()
+                resultados.append(resultado)
+    finally:
+        conn.rollback()
+        conn.set_session(readonly=False)
+    return resultados
+
+
+def indices_necessarios(conn, resultados):
+    """Índices sugeridos, ainda inexistentes, para os grupos com varredura sequencial em execution_entity."""
+    grupos = {r["grupo"] for r in resultados
+              for v in r.get("varreduras_sequenciais", [])
+              if v["alerta"] and v["tabela"] == "n8n.execution_entity"}
+    sugeridos = []
+    with conn.cursor() as cursor:
+        for nome, definicao, grupo in INDICES_SUGERIDOS:
+            if grupo not in grupos:
+                continue
+            cursor.execute(SQL_INDICE_EXISTENTE, (nome,))
+            if not cursor.fetchone():
+                sugeridos.append((nome, definicao))
+    conn.rollback()
+    return sugeridos
+
+
+def criar_indice(conn, nome, definicao):
+    """CREATE INDEX CONCURRENTLY (fora de transação). Devolve True se criou."""
+    conn.rollback()
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(SQL_INDICE_INVALIDO, (nome,))
+            if cursor.fetchone():
+                # Sobra de uma criação CONCURRENTLY interrompida: o IF NOT EXISTS não a refaria
+                print(f"Índice inválido n8n.{nome} encontrado; removendo antes de recriar.", file=sys.stderr)
+                cursor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS n8n."{nome}"')
+            cursor.execute(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{nome}" ON {definicao}')
+        return True
+    except psycopg2.Error as e:
+        print(f"Erro ao criar o índice {nome}: {str(e).strip()}", file=sys.stderr)
+        return False
+    finally:
+        conn.autocommit = False
+
+
+def imprimir(resultados, saida=sys.stdout):
+    for r in resultados:
+        titulo = f"{r['consulta']} ({r['grupo']})"
+        if "erro" in r:
+            print(f"{titulo}: ERRO {r['erro']}", file=saida)
+            continue
+        print(f"{titulo}: {r['tempo_ms']} ms (+{r['planejamento_ms']} ms de planejamento), "
+              f"buffers {r['buffers_cache']} em cache / {r['buffers_disco']} do disco", file=saida)
+        for v in r["varreduras_sequenciais"]:
+            marca = "  ALERTA" if v["alerta"] else ""
+            print(f"    Seq Scan em {v['tabela']}: {v['linhas_examinadas']} linhas examinadas{marca}", file=saida)
+
+
+def executar_verificacao(conn, configs, argv):
+    """Ponto de entrada de n8n-by-zabbix-coletas.py check-db.
+
+    Retorna 0 sem alertas, 2 com varreduras sequenciais caras e 1 em erro.
+    """
+    parser = argparse.ArgumentParser(prog="n8n-by-zabbix-coletas.py check-db",
+                                     description="Analisa o custo das consultas do coletor no banco do n8n.")
+    parser.add_argument("--workflow", help="workflow usado nas consultas por workflow (padrão: o mais recente)")
+    parser.add_argument("--json", action="store_true", help="saída em JSON")
+    parser.add_argument("--create-index", action="store_true",
+                        help="cria com CONCURRENTLY os índices sugeridos (exige ser dono da tabela)")
+    args = parser.parse_args(argv)
+
+    rollup = config_rollup(configs) is not None
+    try:
+        resultados = verificar(conn, args.workflow, rollup)
+        sugeridos = indices_necessarios(conn, resultados)
+    except psycopg2.Error as e:
+        print(f"Erro ao acessar o banco de dados PostgreSQL: {e}", file=sys.stderr)
+        return 1
+    if not args.json:
+        imprimir(resultados)
+        for nome, definicao in sugeridos:
+            print(f"Sugestão: CREATE INDEX CONCURRENTLY \"{nome}\" ON {definicao};")
+
+    criados = []
+    if args.create_index and sugeridos:
+        for nome, definicao in sugeridos:
+            if not criar_indice(conn, nome, definicao):
+                return 1
+            criados.append(nome)
+            print(f"Índice n8n.{nome} criado.", file=sys.stderr)
+        try:
+            with conn, conn.cursor() as cursor:
+                cursor.execute('ANALYZE n8n."execution_entity"')
+            resultados = verificar(conn, args.workflow, rollup)
+            sugeridos = indices_necessarios(conn, resultados)
+        except psycopg2.Error as e:
+            print(f"Erro ao acessar o banco de dados PostgreSQL: {e}", file=sys.stderr)
+            return 1
+        if not args.json:
+            print("Após a criação dos índices:")
+            imprimir(resultados)
+
+    alertas = any(v["alerta"] for r in resultados for v in r.get("varreduras_sequenciais", []))
+    if args.json:
+        print(json.dumps({"consultas": resultados, "alertas": alertas, "indices_criados": criados,
+                          "indices_sugeridos": [f'CREATE INDEX CONCURRENTLY "{n}" ON {d}' for n, d in sugeridos]},
+                         indent=4, ensure_ascii=False))
+    elif alertas and not sugeridos and not rollup:
+        # Índices já existem: a janela consultada cobre boa parte da tabela
+        print("Varreduras sequenciais restantes não são resolvidas pelos índices sugeridos; "
+              "considere o rollup de execuções ([ROLLUP]).")
+
+    if any("erro" in r for r in resultados):
+        return 1
+    return 2 if alertas else 0
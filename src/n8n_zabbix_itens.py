@@ -0,0 +1,516 @@
+"""Definição dos itens e triggers que a descoberta mantém para cada workflow.
+
+Gera os parâmetros da API do Zabbix (item.create/trigger.create) do estado
+desejado de um workflow. Quem aplica é n8n_zabbix_provisionamento; aqui não
+há chamadas de rede.
+"""
+
+from n8n_descarte import ACOES_SEM_TENDENCIAS, familia_da_acao, passo_descarte
+from n8n_metricas import CHAVE_METRICAS, CHAVES_ITENS, JANELAS_ERROS, LIMITES_HISTOGRAMA
+from n8n_orcamento import CHAVE_DEFASAGEM
+
+# Tipos de item no Zabbix
+ITEM_TYPE_AGENT = 0       # Zabbix Agent (passivo): o Zabbix executa o UserParameter
+ITEM_TYPE_TRAPPER = 2     # Zabbix trapper: valores enviados pelo coletor em modo bulk
+ITEM_TYPE_DEPENDENT = 18  # Dependente: valor extraído do JSON do item mestre n8n.workflows.metrics
+
+VALUE_TYPE_TEXT = 4
+PREPROCESSAMENTO_JSONPATH = 12
+
+AVISO_AUTOMATICO = ("\n\n***Não altere este item no Zabbix o item é gerado/atualizado automaticamente "
+                    "via script***.")
+
+# Extrai só os dígitos da saída do coletor
+PREPROCESSAMENTO_INTEIRO = {"type": 5, "params": "(\\d+)\n\\1", "error_handler": 0, "error_handler_params": ""}
+
+# Itens por workflow: ação do coletor -> nome, tipo de valor, intervalo, unidade,
+# pré-processamento e descrição
+DEFINICOES_ITENS = [
+    {
+        "acao": "execucao_status",
+        "nome": "Status Execução",
+        "value_type": 3,
+        "delay": "60s",
+        "preprocessing": [PREPROCESSAMENTO_INTEIRO],
+        "description": "Coleta qual o status das execuções do workflow.",
+    },
+    {
+        "acao": "workflow_status",
+        "nome": "Status",
+        "value_type": 3,
+        "delay": "60s",
+        "preprocessing": [PREPROCESSAMENTO_INTEIRO],
+        "description": "Coleta se o workflow está ativo ou não.",
+    },
+    {
+        "acao": "is_archived",
+        "nome": "Arquivado",
+        "value_type": 3,
+        "delay": "60s",
+        "preprocessing": [PREPROCESSAMENTO_INTEIRO],
+        "description": "Coleta se o workflow foi arquivado. Workflows arquivados significam que não devem ser mais "
+                       "monitorados, desative ou exclua todos os itens deste workflow para que não haja alarmes.",
+    },
+    {
+        "acao": "update",
+        "nome": "Update",
+        "value_type": 3,
+        "delay": "60s",
+        "units": "unixtime",
+        "description": "Coleta a data da última alteração do workflow.",
+    },
+    {
+        "acao": "average_time",
+        "nome": "Tempo médio",
+        "value_type": 0,
+        "delay": "300s",
+        "units": "s",
+        "description": "Coleta o tempo médio de execução dos últimos .",
+    },
+    {
+        "acao": "max_time",
+        "nome": "Tempo máximo",
+        "value_type": 0,
+        "delay": "300s",
+        "units": "s",
+        "description": "Coleta o tempo máximo de execução dos últimos 10min .",
+    },
+    {
+        "acao": "duration_count",
+        "nome": "Execuções finalizadas (10min)",
+        "value_type": 3,
+        "delay": "300s",
+        "description": "Quantidade de execuções finalizadas (sucesso ou erro) iniciadas nos últimos 10min.",
+    },
+] + [
+    {
+        "acao": f"duration_p{percentil}",
+        "nome": f"Tempo p{percentil}",
+        "value_type": 0,
+        "delay": "300s",
+        "units": "s",
+        "description": f"Percentil {percentil} do tempo de execução dos últimos 10min.",
+    }
+    for percentil in (50, 90, 99)
+]
+
+# Histograma acumulado da duração: criado só com [DISCOVERY] DURATION_HISTOGRAM = true
+DEFINICOES_HISTOGRAMA = [
+    {
+        "acao": f"duration_le_{limite}",
+        "nome": f"Execuções até {limite}s (10min)",
+        "value_type": 3,
+        "delay": "300s",
+        "description": f"Quantidade de execuções dos últimos 10min que duraram até {limite}s.",
+    }
+    for limite in LIMITES_HISTOGRAMA
+]
+
+# Erros por janela deslizante: criados só para as janelas de [ERROR_WINDOWS] WINDOWS
+DEFINICOES_JANELAS = {
+    janela: {
+        "acao": f"errors_{janela}",
+        "nome": f"Execuções com erro ({janela})",
+        "value_type": 3,
+        "delay": "60s",
+        "description": f"Quantidade de execuções com erro iniciadas nos últimos {janela} (contador incremental "
+                       f"em janelas por minuto/hora).",
+    }
+    for janela in JANELAS_ERROS
+}
+
+# Fila e saturação dos workers: criados só com [DISCOVERY] QUEUE_METRICS = true
+DEFINICOES_FILA = [
+    {
+        "acao": "queue_started",
+        "nome": "Execuções iniciadas (1min)",
+        "value_type": 3,
+        "delay": "60s",
+        "description": "Quantidade de execuções iniciadas no último minuto.",
+    },
+    {
+        "acao": "queue_finished",
+        "nome": "Execuções finalizadas (1min)",
+        "value_type": 3,
+        "delay": "60s",
+        "description": "Quantidade de execuções finalizadas no último minuto.",
+    },
+    {
+        "acao": "queue_new",
+        "nome": "Execuções na fila",
+        "value_type": 3,
+        "delay": "60s",
+        "description": "Execuções com status new: enfileiradas, aguardando um worker (modo queue).",
+    },
+    {
+        "acao": "queue_running",
+        "nome": "Execuções em andamento",
+        "value_type": 3,
+        "delay": "60s",
+        "description": "Execuções com status running.",
+    },
+    {
+        "acao": "queue_waiting",
+        "nome": "Execuções aguardando",
+        "value_type": 3,
+        "delay": "60s",
+        "description": "Execuções com status waiting (nó Wait ou aguardando webhook).",
+    },
+    {
+        "acao": "queue_oldest_running",
+        "nome": "Idade da execução em andamento mais antiga",
+        "value_type": 0,
+        "delay": "60s",
+        "units": "s",
+        "description": "Segundos desde o início da execução running mais antiga (0 sem execuções em andamento).",
+    },
+    {
+        "acao": "queue_wait_time",
+        "nome": "Espera média na fila (10min)",
+        "value_type": 0,
+        "delay": "60s",
+        "units": "s",
+        "description": "Média de startedAt - createdAt das execuções iniciadas nos últimos 10min: tempo até um "
+                       "worker pegar a execução.",
+    },
+]
+
+# Última falha do workflow: criados só com [FAILURES] ENABLED = true. Itens
+# passivos leem o estado do comando failures (nunca do item mestre); no modo
+# trapper o próprio comando envia os valores
+DEFINICOES_FALHAS = [
+    {
+        "acao": "failure_node",
+        "nome": "Última falha - nó",
+        "value_type": VALUE_TYPE_TEXT,
+        "delay": "60s",
+        "sem_mestre": True,
+        "description": "Nome do nó que falhou na última execução com erro.",
+    },
+    {
+        "acao": "failure_message",
+        "nome": "Última falha - mensagem",
+        "value_type": VALUE_TYPE_TEXT,
+        "delay": "60s",
+        "sem_mestre": True,
+        "description": "Mensagem de erro da última execução com erro (até [FAILURES] MAX_MESSAGE caracteres).",
+    },
+    {
+        "acao": "failure_execution",
+        "nome": "Última falha - execução",
+        "value_type": 3,
+        "delay": "60s",
+        "sem_mestre": True,
+        "description": "Id da última execução com erro, para abri-la no n8n.",
+    },
+]
+
+# Desvio da duração em relação à linha de base: criado só com [DURATION_BASELINE] ENABLED = true
+DEFINICOES_LINHA_BASE = [
+    {
+        "acao": "baseline_score",
+        "nome": "Desvio da duração",
+        "value_type": 0,
+        "delay": "60s",
+        "description": "Quantos desvios padrão a duração média recente está acima (ou abaixo, negativo) da linha "
+                       "de base do workflow (média móvel das execuções, ver [DURATION_BASELINE]). 0 até o "
+                       "workflow ter MIN_EXECUTIONS execuções.",
+    },
+]
+
+# Limites das triggers da fila ([DISCOVERY] QUEUE_*), em segundos / execuções
+LIMITES_FILA_PADRAO = {"idade_maxima": 3600, "espera_maxima": 60, "fila_maxima": 10}
+
+# Itens do host com as medições dos próprios scripts (n8n_instrumentacao):
+# métrica, estatística da janela, nome e unidade
+DEFINICOES_MONITOR = [
+    ("coletor.total_ms", "avg", "Coletor - tempo total (médio)", "ms"),
+    ("coletor.total_ms", "max", "Coletor - tempo total (máximo)", "ms"),
+    ("coletor.total_ms", "count", "Coletor - processos", ""),
+    ("coletor.inicio_ms", "avg", "Coletor - início do processo (médio)", "ms"),
+    ("coletor.conexao_ms", "avg", "Coletor - conexão ao PostgreSQL (média)", "ms"),
+    ("coletor.conexao_ms", "max", "Coletor - conexão ao PostgreSQL (máxima)", "ms"),
+    ("coletor.consulta_ms", "avg", "Coletor - consulta ao PostgreSQL (média)", "ms"),
+    ("coletor.consulta_ms", "max", "Coletor - consulta ao PostgreSQL (máxima)", "ms"),
+    ("coletor.linhas", "sum", "Coletor - linhas lidas do PostgreSQL", ""),
+    ("coletor.erros", "sum", "Coletor - erros", ""),
+    ("descoberta.total_ms", "last", "Descoberta - tempo total", "ms"),
+    ("descoberta.api_ms", "avg", "Descoberta - chamada à API do Zabbix (média)", "ms"),
+    ("descoberta.api_ms", "max", "Descoberta - chamada à API do Zabbix (máxima)", "ms"),
+]
+
+
+def chave_item(acao, workflow_id):
+    """Chave do item Zabbix da ação do coletor para o workflow."""
+    return CHAVES_ITENS[acao].format(workflow_id)
+
+
+def passo_jsonpath(workflow_id, acao):
+    """Pré-processamento que extrai a métrica do workflow do JSON do item mestre."""
+    return {"type": PREPROCESSAMENTO_JSONPATH, "params": f"$['{workflow_id}'].{acao}",
+            "error_handler": 0, "error_handler_params": ""}
+
+
+def item_mestre(host_id, host_interface_id, delay="60s"):
+    """Parâmetros de item.create do item mestre (um por host) dos itens dependentes."""
+    return {
+        "name": "n8n - Métricas de todos os workflows (JSON)",
+        "key_": CHAVE_METRICAS,
+        "type": ITEM_TYPE_AGENT,
+        "value_type": VALUE_TYPE_TEXT,
+        "interfaceid": host_interface_id,
+        "hostid": host_id,
+        "delay": delay,
+        # Só alimenta os dependentes: não guarda o JSON
+        "history": "0",
+        "description": "Coleta num único JSON as métricas de todos os workflows; os itens de cada workflow são "
+                       "dependentes deste." + AVISO_AUTOMATICO,
+        "tags": [{"tag": "component", "value": "Cron"}],
+    }
+
+
+def ajustar_tipo_item(params, modo="agent", trapper_hosts=None, master_itemid=None):
+    """Converte os parâmetros de item passivo em trapper ou dependente conforme o modo."""
+    if modo == "dependent":
+        params["type"] = ITEM_TYPE_DEPENDENT
+        params["master_itemid"] = master_itemid
+        # O intervalo é o do item mestre
+        params.pop("interfaceid", None)
+        params.pop("delay", None)
+    elif modo == "trapper":
+        params["type"] = ITEM_TYPE_TRAPPER
+        # Itens trapper não têm interface nem intervalo: o valor chega pelo sender
+        params.pop("interfaceid", None)
+        params.pop("delay", None)
+        if trapper_hosts:
+            params["trapper_hosts"] = trapper_hosts
+    return params
+
+
+def limites_fila(discovery_config, forcar=False):
+    """Limites das triggers da fila, ou None se [DISCOVERY] QUEUE_METRICS não estiver ligado (nem `forcar`)."""
+    if not forcar and str(discovery_config.get('QUEUE_METRICS', 'false')).strip().lower() not in ('1', 'true', 'yes', 'on'):
+        return None
+    return {
+        "idade_maxima": int(discovery_config.get('QUEUE_MAX_RUNNING_AGE', LIMITES_FILA_PADRAO["idade_maxima"])),
+        "espera_maxima": int(discovery_config.get('QUEUE_MAX_WAIT', LIMITES_FILA_PADRAO["espera_maxima"])),
+        "fila_maxima": int(discovery_config.get('QUEUE_MAX_BACKLOG', LIMITES_FILA_PADRAO["fila_maxima"])),
+    }
+
+
+def definicoes_workflow(histograma=False, janelas=(), fila=False, falhas=False, linha_base=False):
+    """Definições dos itens por workflow conforme os itens opcionais habilitados."""
+    return (DEFINICOES_ITENS + (DEFINICOES_HISTOGRAMA if histograma else [])
+            + [DEFINICOES_JANELAS[janela] for janela in janelas] + (DEFINICOES_FILA if fila else [])
+            + (DEFINICOES_FALHAS if falhas else []) + (DEFINICOES_LINHA_BASE if linha_base else []))
+
+
+def acoes_provisionadas(histograma=False, janelas=(), fila=False, falhas=False, linha_base=False):
+    """Ações com item por workflow; muda quando a definição dos itens muda."""
+    return [definicao["acao"] for definicao in definicoes_workflow(histograma, janelas, fila, falhas, linha_base)]
+
+
+def itens_workflow(workflow_id, workflow_name, host_id, host_interface_id, modo="agent", trapper_hosts=None,
+                   histograma=False, master_itemid=None, janelas=(), fila=False, falhas=False, descarte=None,
+                   linha_base=False):
+    """Parâmetros de item.create de todos os itens do workflow.
+
+    Com modo = dependent os itens leem do item mestre `master_itemid` com um
+    passo JSONPath antes do pré-processamento da definição (exceto os
+    `sem_mestre`, que continuam passivos). `descarte` ({familia: heartbeat},
+    ver n8n_descarte) acrescenta o descarte de valores inalterados.
+    """
+    itens = []
+    for definicao in definicoes_workflow(histograma, janelas, fila, falhas, linha_base):
+        params = {
+            "name": f"Workflow - {workflow_name} - {definicao['nome']}",
+            "key_": chave_item(definicao["acao"], workflow_id),
+            "type": ITEM_TYPE_AGENT,
+            "value_type": definicao["value_type"],
+            "interfaceid": host_interface_id,
+            "hostid": host_id,
+            "delay": definicao["delay"],
+            "history": "90d",
+            # Itens de texto não têm tendências
+            "trends": "0" if definicao["value_type"] == VALUE_TYPE_TEXT else "400d",
+            "description": definicao["description"] + AVISO_AUTOMATICO,
+            "tags": [{"tag": "component", "value": "Cron"}],
+        }
+        if "units" in definicao:
+            params["units"] = definicao["units"]
+        if "preprocessing" in definicao:
+            params["preprocessing"] = [dict(passo) for passo in definicao["preprocessing"]]
+        modo_item = "agent" if modo == "dependent" and definicao.get("sem_mestre") else modo
+        if modo_item == "dependent":
+            params["preprocessing"] = [passo_jsonpath(workflow_id, definicao["acao"])] + params.get("preprocessing", [])
+        heartbeat = (descarte or {}).get(familia_da_acao(definicao["acao"]))
+        if heartbeat:
+            params["preprocessing"] = params.get("preprocessing", []) + [passo_descarte(heartbeat)]
+            if definicao["acao"] in ACOES_SEM_TENDENCIAS:
+                params["trends"] = "0"
+        itens.append(ajustar_tipo_item(params, modo_item, trapper_hosts, master_itemid))
+    return itens
+
+
+def chave_monitor(metrica, estatistica):
+    return f"n8n.monitor[{metrica},{estatistica}]"
+
+
+def itens_monitor(host_id, host_interface_id, modo="agent", trapper_hosts=None):
+    """Parâmetros de item.create dos itens n8n.monitor[*] do host.
+
+    No modo dependent continuam passivos: as medições não estão no JSON do
+    item mestre.
+    """
+    itens = []
+    for metrica, estatistica, nome, unidade in DEFINICOES_MONITOR:
+        params = {
+            "name": f"n8n monitor - {nome}",
+            "key_": chave_monitor(metrica, estatistica),
+            "type": ITEM_TYPE_AGENT,
+            "value_type": 0,
+            "interfaceid": host_interface_id,
+            "hostid": host_id,
+            "delay": "60s",
+            "history": "30d",
+            "trends": "400d",
+            "description": f"Estatística '{estatistica}' da métrica {metrica} na janela de [INSTRUMENTATION] "
+                           f"WINDOW_MINUTES." + AVISO_AUTOMATICO,
+            "tags": [{"tag": "component", "value": "Monitor"}],
+        }
+        if unidade:
+            params["units"] = unidade
+        itens.append(ajustar_tipo_item(params, "trapper" if modo == "trapper" else "agent", trapper_hosts))
+    return itens
+
+
+def item_defasagem(host_id, host_interface_id, modo="agent", trapper_hosts=None):
+    """Parâmetros de item.create do item n8n.collector.staleness ([BUDGET] ENABLED).
+
+    Enviado pelo bulk no modo trapper; passivo nos demais (o JSON do item
+    mestre não o inclui).
+    """
+    params = {
+        "name": "n8n monitor - Defasagem dos dados do coletor",
+        "key_": CHAVE_DEFASAGEM,
+        "type": ITEM_TYPE_AGENT,
+        "value_type": 3,
+        "interfaceid": host_interface_id,
+        "hostid": host_id,
+        "delay": "60s",
+        "history": "30d",
+        "trends": "400d",
+        "units": "s",
+        "description": "Idade do dado mais antigo que o coletor está servindo: 0 com tudo em dia; cresce enquanto "
+                       "consultas excedem o orçamento de [BUDGET] e os valores anteriores são repetidos."
+                       + AVISO_AUTOMATICO,
+        "tags": [{"tag": "component", "value": "Monitor"}],
+    }
+    return ajustar_tipo_item(params, "trapper" if modo == "trapper" else "agent", trapper_hosts)
+
+
+def triggers_workflow(workflow_id, workflow_name, hostname, fila=None, falhas=False, limite_escore=None):
+    """Parâmetros de trigger.create das triggers do workflow.
+
+    `fila` (limites_fila) acrescenta as triggers de saturação da fila; com
+    `falhas` o evento da trigger de falha traz o nó e a mensagem do erro;
+    `limite_escore` ([DURATION_BASELINE] TRIGGER_SCORE) acrescenta a de lentidão.
+    """
+    falhou = {
+        "description": f"Workflow {workflow_name} falhou",
+        "expression": f"last(/{hostname}/{chave_item('execucao_status', workflow_id)})>0",
+        "priority": 4,
+        "status": 0,
+        "recovery_mode": 0,
+        "manual_close": 1,
+        "comments": "A trigger irá ficar ativa caso haja pelo menos 1 erro de execução dentro das últimas 24h "
+                    "e irá desativar automaticamente após 24h do último erro." + AVISO_AUTOMATICO,
+    }
+    if falhas:
+        falhou["event_name"] = (f"Workflow {workflow_name} falhou no nó "
+                                f"{{?last(/{hostname}/{chave_item('failure_node', workflow_id)})}}: "
+                                f"{{?last(/{hostname}/{chave_item('failure_message', workflow_id)})}}")
+    return [
+        falhou,
+        {
+            "description": f"Workflow {workflow_name} foi Arquivado",
+            "expression": f"change(/{hostname}/{chave_item('is_archived', workflow_id)})<>0",
+            "priority": 1,
+            "status": 0,
+            "recovery_mode": 2,
+            "manual_close": 1,
+            "comments": "Se esta trigger estiver ligada significa que o workflow foi arquivado no n8n, caso seja porque "
+                        "o workflow não será mais utilizado, desative ou exclua todos os itens deste workflow. "
+                        "Esta trigger não desativa sozinha, deve ser feita pelo reconhecimento do alarme."
+                        + AVISO_AUTOMATICO,
+        },
+        {
+            "description": f"Workflow {workflow_name} foi alterado",
+            "expression": f"change(/{hostname}/{chave_item('update', workflow_id)})<>0",
+            "priority": 1,
+            "status": 0,
+            "recovery_mode": 2,
+            "manual_close": 1,
+            "comments": "Esta trigger ativa se a data da última alteração do workflow foi alterado. É mais um aviso "
+                        "para ciência de que houve alterações. Ela não desativa sozinha, sendo necessário ação manual. "
+                        "Recomenda-se descrever as alterações para referência futura." + AVISO_AUTOMATICO,
+        },
+    ] + (triggers_fila(workflow_id, workflow_name, hostname, fila) if fila else []) + (
+        [trigger_lentidao(workflow_id, workflow_name, hostname, limite_escore)] if limite_escore is not None else [])
+
+
+def trigger_lentidao(workflow_id, workflow_name, hostname, limite):
+    """Trigger do desvio da duração acima da linha de base do workflow."""
+    limite = f"{limite:g}"
+    return {
+        "description": f"Workflow {workflow_name} mais lento que o normal (desvio > {limite})",
+        "expression": f"min(/{hostname}/{chave_item('baseline_score', workflow_id)},15m)>{limite}",
+        "priority": 2,
+        "status": 0,
+        "recovery_mode": 0,
+        "manual_close": 1,
+        "comments": "Durante 15 minutos a duração média recente ficou mais de [DURATION_BASELINE] TRIGGER_SCORE "
+                    "desvios padrão acima da linha de base do workflow: algo o deixou mais lento (ex.: uma API "
+                    "externa degradada). Desativa sozinha quando a duração volta ao normal ou a linha de base se "
+                    "ajusta à nova duração." + AVISO_AUTOMATICO,
+    }
+
+
+def triggers_fila(workflow_id, workflow_name, hostname, limites):
+    """Triggers de execução presa, espera na fila e fila acumulada do workflow."""
+    return [
+        {
+            "description": f"Workflow {workflow_name} com execução em andamento há mais de "
+                           f"{limites['idade_maxima']}s",
+            "expression": f"last(/{hostname}/{chave_item('queue_oldest_running', workflow_id)})"
+                          f">{limites['idade_maxima']}",
+            "priority": 3,
+            "status": 0,
+            "recovery_mode": 0,
+            "manual_close": 1,
+            "comments": "Uma execução running passou do limite [DISCOVERY] QUEUE_MAX_RUNNING_AGE: pode estar travada "
+                        "ou o worker que a executava caiu. Desativa sozinha quando ela termina." + AVISO_AUTOMATICO,
+        },
+        {
+            "description": f"Workflow {workflow_name} esperando mais de {limites['espera_maxima']}s na fila",
+            "expression": f"min(/{hostname}/{chave_item('queue_wait_time', workflow_id)},5m)"
+                          f">{limites['espera_maxima']}",
+            "priority": 2,
+            "status": 0,
+            "recovery_mode": 0,
+            "manual_close": 1,
+            "comments": "Durante 5 minutos as execuções esperaram em média mais que [DISCOVERY] QUEUE_MAX_WAIT até um "
+                        "worker pegá-las: os workers estão saturados, considere adicionar workers." + AVISO_AUTOMATICO,
+        },
+        {
+            "description": f"Workflow {workflow_name} com {limites['fila_maxima']} ou mais execuções na fila",
+            "expression": f"min(/{hostname}/{chave_item('queue_new', workflow_id)},5m)"
+                          f">={limites['fila_maxima']}",
+            "priority": 2,
+            "status": 0,
+            "recovery_mode": 0,
+            "manual_close": 1,
+            "comments": "Durante 5 minutos a fila (status new) não baixou de [DISCOVERY] QUEUE_MAX_BACKLOG: entram "
+                        "mais execuções do que os workers dão conta." + AVISO_AUTOMATICO,
+        },
+    ]
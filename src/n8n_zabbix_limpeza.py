@@ -0,0 +1,132 @@
+"""Limpeza dos itens e triggers de workflows excluídos ou arquivados no n8n.
+
+A descoberta registra no estado quando cada workflow foi excluído
+("removido") ou arquivado ("arquivado"). Com [CLEANUP] ENABLED, passado o
+prazo de GRACE_DAYS, os itens n8n.workflow.*[<id>] do workflow no HOST_ID são
+desativados junto com as triggers (ACTION = disable) ou apagados (delete; o
+Zabbix apaga as triggers junto), em chamadas em lote, e o workflow fica
+"limpo" no estado. Um workflow desarquivado volta a ser provisionado e tem os
+itens reativados.
+
+Nas descobertas completas o host inteiro é conferido: itens de workflows que
+não existem mais no n8n e que o estado não conhece (estado apagado, itens
+anteriores a ele) também passam a contar o prazo.
+"""
+
+import sys
+from datetime import datetime, timedelta
+
+from n8n_zabbix_provisionamento import ZABBIX_ITEM_PREFIX, chamar_em_lotes, workflow_do_texto
+
+ACOES = ("disable", "delete")
+PRAZO_PADRAO_DIAS = 7
+
+
+def config_limpeza(configs):
+    """Parâmetros da seção [CLEANUP], ou None se ENABLED não estiver ligado."""
+    if not configs.has_section('CLEANUP') or not configs['CLEANUP'].getboolean('ENABLED', False):
+        return None
+    secao = configs['CLEANUP']
+    acao = secao.get('ACTION', 'disable').strip().lower()
+    if acao not in ACOES:
+        raise ValueError(f"[CLEANUP] ACTION inválido: '{acao}' (use {' ou '.join(ACOES)})")
+    return {"acao": acao, "prazo": timedelta(days=float(secao.get('GRACE_DAYS', PRAZO_PADRAO_DIAS)))}
+
+
+def buscar_itens_do_host(api_request, host_id):
+    """Itens n8n.workflow.* do host (só id, chave e status), ou None em caso de erro."""
+    return api_request("item.get", {
+        "output": ["itemid", "key_", "status"],
+        "hostids": host_id,
+        "search": {"key_": ZABBIX_ITEM_PREFIX},
+        "startSearch": True,
+    })
+
+
+def registrar_orfaos(estado_workflows, itens, ids_atuais, agora):
+    """Começa a contar o prazo dos workflows com itens no host que não existem no n8n nem no estado."""
+    orfaos = {workflow_do_texto(item["key_"]) for item in itens} - set(ids_atuais) - set(estado_workflows)
+    orfaos.discard(None)
+    for workflow_id in orfaos:
+        estado_workflows[workflow_id] = {"removido": agora}
+    return sorted(orfaos)
+
+
+def workflows_vencidos(estado_workflows, prazo, agora):
+    """Ids dos workflows excluídos ou arquivados há mais que `prazo` e ainda não limpos."""
+    limite = datetime.fromisoformat(agora) - prazo
+    vencidos = []
+    for workflow_id, info in estado_workflows.items():
+        if info.get("limpo"):
+            continue
+        if info.get("isArchived") and not info.get("removido"):
+            # Arquivado antes desta versão do estado: o prazo conta a partir de agora
+            info.setdefault("arquivado", agora)
+        desde = info.get("removido") or info.get("arquivado")
+        if desde and datetime.fromisoformat(desde) <= limite:
+            vencidos.append(workflow_id)
+    return sorted(vencidos)
+
+
+def aplicar_limpeza(api_request, itens, acao, tamanho, dry_run=False):
+    """Desativa ou apaga os itens (e desativa as triggers deles); devolve os lotes com falha."""
+    if acao == "delete":
+        print(f"Limpeza: {len(itens)} itens a apagar.")
+        if dry_run or not itens:
+            return 0
+        _, falhas, _ = chamar_em_lotes(api_request, "item.delete", [item["itemid"] for item in itens], tamanho)
+        return falhas
+
+    ativos = [item["itemid"] for item in itens if str(item.get("status", "0")) == "0"]
+    triggers = []
+    if itens:
+        triggers = api_request("trigger.get", {"output": ["triggerid", "status"],
+                                               "itemids": [item["itemid"] for item in itens]})
+        if triggers is None:
+            print("Erro: não foi possível ler as triggers dos itens a desativar.", file=sys.stderr)
+            return 1
+    triggers_ativas = [t["triggerid"] for t in triggers if str(t["status"]) == "0"]
+    print(f"Limpeza: {len(ativos)} itens e {len(triggers_ativas)} triggers a desativar.")
+    if dry_run:
+        return 0
+    _, falhas_triggers, _ = chamar_em_lotes(api_request, "trigger.update",
+                                            [{"triggerid": t, "status": 1} for t in triggers_ativas], tamanho)
+    _, falhas_itens, _ = chamar_em_lotes(api_request, "item.update",
+                                         [{"itemid": i, "status": 1} for i in ativos], tamanho)
+    return falhas_triggers + falhas_itens
+
+
+def limpar(api_request, host_id, estado_workflows, ids_atuais, parametros, agora, completo=False,
+           tamanho=100, dry_run=False):
+    """Passo de reconciliação da descoberta; devolve os lotes com falha.
+
+    Os workflows limpos com sucesso ficam marcados no estado e não são
+    conferidos de novo.
+    """
+    itens = None
+    if completo:
+        itens = buscar_itens_do_host(api_request, host_id)
+        if itens is None:
+            print("Erro: não foi possível ler os itens do host para a limpeza.", file=sys.stderr)
+            return 1
+        orfaos = registrar_orfaos(estado_workflows, itens, ids_atuais, agora)
+        if orfaos:
+            print(f"Limpeza: {len(orfaos)} workflows excluídos só conhecidos pelos itens do host; "
+                  f"prazo contando a partir de agora.")
+    vencidos = workflows_vencidos(estado_workflows, parametros["prazo"], agora)
+    if not vencidos:
+        return 0
+    if itens is None:
+        itens = buscar_itens_do_host(api_request, host_id)
+        if itens is None:
+            print("Erro: não foi possível ler os itens do host para a limpeza.", file=sys.stderr)
+            return 1
+    alvo = set(vencidos)
+    itens_vencidos = [item for item in itens if workflow_do_texto(item["key_"]) in alvo]
+    print(f"Limpeza: {len(vencidos)} workflows excluídos/arquivados há mais de "
+          f"{parametros['prazo'].total_seconds() / 86400:g} dias.")
+    falhas = aplicar_limpeza(api_request, itens_vencidos, parametros["acao"], tamanho, dry_run)
+    if not falhas and not dry_run:
+        for workflow_id in vencidos:
+            estado_workflows[workflow_id].update(limpo=agora, hash=None)
+    return falhas
@@ -0,0 +1,408 @@
+"""Provisionamento em lote, por diferença, dos itens e triggers dos workflows.
+
+Em vez de um item.get + item.update/create por item, lê de uma vez todos os
+itens n8n.workflow.* e triggers do host, compara com o estado desejado e só
+envia o que mudou, em chamadas item.create/item.update/trigger.* com arrays.
+As funções recebem a função de chamada da API (zabbix_api_request), que
+devolve None em caso de erro.
+"""
+
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ZABBIX_ITEM_PREFIX = "n8n.workflow."
+LOTE_PADRAO = 100
+
+# Campos lidos do Zabbix para comparar com o estado desejado
+CAMPOS_ITEM = ["itemid", "hostid", "name", "key_", "type", "value_type", "interfaceid", "delay", "history",
+               "trends", "units", "description", "trapper_hosts", "master_itemid", "status"]
+CAMPOS_TRIGGER = ["triggerid", "description", "expression", "priority", "status", "recovery_mode",
+                  "manual_close", "comments", "event_name"]
+# Campos só usados na criação
+CAMPOS_IGNORADOS = {"hostid"}
+
+
+class Plano:
+    """Mudanças calculadas entre o estado desejado e o existente no Zabbix."""
+
+    def __init__(self):
+        self.criar_itens = []
+        self.atualizar_itens = []
+        self.criar_triggers = []
+        self.atualizar_triggers = []
+        # (descrição, triggerid, workflow_id) das triggers substituídas por outra de mesma identidade
+        self.apagar_triggers = []
+        self.itens_inalterados = 0
+        self.triggers_inalteradas = 0
+        # Ids no Zabbix por chave de item / expressão de trigger (existentes e criados)
+        self.ids_itens = {}
+        self.ids_triggers = {}
+
+    def vazio(self):
+        return not (self.criar_itens or self.atualizar_itens or self.criar_triggers or self.atualizar_triggers
+                    or self.apagar_triggers)
+
+
+def normalizar(valor):
+    """Normaliza valores escalares para comparação: a API devolve tudo como texto."""
+    if valor is None:
+        return ""
+    return str(valor)
+
+
+# Listas de objetos em que a ordem importa (os passos de pré-processamento)
+CAMPOS_ORDENADOS = {"preprocessing"}
+
+
+def _objetos_iguais(desejado, existente, ordenado):
+    """Compara listas de objetos (tags, pré-processamento) só pelos campos desejados."""
+    desejado = desejado if isinstance(desejado, list) else [desejado]
+    existente = existente or []
+    campos = {campo for objeto in desejado for campo in objeto}
+    lado_a = [tuple(sorted((c, normalizar(o.get(c))) for c in campos)) for o in desejado]
+    lado_b = [tuple(sorted((c, normalizar(o.get(c))) for c in campos)) for o in existente]
+    if not ordenado:
+        lado_a.sort()
+        lado_b.sort()
+    return lado_a == lado_b
+
+
+def campos_alterados(desejado, existente):
+    """Nomes dos campos cujo valor desejado difere do existente."""
+    alterados = []
+    for campo, valor in desejado.items():
+        if campo in CAMPOS_IGNORADOS:
+            continue
+        if isinstance(valor, (list, dict)):
+            if not _objetos_iguais(valor, existente.get(campo), campo in CAMPOS_ORDENADOS):
+                alterados.append(campo)
+        elif normalizar(valor) != normalizar(existente.get(campo)):
+            alterados.append(campo)
+    return alterados
+
+
+def buscar_itens_existentes(api_request, host_id, chaves=None):
+    """Todos os itens n8n.workflow.* do host, indexados pela chave.
+
+    Com chaves, busca só esses itens (filtro exato) em vez do prefixo.
+    """
+    params = {
+        "output": CAMPOS_ITEM,
+        "hostids": host_id,
+        "selectPreprocessing": "extend",
+        "selectTags": "extend",
+    }
+    if chaves is not None:
+        params["filter"] = {"key_": list(chaves)}
+    else:
+        params["search"] = {"key_": ZABBIX_ITEM_PREFIX}
+        params["startSearch"] = True
+    itens = api_request("item.get", params)
+    if itens is None:
+        return None
+    return {item["key_"]: item for item in itens}
+
+
+def buscar_triggers_existentes(api_request, host_id, itemids=None):
+    """Triggers do host que usam itens n8n.workflow.*, indexadas pela expressão.
+
+    Com itemids, busca só as triggers que dependem desses itens.
+    """
+    params = {
+        "output": CAMPOS_TRIGGER,
+        "hostids": host_id,
+        "expandExpression": True,
+    }
+    if itemids is not None:
+        if not itemids:
+            return {}
+        params["itemids"] = list(itemids)
+    triggers = api_request("trigger.get", params)
+    if triggers is None:
+        return None
+    return {t["expression"]: t for t in triggers if f"/{ZABBIX_ITEM_PREFIX}" in t["expression"]}
+
+
+def garantir_item(api_request, params, dry_run=False):
+    """Cria ou atualiza um item avulso (o item mestre) e devolve o itemid.
+
+    Retorna None em caso de erro ou, com dry_run, se o item ainda não existe.
+    """
+    existentes = api_request("item.get", {"output": CAMPOS_ITEM, "hostids": params["hostid"],
+                                          "filter": {"key_": params["key_"]}, "selectTags": "extend"})
+    if existentes is None:
+        return None
+    if not existentes:
+        print(f"+ item    {params['key_']} - {params['name']}")
+        if dry_run:
+            return None
+        resposta = api_request("item.create", params)
+        return resposta["itemids"][0] if resposta else None
+    existente = existentes[0]
+    alterados = campos_alterados(params, existente)
+    if alterados:
+        print(f"~ item    {params['key_']} ({', '.join(alterados)})")
+        if not dry_run:
+            atualizacao = {campo: params[campo] for campo in alterados}
+            atualizacao["itemid"] = existente["itemid"]
+            if api_request("item.update", atualizacao) is None:
+                return None
+    return existente["itemid"]
+
+
+def workflow_do_texto(texto):
+    """Id do workflow no primeiro parâmetro de chave n8n.workflow.*[<id>] do texto."""
+    encontrado = re.search(re.escape(ZABBIX_ITEM_PREFIX) + r"[\w.]+\[([^,\]]*)", texto)
+    return encontrado.group(1) if encontrado else None
+
+
+def identidade_trigger(expressao):
+    """Expressão sem a constante final: 'min(/h/n8n.workflow.x[1],5m)>300' -> 'min(/h/n8n.workflow.x[1],5m)>'.
+
+    Os limites configuráveis (QUEUE_MAX_*, TRIGGER_SCORE) ficam só na
+    constante; a função, o item e o operador identificam a trigger.
+    """
+    return re.sub(r"\s*-?[\d.]+$", "", expressao)
+
+
+def chave_da_trigger(expressao):
+    """Chave do item n8n.workflow.* usado pela expressão da trigger (None se não houver)."""
+    encontrado = re.search(re.escape(ZABBIX_ITEM_PREFIX) + r"[\w.]+\[[^\]]*\]", expressao)
+    return encontrado.group(0) if encontrado else None
+
+
+def planejar(itens_desejados, triggers_desejadas, itens_existentes, triggers_existentes):
+    """Calcula o plano de mudanças.
+
+    Itens casam pela chave e triggers pela identidade (identidade_trigger): com
+    um limite alterado a trigger existente recebe trigger.update da expressão
+    em vez de ganhar uma segunda. Outras triggers da mesma identidade (de
+    versões que criavam uma por limite) são apagadas.
+    """
+    plano = Plano()
+    for params in itens_desejados:
+        existente = itens_existentes.get(params["key_"])
+        if existente is None:
+            plano.criar_itens.append(params)
+            continue
+        plano.ids_itens[params["key_"]] = existente["itemid"]
+        alterados = campos_alterados(params, existente)
+        if alterados:
+            atualizacao = {campo: params[campo] for campo in alterados}
+            atualizacao["itemid"] = existente["itemid"]
+            plano.atualizar_itens.append((params["key_"], atualizacao, workflow_do_texto(params["key_"])))
+        else:
+            plano.itens_inalterados += 1
+
+    por_identidade = {}
+    for existente in sorted(triggers_existentes.values(), key=lambda t: int(t["triggerid"])):
+        por_identidade.setdefault(identidade_trigger(existente["expression"]), []).append(existente)
+    for params in triggers_desejadas:
+        candidatas = por_identidade.pop(identidade_trigger(params["expression"]), [])
+        if not candidatas:
+            plano.criar_triggers.append(params)
+            continue
+        # A de mesma expressão, se houver; senão a mais antiga
+        existente = next((t for t in candidatas if t["expression"] == params["expression"]), candidatas[0])
+        for duplicada in candidatas:
+            if duplicada is not existente:
+                plano.apagar_triggers.append((duplicada["description"], duplicada["triggerid"],
+                                              workflow_do_texto(duplicada["expression"])))
+        plano.ids_triggers[params["expression"]] = existente["triggerid"]
+        alterados = campos_alterados(params, existente)
+        if alterados:
+            atualizacao = {campo: params[campo] for campo in alterados}
+            atualizacao["triggerid"] = existente["triggerid"]
+            plano.atualizar_triggers.append(
+                (params["description"], atualizacao, workflow_do_texto(params["expression"])))
+        else:
+            plano.triggers_inalteradas += 1
+    return plano
+
+
+def imprimir_plano(plano, detalhado=False, saida=sys.stdout):
+    """Resumo do plano; com detalhado lista cada objeto e os campos alterados."""
+    if detalhado:
+        for params in plano.criar_itens:
+            print(f"+ item    {params['key_']} - {params['name']}", file=saida)
+        for chave, atualizacao, _ in plano.atualizar_itens:
+            campos = ", ".join(c for c in atualizacao if c != "itemid")
+            print(f"~ item    {chave} ({campos})", file=saida)
+        for params in plano.criar_triggers:
+            print(f"+ trigger {params['description']}", file=saida)
+        for descricao, atualizacao, _ in plano.atualizar_triggers:
+            campos = ", ".join(c for c in atualizacao if c != "triggerid")
+            print(f"~ trigger {descricao} ({campos})", file=saida)
+        for descricao, _, _ in plano.apagar_triggers:
+            print(f"- trigger {descricao}", file=saida)
+    print(f"Itens: {len(plano.criar_itens)} a criar, {len(plano.atualizar_itens)} a atualizar, "
+          f"{plano.itens_inalterados} inalterados.", file=saida)
+    print(f"Triggers: {len(plano.criar_triggers)} a criar, {len(plano.atualizar_triggers)} a atualizar, "
+          f"{len(plano.apagar_triggers)} a apagar, {plano.triggers_inalteradas} inalteradas.", file=saida)
+
+
+def lotes(objetos, tamanho):
+    for inicio in range(0, len(objetos), tamanho):
+        yield objetos[inicio:inicio + tamanho]
+
+
+def chamar_em_lotes(api_request, metodo, objetos, tamanho=LOTE_PADRAO):
+    """Chama o método da API com arrays de até `tamanho` objetos.
+
+    Retorna (objetos aplicados, lotes com falha, ids devolvidos na ordem dos
+    objetos, com None para os de lotes que falharam). Um lote com erro é
+    rejeitado inteiro pelo Zabbix; os demais seguem.
+    """
+    aplicados = falhas = 0
+    ids = []
+    for lote in lotes(objetos, tamanho):
+        resposta = api_request(metodo, lote)
+        if resposta is None:
+            print(f"Falha em {metodo} com {len(lote)} objetos.", file=sys.stderr)
+            falhas += 1
+            ids += [None] * len(lote)
+        else:
+            aplicados += len(lote)
+            ids += next(iter(resposta.values()), [])
+    return aplicados, falhas, ids
+
+
+class LimitadorTaxa:
+    """Limita as chamadas por segundo de cada método da API (0 = sem limite)."""
+
+    def __init__(self, chamadas_por_segundo=0):
+        self.intervalo = 1.0 / chamadas_por_segundo if chamadas_por_segundo else 0.0
+        self.proxima = {}
+        self.trava = threading.Lock()
+
+    def aguardar(self, metodo):
+        if not self.intervalo:
+            return
+        with self.trava:
+            agora = time.monotonic()
+            horario = max(agora, self.proxima.get(metodo, agora))
+            self.proxima[metodo] = horario + self.intervalo
+        if horario > agora:
+            time.sleep(horario - agora)
+
+
+def _registrar_ids(criados, ids, campo, destino):
+    for params, novo_id in zip(criados, ids):
+        if novo_id is not None:
+            destino[params[campo]] = novo_id
+
+
+def _somar(resultado, metodo, parcial):
+    aplicados, falhas, _ = resultado.get(metodo, (0, 0, None))
+    resultado[metodo] = (aplicados + parcial[0], falhas + parcial[1], None)
+
+
+def _tarefas_por_workflow(plano, tamanho):
+    """Agrupa as mudanças por workflow e junta workflows em tarefas de até `tamanho` itens.
+
+    Cada tarefa leva os itens e as triggers dos mesmos workflows, para que as
+    triggers sejam criadas depois dos itens de que dependem.
+    """
+    grupos = {}
+
+    def grupo(workflow_id):
+        return grupos.setdefault(workflow_id, {"criar_itens": [], "atualizar_itens": [],
+                                               "criar_triggers": [], "atualizar_triggers": [],
+                                               "apagar_triggers": []})
+
+    for params in plano.criar_itens:
+        grupo(workflow_do_texto(params["key_"]))["criar_itens"].append(params)
+    for _, atualizacao, workflow_id in plano.atualizar_itens:
+        grupo(workflow_id)["atualizar_itens"].append(atualizacao)
+    for params in plano.criar_triggers:
+        grupo(workflow_do_texto(params["expression"]))["criar_triggers"].append(params)
+    for _, atualizacao, workflow_id in plano.atualizar_triggers:
+        grupo(workflow_id)["atualizar_triggers"].append(atualizacao)
+    for _, triggerid, workflow_id in plano.apagar_triggers:
+        grupo(workflow_id)["apagar_triggers"].append(triggerid)
+
+    tarefas = []
+    atual = None
+    for mudancas in grupos.values():
+        tamanho_grupo = len(mudancas["criar_itens"]) + len(mudancas["atualizar_itens"])
+        if atual is None or (atual["_itens"] and atual["_itens"] + tamanho_grupo > tamanho):
+            atual = {"_itens": 0, "criar_itens": [], "atualizar_itens": [],
+                     "criar_triggers": [], "atualizar_triggers": [], "apagar_triggers": []}
+            tarefas.append(atual)
+        atual["_itens"] += tamanho_grupo
+        for campo, objetos in mudancas.items():
+            atual[campo] += objetos
+    return tarefas
+
+
+def _aplicar_tarefa(tarefa, plano, api_request, tamanho):
+    resultado = {}
+    criados = chamar_em_lotes(api_request, "item.create", tarefa["criar_itens"], tamanho)
+    _registrar_ids(tarefa["criar_itens"], criados[2], "key_", plano.ids_itens)
+    _somar(resultado, "item.create", criados)
+    _somar(resultado, "item.update", chamar_em_lotes(api_request, "item.update", tarefa["atualizar_itens"], tamanho))
+
+    if criados[1]:
+        # Sem os itens as triggers novas seriam rejeitadas: ficam para a próxima execução
+        _somar(resultado, "trigger.create", (0, 1 if tarefa["criar_triggers"] else 0, None))
+    else:
+        criadas = chamar_em_lotes(api_request, "trigger.create", tarefa["criar_triggers"], tamanho)
+        _registrar_ids(tarefa["criar_triggers"], criadas[2], "expression", plano.ids_triggers)
+        _somar(resultado, "trigger.create", criadas)
+    _somar(resultado, "trigger.update",
+           chamar_em_lotes(api_request, "trigger.update", tarefa["atualizar_triggers"], tamanho))
+    _somar(resultado, "trigger.delete",
+           chamar_em_lotes(api_request, "trigger.delete", tarefa["apagar_triggers"], tamanho))
+    return resultado
+
+
+def aplicar_plano(plano, api_request, tamanho=LOTE_PADRAO, workers=1, limitador=None):
+    """Aplica o plano e devolve o total de lotes com falha.
+
+    Com workers = 1, aplica todos os itens e depois todas as triggers. Com
+    mais workers, divide as mudanças em tarefas por grupo de workflows
+    (itens e depois triggers de cada grupo) executadas em paralelo, com a
+    taxa de chamadas por método limitada pelo LimitadorTaxa opcional.
+    Preenche plano.ids_itens/ids_triggers com os ids criados.
+    """
+    if limitador is not None:
+        chamada_original = api_request
+
+        def api_request(method, params):
+            limitador.aguardar(method)
+            return chamada_original(method, params)
+
+    resultado = {}
+    if workers <= 1:
+        resultado["item.create"] = chamar_em_lotes(api_request, "item.create", plano.criar_itens, tamanho)
+        resultado["item.update"] = chamar_em_lotes(
+            api_request, "item.update", [a for _, a, _ in plano.atualizar_itens], tamanho)
+        _registrar_ids(plano.criar_itens, resultado["item.create"][2], "key_", plano.ids_itens)
+
+        # Como em _aplicar_tarefa: uma trigger de item que não foi criado derrubaria o lote
+        # inteiro (inclusive as válidas); fica para a próxima execução
+        criar_triggers = [t for t in plano.criar_triggers if chave_da_trigger(t["expression"]) in plano.ids_itens]
+        criadas = chamar_em_lotes(api_request, "trigger.create", criar_triggers, tamanho)
+        _registrar_ids(criar_triggers, criadas[2], "expression", plano.ids_triggers)
+        resultado["trigger.create"] = criadas
+        if len(criar_triggers) < len(plano.criar_triggers):
+            _somar(resultado, "trigger.create", (0, 1, None))
+        resultado["trigger.update"] = chamar_em_lotes(
+            api_request, "trigger.update", [a for _, a, _ in plano.atualizar_triggers], tamanho)
+        resultado["trigger.delete"] = chamar_em_lotes(
+            api_request, "trigger.delete", [t for _, t, _ in plano.apagar_triggers], tamanho)
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            parciais = executor.map(lambda tarefa: _aplicar_tarefa(tarefa, plano, api_request, tamanho),
+                                    _tarefas_por_workflow(plano, tamanho))
+            for parcial in parciais:
+                for metodo, valores in parcial.items():
+                    _somar(resultado, metodo, valores)
+
+    for metodo, (aplicados, falhas, _) in resultado.items():
+        if aplicados or falhas:
+            print(f"{metodo}: {aplicados} aplicados, {falhas} lotes com falha.")
+    return sum(falhas for _, falhas, _ in resultado.values())
@@ -0,0 +1,84 @@
+"""Cliente mínimo do protocolo Zabbix sender (itens do tipo trapper).
+
+Equivalente ao zabbix_sender, sem dependências externas: monta um único
+pacote "sender data" com todos os valores e envia ao trapper do Zabbix
+server/proxy (porta 10051 por padrão).
+"""
+
+import json
+import re
+import socket
+import struct
+import time
+
+CABECALHO = b"ZBXD\x01"
+TAMANHO_CABECALHO = len(CABECALHO) + 8
+
+
+class ZabbixSenderError(Exception):
+    """Falha de rede ou de protocolo ao enviar valores ao trapper."""
+
+
+def montar_pacote(dados):
+    """Serializa o pedido "sender data" com o cabeçalho ZBXD."""
+    corpo = json.dumps({"request": "sender data", "data": dados}).encode("utf-8")
+    return CABECALHO + struct.pack("<II", len(corpo), 0) + corpo
+
+
+def _receber(sock, tamanho):
+    buffer = b""
+    while len(buffer) < tamanho:
+        parte = sock.recv(tamanho - len(buffer))
+        if not parte:
+            raise ZabbixSenderError("Conexão encerrada pelo trapper antes do fim da resposta.")
+        buffer += parte
+    return buffer
+
+
+def ler_pacote(sock):
+    """Lê um pacote ZBXD do socket e devolve o JSON decodificado."""
+    cabecalho = _receber(sock, TAMANHO_CABECALHO)
+    if not cabecalho.startswith(b"ZBXD"):
+        raise ZabbixSenderError(f"Cabeçalho inválido na resposta do trapper: {cabecalho!r}")
+    tamanho, _ = struct.unpack("<II", cabecalho[5:])
+    return json.loads(_receber(sock, tamanho).decode("utf-8"))
+
+
+def resumo_resposta(resposta):
+    """Extrai processed/failed/total do campo info da resposta."""
+    numeros = dict(re.findall(r"(processed|failed|total): (\d+)", resposta.get("info", "")))
+    return {chave: int(valor) for chave, valor in numeros.items()}
+
+
+def zabbix_send(servidor, porta, host, valores, timeout=10.0, lote=0):
+    """Envia pares (chave, valor) do host informado ao trapper.
+
+    Todos os valores recebem o mesmo clock da coleta. Com lote > 0 os valores
+    são divididos em vários pacotes desse tamanho; com 0 vai tudo num só.
+    Retorna o somatório de processed/failed/total das respostas.
+    """
+    agora = time.time()
+    dados = [{
+        "host": host,
+        "key": chave,
+        "value": str(valor),
+        "clock": int(agora),
+        "ns": int((agora % 1) * 1e9),
+    } for chave, valor in valores]
+
+    lotes = [dados[i:i + lote] for i in range(0, len(dados), lote)] if lote > 0 else [dados]
+    total = {"processed": 0, "failed": 0, "total": 0}
+    for parte in lotes:
+        if not parte:
+            continue
+        try:
+            with socket.create_connection((servidor, int(porta)), timeout=timeout) as sock:
+                sock.sendall(montar_pacote(parte))
+                resposta = ler_pacote(sock)
+        except (OSError, ValueError) as e:
+            raise ZabbixSenderError(f"Erro ao enviar valores para {servidor}:{porta}: {e}") from e
+        if resposta.get("response") != "success":
+            raise ZabbixSenderError(f"Trapper recusou os valores: {resposta}")
+        for chave, valor in resumo_resposta(resposta).items():
+            total[chave] = total.get(chave, 0) + valor
+    return total
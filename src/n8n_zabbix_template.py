@@ -0,0 +1,288 @@
+"""Template do Zabbix com regra de LLD e protótipos dos itens/triggers dos workflows.
+
+Os protótipos saem das mesmas definições usadas pela descoberta imperativa
+(n8n_zabbix_itens), com {#WORKFLOW_ID}/{#WORKFLOW_NAME} no lugar do id e do
+nome, convertidas para o formato de exportação do Zabbix (YAML, XML ou JSON).
+Com o template vinculado ao host, o próprio servidor cria e remove os itens a
+partir do JSON de LLD (n8n-by-zabbix-via-API.py) e o script de descoberta não
+precisa mais chamar a API.
+
+A conversão de um host já provisionado renomeia os itens criados pela
+descoberta para chaves legacy.* e os desativa (junto com as triggers), para
+que a LLD possa criar os itens com as chaves originais sem conflito; o
+histórico continua nos itens legados até expirar.
+"""
+
+import hashlib
+import json
+import uuid
+import xml.etree.ElementTree as ET
+
+from n8n_metricas import CHAVE_METRICAS
+from n8n_zabbix_itens import ITEM_TYPE_DEPENDENT, item_mestre, itens_workflow, triggers_workflow
+from n8n_zabbix_provisionamento import ZABBIX_ITEM_PREFIX, chamar_em_lotes, identidade_trigger
+
+TEMPLATE_NOME_PADRAO = "n8n by Zabbix"
+CHAVE_DESCOBERTA_PADRAO = "n8n.workflows.discovery"
+GRUPO_TEMPLATES = "Templates/Applications"
+VERSAO_EXPORTACAO = "7.0"
+PREFIXO_LEGADO = "legacy."
+MACRO_ID = "{#WORKFLOW_ID}"
+MACRO_NOME = "{#WORKFLOW_NAME}"
+
+# Constantes numéricas da API -> nomes usados na exportação
+TIPOS_ITEM = {0: "ZABBIX_PASSIVE", 2: "TRAP", 18: "DEPENDENT"}
+TIPOS_VALOR = {0: "FLOAT", 1: "CHAR", 2: "LOG", 3: "UNSIGNED", 4: "TEXT"}
+TIPOS_PREPROCESSAMENTO = {5: "REGEX", 12: "JSONPATH", 19: "DISCARD_UNCHANGED", 20: "DISCARD_UNCHANGED_HEARTBEAT"}
+TRATAMENTO_ERRO = {0: "ORIGINAL_ERROR", 1: "DISCARD_VALUE", 2: "CUSTOM_VALUE", 3: "CUSTOM_ERROR"}
+SEVERIDADES = {0: "NOT_CLASSIFIED", 1: "INFO", 2: "WARNING", 3: "AVERAGE", 4: "HIGH", 5: "DISASTER"}
+MODOS_RECUPERACAO = {0: "EXPRESSION", 1: "RECOVERY_EXPRESSION", 2: "NONE"}
+
+# Nome dos elementos de lista no XML de exportação
+SINGULAR_XML = {
+    "template_groups": "template_group", "templates": "template", "groups": "group", "items": "item",
+    "discovery_rules": "discovery_rule", "item_prototypes": "item_prototype",
+    "trigger_prototypes": "trigger_prototype", "tags": "tag", "preprocessing": "step",
+    "parameters": "parameter",
+}
+
+
+def uuid_estavel(*partes):
+    """UUID v4 determinístico: reexportar o template não muda os uuids."""
+    return uuid.UUID(bytes=hashlib.md5("|".join(partes).encode("utf-8")).digest(), version=4).hex
+
+
+def prototipo_item(params, template):
+    """Converte os parâmetros de item.create no protótipo de item da exportação."""
+    prototipo = {
+        "uuid": uuid_estavel(template, params["key_"]),
+        "name": params["name"],
+    }
+    if params["type"] != 0:
+        prototipo["type"] = TIPOS_ITEM[params["type"]]
+    prototipo["key"] = params["key_"]
+    if "delay" in params and params["type"] == 0:
+        prototipo["delay"] = params["delay"]
+    if params["type"] == ITEM_TYPE_DEPENDENT:
+        prototipo["master_item"] = {"key": CHAVE_METRICAS}
+    prototipo["history"] = params["history"]
+    if params["value_type"] in (0, 3) and "trends" in params:
+        prototipo["trends"] = params["trends"]
+    if params["value_type"] != 3:
+        prototipo["value_type"] = TIPOS_VALOR[params["value_type"]]
+    if params.get("units"):
+        prototipo["units"] = params["units"]
+    if params.get("trapper_hosts"):
+        prototipo["allowed_hosts"] = params["trapper_hosts"]
+    prototipo["description"] = params["description"]
+    if params.get("preprocessing"):
+        passos = []
+        for passo in params["preprocessing"]:
+            convertido = {"type": TIPOS_PREPROCESSAMENTO[passo["type"]]}
+            if passo.get("params"):
+                convertido["parameters"] = passo["params"].split("\n")
+            if passo.get("error_handler"):
+                convertido["error_handler"] = TRATAMENTO_ERRO[passo["error_handler"]]
+                if passo.get("error_handler_params"):
+                    convertido["error_handler_params"] = passo["error_handler_params"]
+            passos.append(convertido)
+        prototipo["preprocessing"] = passos
+    prototipo["tags"] = [dict(tag) for tag in params.get("tags", [])]
+    return prototipo
+
+
+def prototipo_trigger(params, template):
+    """Converte os parâmetros de trigger.create no protótipo de trigger da exportação.
+
+    O uuid vem da identidade da trigger (sem o limite): reimportar o template
+    com outro TRIGGER_SCORE ou QUEUE_MAX_* atualiza o protótipo em vez de
+    criar um segundo.
+    """
+    prototipo = {
+        "uuid": uuid_estavel(template, identidade_trigger(params["expression"])),
+        "expression": params["expression"],
+        "name": params["description"],
+    }
+    if params.get("event_name"):
+        prototipo["event_name"] = params["event_name"]
+    prototipo["priority"] = SEVERIDADES[params["priority"]]
+    if params.get("recovery_mode"):
+        prototipo["recovery_mode"] = MODOS_RECUPERACAO[params["recovery_mode"]]
+    if params.get("manual_close"):
+        prototipo["manual_close"] = "YES"
+    if params.get("comments"):
+        prototipo["description"] = params["comments"]
+    return prototipo
+
+
+def montar_template(nome=TEMPLATE_NOME_PADRAO, chave_descoberta=CHAVE_DESCOBERTA_PADRAO, modo="agent",
+                    trapper_hosts=None, histograma=False, intervalo_descoberta="1h", lifetime="7d", janelas=(),
+                    fila=None, falhas=False, descarte=None, linha_base=None):
+    """Estrutura de exportação (zabbix_export) do template com a regra de LLD.
+
+    Com modo = dependent o template leva também o item mestre n8n.workflows.metrics.
+    `fila` (limites das triggers, ver limites_fila) inclui os protótipos da fila
+    e `falhas` os da última falha; `descarte` ({familia: heartbeat}) acrescenta o
+    descarte de valores inalterados e `linha_base` (config_linha_base) o desvio
+    da duração com a sua trigger.
+    """
+    itens = itens_workflow(MACRO_ID, MACRO_NOME, None, None, modo, trapper_hosts, histograma, janelas=janelas,
+                           fila=fila is not None, falhas=falhas, descarte=descarte, linha_base=linha_base is not None)
+    triggers = triggers_workflow(MACRO_ID, MACRO_NOME, nome, fila, falhas,
+                                 linha_base["limite"] if linha_base else None)
+
+    prototipos = {item["key_"]: prototipo_item(item, nome) for item in itens}
+    for trigger in triggers:
+        # Cada trigger usa um único item: vai aninhada no protótipo dele, como na exportação do Zabbix
+        chave = next(k for k in prototipos if f"/{nome}/{k})" in trigger["expression"]
+                     or f"/{nome}/{k}," in trigger["expression"])
+        prototipos[chave].setdefault("trigger_prototypes", []).append(prototipo_trigger(trigger, nome))
+
+    template = {
+        "uuid": uuid_estavel(nome),
+        "template": nome,
+        "name": nome,
+        "description": "Workflows do n8n descobertos por LLD ({#WORKFLOW_ID}/{#WORKFLOW_NAME}). "
+                       "Gerado por n8n-by-zabbix-template.py.",
+        "groups": [{"name": GRUPO_TEMPLATES}],
+    }
+    if modo == "dependent":
+        template["items"] = [prototipo_item(item_mestre(None, None), nome)]
+    template["discovery_rules"] = [{
+        "uuid": uuid_estavel(nome, chave_descoberta),
+        "name": "Workflows do n8n",
+        "key": chave_descoberta,
+        "delay": intervalo_descoberta,
+        "lifetime": lifetime,
+        "description": "Descobre os workflows ativos do n8n.",
+        "item_prototypes": list(prototipos.values()),
+    }]
+
+    return {
+        "zabbix_export": {
+            "version": VERSAO_EXPORTACAO,
+            "template_groups": [{"uuid": uuid_estavel(GRUPO_TEMPLATES), "name": GRUPO_TEMPLATES}],
+            "templates": [template],
+        }
+    }
+
+
+def _escalar_yaml(valor):
+    # Strings JSON são escalares YAML válidos entre aspas duplas (inclusive com \n)
+    return json.dumps(str(valor), ensure_ascii=False)
+
+
+def _linhas_yaml(valor, recuo):
+    espaco = "  " * recuo
+    if isinstance(valor, dict):
+        for chave, item in valor.items():
+            if isinstance(item, (dict, list)) and item:
+                yield f"{espaco}{chave}:"
+                yield from _linhas_yaml(item, recuo + 1)
+            elif isinstance(item, (dict, list)):
+                yield f"{espaco}{chave}: {'{}' if isinstance(item, dict) else '[]'}"
+            else:
+                yield f"{espaco}{chave}: {_escalar_yaml(item)}"
+    else:
+        for item in valor:
+            if isinstance(item, dict):
+                linhas = list(_linhas_yaml(item, recuo + 1))
+                yield f"{espaco}- {linhas[0].lstrip()}"
+                yield from linhas[1:]
+            else:
+                yield f"{espaco}- {_escalar_yaml(item)}"
+
+
+def para_yaml(exportacao):
+    return "\n".join(_linhas_yaml(exportacao, 0)) + "\n"
+
+
+def _elemento_xml(pai, nome, valor):
+    elemento = ET.SubElement(pai, nome)
+    if isinstance(valor, dict):
+        for chave, item in valor.items():
+            _elemento_xml(elemento, chave, item)
+    elif isinstance(valor, list):
+        for item in valor:
+            _elemento_xml(elemento, SINGULAR_XML.get(nome, nome), item)
+    else:
+        elemento.text = str(valor)
+    return elemento
+
+
+def para_xml(exportacao):
+    raiz = ET.Element("zabbix_export")
+    for chave, valor in exportacao["zabbix_export"].items():
+        _elemento_xml(raiz, chave, valor)
+    ET.indent(raiz)
+    return '<?xml version="1.0" encoding="UTF-8"?>\n' + ET.tostring(raiz, encoding="unicode") + "\n"
+
+
+def para_json(exportacao):
+    return json.dumps(exportacao, indent=4, ensure_ascii=False) + "\n"
+
+
+FORMATOS = {"yaml": para_yaml, "xml": para_xml, "json": para_json}
+
+
+def buscar_itens_imperativos(api_request, host_id):
+    """Itens n8n.workflow.* normais (não descobertos por LLD) do host, mais o item mestre."""
+    itens = api_request("item.get", {
+        "output": ["itemid", "key_", "name", "status"],
+        "hostids": host_id,
+        "search": {"key_": ZABBIX_ITEM_PREFIX},
+        "startSearch": True,
+        "filter": {"flags": 0},
+    })
+    mestre = api_request("item.get", {
+        "output": ["itemid", "key_", "name", "status"],
+        "hostids": host_id,
+        "filter": {"key_": CHAVE_METRICAS, "flags": 0},
+    })
+    if itens is None or mestre is None:
+        return None
+    return itens + mestre
+
+
+def planejar_conversao(itens, triggers):
+    """item.update e trigger.update que tiram os itens imperativos do caminho da LLD."""
+    atualizacoes_itens = [
+        {"itemid": item["itemid"], "key_": PREFIXO_LEGADO + item["key_"],
+         "name": f"{item['name']} (legado)", "status": 1}
+        for item in itens
+    ]
+    atualizacoes_triggers = [{"triggerid": t["triggerid"], "status": 1} for t in triggers if str(t["status"]) == "0"]
+    return atualizacoes_itens, atualizacoes_triggers
+
+
+def converter_host(api_request, host_id, tamanho, dry_run=False):
+    """Renomeia para legacy.* e desativa os itens/triggers criados pela descoberta.
+
+    Retorna (itens convertidos, triggers desativadas, lotes com falha), ou None
+    se não foi possível ler o estado atual do host.
+    """
+    itens = buscar_itens_imperativos(api_request, host_id)
+    if itens is None:
+        return None
+    triggers = []
+    if itens:
+        triggers = api_request("trigger.get", {"output": ["triggerid", "status"], "hostids": host_id,
+                                               "itemids": [item["itemid"] for item in itens]})
+        if triggers is None:
+            return None
+    atualizacoes_itens, atualizacoes_triggers = planejar_conversao(itens, triggers)
+    if dry_run:
+        return len(atualizacoes_itens), len(atualizacoes_triggers), 0
+    # Triggers primeiro: se a renomeação falhar no meio, nenhum alarme fica duplicado
+    _, falhas_triggers, _ = chamar_em_lotes(api_request, "trigger.update", atualizacoes_triggers, tamanho)
+    _, falhas_itens, _ = chamar_em_lotes(api_request, "item.update", atualizacoes_itens, tamanho)
+    return len(atualizacoes_itens), len(atualizacoes_triggers), falhas_triggers + falhas_itens
+
+
+def vincular_template(api_request, host_id, nome=TEMPLATE_NOME_PADRAO):
+    """Vincula o template (já importado) ao host sem mexer nos outros templates."""
+    templates = api_request("template.get", {"output": ["templateid"], "filter": {"host": nome}})
+    if not templates:
+        return False
+    return api_request("host.massadd", {"hosts": [{"hostid": host_id}],
+                                        "templates": [{"templateid": templates[0]["templateid"]}]}) is not None
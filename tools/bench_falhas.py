@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""Mede a memória da extração da falha (n8n_falhas) em blobs grandes de execution_data.
+
+Insere execuções com erro (e uma sem erro no blob) com execution_data de
+vários tamanhos no formato flatted do n8n, e mede, cada uma num processo novo,
+o pico de RSS e o tempo de: leitura em pedaços + parser incremental
+(ler_falha) e leitura ingênua (SELECT data + json.loads). As linhas inseridas
+são apagadas no fim. Use um banco de testes criado por tools/seed_n8n_db.py.
+
+Exemplo:
+    python3 tools/bench_falhas.py --dsn "host=localhost dbname=n8n_teste user=postgres" --sizes 1,10,100
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+import psycopg2
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from n8n_falhas import LIMITE_BYTES_PADRAO, PEDACO_PADRAO, ler_falha  # noqa: E402
+
+NO_COM_ERRO = "HTTP Request"
+MENSAGEM = 'The service was not able to process your request "timeout"'
+
+
+def flatted(valor):
+    """Serializa como o flatted do n8n: array de elementos rasos, referências por índice em texto."""
+    elementos = [valor]
+    indices = {}
+
+    def referencia(item):
+        if isinstance(item, (dict, list, str)):
+            chave = ("s", item) if isinstance(item, str) else ("o", id(item))
+            if chave not in indices:
+                indices[chave] = str(len(elementos))
+                elementos.append(item)
+            return indices[chave]
+        return item
+
+    partes = []
+    posicao = 0
+    while posicao < len(elementos):
+        item = elementos[posicao]
+        if isinstance(item, dict):
+            partes.append(json.dumps({chave: referencia(valor) for chave, valor in item.items()}))
+        elif isinstance(item, list):
+            partes.append(json.dumps([referencia(valor) for valor in item]))
+        else:
+            partes.append(json.dumps(item))
+        posicao += 1
+    return "[" + ",".join(partes) + "]"
+
+
+def dados_execucao(megabytes, com_erro=True):
+    """IRunExecutionData com ~megabytes MB de saída dos nós em runData."""
+    itens = [{"json": {"id": i, "corpo": f"registro {i} " + "x" * 1000}} for i in range(megabytes * 1000)]
+    resultado = {
+        "runData": {
+            "Webhook": [{"startTime": 0, "executionTime": 1, "data": {"main": [itens]}}],
+            NO_COM_ERRO: [{"startTime": 1, "executionTime": 30000, "data": {"main": [[]]}}],
+        },
+        "lastNodeExecuted": NO_COM_ERRO,
+    }
+    if com_erro:
+        resultado["error"] = {
+            "message": MENSAGEM,
+            "description": "connect ETIMEDOUT 10.0.0.1:443",
+            "node": {"name": NO_COM_ERRO, "type": "n8n-nodes-base.httpRequest", "parameters": {}},
+            "stack": "NodeApiError: ...\n    at Object.execute",
+        }
+    return flatted({"startData": {}, "resultData": resultado, "executionData": {"nodeExecutionStack": []}})
+
+
+def inserir(conn, blob, workflow_id):
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            INSERT INTO n8n.execution_entity (finished, mode, "startedAt", "stoppedAt", "workflowId", status, "createdAt")
+            VALUES (false, 'trigger', NOW(), NOW(), %s, 'error', NOW()) RETURNING id
+        """, (workflow_id,))
+        execucao_id = cursor.fetchone()[0]
+        cursor.execute('INSERT INTO n8n.execution_data ("executionId", data) VALUES (%s, %s)', (execucao_id, blob))
+    conn.commit()
+    return execucao_id
+
+
+def medir(dsn, metodo, execucao_id):
+    """Roda um método num processo novo e devolve {rss_mb, tempo_ms, resultado}."""
+    saida = subprocess.run([sys.executable, __file__, "--dsn", dsn, "--medir", metodo, "--execucao",
+                            str(execucao_id)], capture_output=True, text=True, check=True)
+    return json.loads(saida.stdout)
+
+
+def pico_rss_mb():
+    # VmHWM recomeça no exec; ru_maxrss herdaria o pico do processo pai
+    with open("/proc/self/status", encoding="ascii") as status:
+        for linha in status:
+            if linha.startswith("VmHWM:"):
+                return round(int(linha.split()[1]) / 1024, 1)
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def medir_aqui(dsn, metodo, execucao_id):
+    conn = psycopg2.connect(dsn)
+    rss_inicial = pico_rss_mb()
+    inicio = time.monotonic()
+    with conn.cursor() as cursor:
+        if metodo == "streaming":
+            resultado = ler_falha(cursor, execucao_id, PEDACO_PADRAO, LIMITE_BYTES_PADRAO)
+        else:
+            cursor.execute('SELECT data FROM n8n."execution_data" WHERE "executionId" = %s', (execucao_id,))
+            elementos = json.loads(cursor.fetchone()[0])
+            resultado = {"elementos": len(elementos)}
+    tempo = time.monotonic() - inicio
+    conn.close()
+    print(json.dumps({
+        "rss_mb": pico_rss_mb(),
+        "rss_inicial_mb": rss_inicial,
+        "tempo_ms": round(tempo * 1000, 1),
+        "resultado": resultado,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dsn", required=True, help="DSN libpq do banco de testes")
+    parser.add_argument("--sizes", default="1,10,100", help="tamanhos dos blobs, em MB")
+    parser.add_argument("--workflow", default="wf000001", help="workflowId das execuções inseridas")
+    parser.add_argument("--medir", choices=["streaming", "ingenuo"], help=argparse.SUPPRESS)
+    parser.add_argument("--execucao", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.medir:
+        medir_aqui(args.dsn, args.medir, args.execucao)
+        return
+
+    conn = psycopg2.connect(args.dsn)
+    inseridas = []
+    resultados = []
+    try:
+        casos = [(int(tamanho), True) for tamanho in args.sizes.split(",")]
+        casos.append((max(tamanho for tamanho, _ in casos), False))
+        for megabytes, com_erro in casos:
+            blob = dados_execucao(megabytes, com_erro)
+            execucao_id = inserir(conn, blob, args.workflow)
+            inseridas.append(execucao_id)
+            caso = {"blob_mb": round(len(blob) / 1024 / 1024, 1), "erro_no_blob": com_erro}
+            del blob
+            for metodo in ("streaming", "ingenuo"):
+                caso[metodo] = medir(args.dsn, metodo, execucao_id)
+            if com_erro and caso["streaming"]["resultado"]["no"] != NO_COM_ERRO:
+                print(f"Erro: nó extraído incorreto: {caso['streaming']['resultado']}", file=sys.stderr)
+            resultados.append(caso)
+    finally:
+        if inseridas:
+            with conn.cursor() as cursor:
+                cursor.execute('DELETE FROM n8n."execution_entity" WHERE id = ANY(%s)', (inseridas,))
+            conn.commit()
+        conn.close()
+    print(json.dumps(resultados, indent=4, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
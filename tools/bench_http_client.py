@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""Compara chamadas JSON-RPC sem sessão (requests.post) e com o ClienteHttp keep-alive.
+
+Sobe localmente um servidor HTTPS (certificado autoassinado gerado com o
+openssl) que responde como a API do Zabbix e mede o tempo médio por chamada
+nos dois modos. A diferença é o custo do handshake TCP+TLS que a sessão
+amortiza.
+
+Exemplo:
+    python3 tools/bench_http_client.py --calls 500
+"""
+
+import argparse
+import json
+import os
+import ssl
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+import urllib3
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from n8n_http import ClienteHttp, ClienteZabbix  # noqa: E402
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Cabeçalho e corpo saem em writes separados: sem isso o Nagle + ACK
+    # atrasado somam ~40 ms por resposta na conexão keep-alive
+    disable_nagle_algorithm = True
+
+    def log_message(self, formato, *args):
+        pass
+
+    def do_POST(self):
+        pedido = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        corpo = json.dumps({"jsonrpc": "2.0", "result": [], "id": pedido.get("id")}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+
+def gerar_certificado(diretorio):
+    certificado = os.path.join(diretorio, "cert.pem")
+    chave = os.path.join(diretorio, "key.pem")
+    subprocess.run(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+                    "-subj", "/CN=127.0.0.1", "-keyout", chave, "-out", certificado],
+                   check=True, capture_output=True)
+    return certificado, chave
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=300)
+    args = parser.parse_args()
+    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        certificado, chave = gerar_certificado(diretorio)
+        servidor = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        contexto = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        contexto.load_cert_chain(certificado, chave)
+        servidor.socket = contexto.wrap_socket(servidor.socket, server_side=True)
+        servidor.daemon_threads = True
+        threading.Thread(target=servidor.serve_forever, daemon=True).start()
+        url = f"https://127.0.0.1:{servidor.server_address[1]}/api_jsonrpc.php"
+        payload = {"jsonrpc": "2.0", "method": "item.get", "params": {}, "id": 1}
+
+        inicio = time.monotonic()
+        for _ in range(args.calls):
+            requests.post(url, json=payload, verify=False, timeout=500.0).json()
+        sem_sessao = time.monotonic() - inicio
+
+        cliente = ClienteZabbix(url, "token", ClienteHttp(verificar_tls=False))
+        inicio = time.monotonic()
+        for _ in range(args.calls):
+            cliente.chamar("item.get", {})
+        com_sessao = time.monotonic() - inicio
+        cliente.http.fechar()
+        servidor.shutdown()
+
+    resultado = {
+        "chamadas": args.calls,
+        "sem_sessao_ms_por_chamada": round(sem_sessao / args.calls * 1000, 3),
+        "com_sessao_ms_por_chamada": round(com_sessao / args.calls * 1000, 3),
+        "aceleracao": round(sem_sessao / com_sessao, 2),
+    }
+    print(json.dumps(resultado, indent=4))
+
+
+if __name__ == "__main__":
+    main()
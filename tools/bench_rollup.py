@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""Compara as consultas do coletor sobre execution_entity e sobre o rollup por minuto.
+
+Opcionalmente popula um banco de testes (tools/seed_n8n_db.py, o schema n8n é
+recriado), faz o bootstrap do rollup e mede, para o snapshot de todos os
+workflows e para a consulta de um workflow, o tempo médio das consultas
+diretas e das consultas ao rollup. Informa também quantos valores diferem
+numa mesma transação (esperado: só execucoes, para workflows com erros no
+minuto da borda da janela de 24h).
+
+Exemplo:
+    python3 tools/bench_rollup.py --dsn "host=localhost dbname=n8n_teste user=postgres" \
+        --seed --executions 3000000 --repeat 5
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import psycopg2
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from n8n_metricas import FAMILIAS, coleta_snapshot  # noqa: E402
+from n8n_rollup import atualizar_rollup, bootstrap_rollup  # noqa: E402
+from seed_n8n_db import popular  # noqa: E402
+
+FAMILIAS_EXECUCOES = ["execucoes", "tempos"]
+
+
+def cronometrar(funcao, repeticoes):
+    """Tempo médio em ms de `repeticoes` chamadas e o resultado da última."""
+    inicio = time.monotonic()
+    for _ in range(repeticoes):
+        resultado = funcao()
+    return round((time.monotonic() - inicio) / repeticoes * 1000, 2), resultado
+
+
+def comparar(conn):
+    """Valores diferentes entre as duas formas, por família, com o mesmo NOW()."""
+    diferencas = {}
+    with conn.cursor() as cursor:
+        for familia in FAMILIAS_EXECUCOES:
+            direto = FAMILIAS[familia](cursor)
+            via_rollup = FAMILIAS[familia](cursor, rollup=True)
+            diferencas[familia] = sum(
+                1 for acao, valores in direto.items() for wf, valor in valores.items()
+                if abs(float(valor) - float(via_rollup[acao].get(wf, 0))) > 1e-6)
+    conn.rollback()
+    return diferencas
+
+
+def consulta_workflow(conn, workflow_id, rollup):
+    with conn.cursor() as cursor:
+        if rollup:
+            dados = FAMILIAS["execucoes"](cursor, rollup=True, workflow_id=workflow_id)
+        else:
+            cursor.execute('SELECT count(*) FROM n8n."execution_entity" WHERE "workflowId" = %s '
+                           'AND "startedAt" > NOW() - INTERVAL \'24 hours\' AND status = \'error\'',
+                           (workflow_id,))
+            dados = cursor.fetchone()
+    conn.rollback()
+    return dados
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dsn", required=True, help="DSN libpq do banco de testes")
+    parser.add_argument("--seed", action="store_true", help="recria e popula o schema n8n antes de medir")
+    parser.add_argument("--workflows", type=int, default=400)
+    parser.add_argument("--executions", type=int, default=2000000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(args.dsn)
+    resultado = {}
+    try:
+        if args.seed:
+            inicio = time.monotonic()
+            popular(conn, args.workflows, args.executions)
+            resultado["seed_s"] = round(time.monotonic() - inicio, 1)
+        with conn.cursor() as cursor:
+            cursor.execute('SELECT count(*) FROM n8n."execution_entity"')
+            resultado["execucoes"] = cursor.fetchone()[0]
+        conn.rollback()
+
+        inicio = time.monotonic()
+        bootstrap_rollup(conn, atraso=0)
+        resultado["bootstrap_s"] = round(time.monotonic() - inicio, 2)
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT count(*) FROM n8n_monitor.execucoes_minuto")
+            resultado["buckets"] = cursor.fetchone()[0]
+        conn.rollback()
+        resultado["refresh_sem_novas_ms"], _ = cronometrar(lambda: atualizar_rollup(conn, atraso=0), args.repeat)
+
+        resultado["snapshot_direto_ms"], direto = cronometrar(
+            lambda: coleta_snapshot(conn, FAMILIAS_EXECUCOES), args.repeat)
+        resultado["snapshot_rollup_ms"], _ = cronometrar(
+            lambda: coleta_snapshot(conn, FAMILIAS_EXECUCOES, rollup=True), args.repeat)
+        resultado["valores_diferentes"] = comparar(conn)
+
+        workflow_id = next(iter(direto["execucao_status"]), "wf000001")
+        resultado["workflow_direto_ms"], _ = cronometrar(
+            lambda: consulta_workflow(conn, workflow_id, False), args.repeat)
+        resultado["workflow_rollup_ms"], _ = cronometrar(
+            lambda: consulta_workflow(conn, workflow_id, True), args.repeat)
+    finally:
+        conn.close()
+    print(json.dumps(resultado, indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""Mede o custo do coletor e da descoberta por modo de operação e salva em JSON.
+
+Opcionalmente popula um banco de testes (tools/seed_n8n_db.py, o schema n8n é
+recriado), sobe na mesma execução a API do Zabbix falsa
+(tools/fake_zabbix_api.py, com latência configurável) e o trapper falso
+(tools/fake_zabbix_trapper.py), gera um n8n_monitor.conf temporário e roda
+os scripts de src/ como processos separados, como o agente/cron faria.
+
+Para cada modo informa: tempo total, processos iniciados, transações e
+sessões abertas no banco (deltas de pg_stat_database, lidos por uma conexão ao
+banco postgres para não se contarem), consultas executadas (só com a extensão
+pg_stat_statements instalada no banco), chamadas à API do Zabbix, valores
+recebidos pelo trapper e o pico de memória (RSS) dos processos, via
+os.wait4.
+
+Modos: agent (um processo por item, --sample-workflows workflows x ações),
+agent-cache (idem com [CACHE] ligado, começando frio), metrics-json, bulk,
+discovery-full e discovery-incremental (logo após a completa, sem mudanças).
+
+Com --compare o resultado é comparado com um JSON anterior: o script sai com
+código 2 se algum tempo ou pico de memória piorou mais que --tolerance, ou se
+alguma contagem (transações, sessões, consultas, chamadas) aumentou.
+
+Exemplo:
+    python3 tools/bench_suite.py --dsn "host=localhost dbname=n8n_bench user=postgres" \\
+        --seed --workflows 400 --executions 200000 --output bench_base.json
+    python3 tools/bench_suite.py --dsn "..." --compare bench_base.json
+"""
+
+import argparse
+import configparser
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+import psycopg2
+from psycopg2.extensions import parse_dsn
+
+DIR_TOOLS = os.path.dirname(os.path.abspath(__file__))
+DIR_SRC = os.path.join(DIR_TOOLS, "..", "src")
+sys.path.insert(0, DIR_SRC)
+
+from fake_zabbix_api import iniciar_servidor  # noqa: E402
+from fake_zabbix_trapper import TrapperServer  # noqa: E402
+from n8n_metricas import FAMILIA_DA_ACAO  # noqa: E402
+from seed_n8n_db import popular  # noqa: E402
+
+COLETOR = os.path.join(DIR_SRC, "n8n-by-zabbix-coletas.py")
+DESCOBERTA = os.path.join(DIR_SRC, "n8n-by-zabbix-workflow-discovery.py")
+
+MODOS = ["agent", "agent-cache", "metrics-json", "bulk", "discovery-full", "discovery-incremental"]
+# Ações por workflow coletadas no modo agent (as dos itens padrão, sem o histograma)
+ACOES_AGENT = [acao for acao in FAMILIA_DA_ACAO if not acao.startswith("duration_le_")]
+# Contagens que não podem aumentar entre duas execuções comparáveis
+CONTAGENS = ["processos", "db_transacoes", "db_sessoes", "db_consultas", "api_chamadas"]
+METRICAS_TOLERANCIA = ["tempo_s", "rss_max_kb"]
+
+SQL_ESTATISTICAS = """
+    SELECT xact_commit + xact_rollback, sessions, numbackends
+    FROM pg_stat_database WHERE datname = %s
+"""
+SQL_CONSULTAS = """
+    SELECT COALESCE(sum(calls), 0) FROM pg_stat_statements
+    WHERE dbid = (SELECT oid FROM pg_database WHERE datname = %s)
+"""
+
+
+class MonitorBanco:
+    """Lê os contadores de pg_stat_database do banco de teste a partir do banco postgres."""
+
+    def __init__(self, dsn, banco):
+        parametros = dict(parse_dsn(dsn), dbname="postgres")
+        self.conn = psycopg2.connect(**parametros)
+        self.conn.autocommit = True
+        self.banco = banco
+        self.consultas = self._tem_pg_stat_statements(dsn)
+
+    @staticmethod
+    def _tem_pg_stat_statements(dsn):
+        conn = psycopg2.connect(dsn)
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_stat_statements'")
+                return cursor.fetchone() is not None
+        finally:
+            conn.close()
+
+    def ler(self):
+        with self.conn.cursor() as cursor:
+            cursor.execute("SELECT pg_stat_clear_snapshot()")
+            cursor.execute(SQL_ESTATISTICAS, (self.banco,))
+            transacoes, sessoes, conectados = cursor.fetchone()
+            consultas = None
+            if self.consultas:
+                cursor.execute(SQL_CONSULTAS, (self.banco,))
+                consultas = int(cursor.fetchone()[0])
+        return {"transacoes": transacoes, "sessoes": sessoes, "conectados": conectados, "consultas": consultas}
+
+    def aguardar_desconexao(self, conectados, limite=10.0):
+        """Espera as sessões abertas pelos processos terminarem (e gravarem as estatísticas)."""
+        fim = time.monotonic() + limite
+        while time.monotonic() < fim and self.ler()["conectados"] > conectados:
+            time.sleep(0.05)
+        # As estatísticas da sessão são gravadas na saída do backend, logo após a desconexão
+        time.sleep(0.2)
+
+    def fechar(self):
+        self.conn.close()
+
+
+def executar(argv, ambiente, log):
+    """Roda o processo e devolve (código de saída, pico de RSS em KB)."""
+    processo = subprocess.Popen([sys.executable] + argv, env=ambiente, stdout=subprocess.DEVNULL, stderr=log)
+    _, status, uso = os.wait4(processo.pid, 0)
+    processo.returncode = os.waitstatus_to_exitcode(status)
+    return processo.returncode, uso.ru_maxrss
+
+
+def escrever_config(caminho, dsn, porta_api, porta_trapper, estado, cache=None):
+    parametros = parse_dsn(dsn)
+    config = configparser.ConfigParser()
+    config["N8N"] = {
+        "DB_POSTGRESDB_DATABASE": parametros.get("dbname", "postgres"),
+        "DB_POSTGRESDB_HOST": parametros.get("host", "localhost"),
+        "DB_POSTGRESDB_PORT": parametros.get("port", "5432"),
+        "DB_POSTGRESDB_USER": parametros.get("user", "postgres"),
+        "DB_POSTGRESDB_PASSWORD": parametros.get("password", ""),
+    }
+    config["ZABBIX"] = {
+        "API_URL": f"http://127.0.0.1:{porta_api}/api_jsonrpc.php",
+        "AUTH_TOKEN": "bench",
+        "HOST_ID": "10084",
+        "SENDER_SERVER": "127.0.0.1",
+        "SENDER_PORT": str(porta_trapper),
+        "SENDER_HOST": "n8n-host",
+    }
+    config["DISCOVERY"] = {"STATE_FILE": estado}
+    if cache:
+        config["CACHE"] = {"ENABLED": "true", "PATH": cache}
+    with open(caminho, "w") as arquivo:
+        config.write(arquivo)
+
+
+def comandos_modo(modo, workflows):
+    if modo in ("agent", "agent-cache"):
+        return [[COLETOR, acao, workflow_id] for workflow_id in workflows for acao in ACOES_AGENT]
+    if modo == "metrics-json":
+        return [[COLETOR, "metrics_json"]]
+    if modo == "bulk":
+        return [[COLETOR, "bulk"]]
+    if modo == "discovery-full":
+        return [[DESCOBERTA, "--full"]]
+    return [[DESCOBERTA]]
+
+
+def medir_modo(modo, comandos, ambiente, monitor, api, trapper, log):
+    antes = monitor.ler()
+    chamadas_antes = api.zabbix.estatisticas()["total_chamadas"]
+    valores_antes = trapper.valores
+    falhas = 0
+    rss_max = 0
+    inicio = time.monotonic()
+    for argv in comandos:
+        codigo, rss = executar(argv, ambiente, log)
+        falhas += codigo != 0
+        rss_max = max(rss_max, rss)
+    tempo = time.monotonic() - inicio
+    monitor.aguardar_desconexao(antes["conectados"])
+    depois = monitor.ler()
+    return {
+        "tempo_s": round(tempo, 3),
+        "processos": len(comandos),
+        "tempo_por_processo_ms": round(tempo / len(comandos) * 1000, 1),
+        "falhas": falhas,
+        "db_transacoes": depois["transacoes"] - antes["transacoes"],
+        "db_sessoes": depois["sessoes"] - antes["sessoes"],
+        "db_consultas": None if antes["consultas"] is None else depois["consultas"] - antes["consultas"],
+        "api_chamadas": api.zabbix.estatisticas()["total_chamadas"] - chamadas_antes,
+        "valores_trapper": trapper.valores - valores_antes,
+        "rss_max_kb": rss_max,
+    }
+
+
+def amostra_workflows(dsn, quantidade):
+    conn = psycopg2.connect(dsn)
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute('SELECT id FROM n8n."workflow_entity" WHERE NOT "isArchived" ORDER BY id LIMIT %s',
+                           (quantidade,))
+            workflows = [linha[0] for linha in cursor.fetchall()]
+            cursor.execute('SELECT (SELECT count(*) FROM n8n."workflow_entity"), '
+                           '(SELECT count(*) FROM n8n."execution_entity"), version()')
+            total_workflows, total_execucoes, versao = cursor.fetchone()
+    finally:
+        conn.close()
+    return workflows, {"workflows": total_workflows, "execucoes": total_execucoes, "postgres": versao}
+
+
+def comparar(base, atual, tolerancia, saida=sys.stdout):
+    """Imprime as diferenças por modo e devolve a lista de regressões."""
+    regressoes = []
+    for modo, valores in atual["modos"].items():
+        anterior = base.get("modos", {}).get(modo)
+        if anterior is None:
+            continue
+        for metrica in METRICAS_TOLERANCIA + CONTAGENS:
+            novo, velho = valores.get(metrica), anterior.get(metrica)
+            if novo is None or velho is None:
+                continue
+            variacao = (novo - velho) / velho * 100 if velho else (0.0 if novo == velho else float("inf"))
+            piorou = (novo > velho * (1 + tolerancia)) if metrica in METRICAS_TOLERANCIA else novo > velho
+            marca = "  REGRESSÃO" if piorou else ""
+            print(f"{modo:22} {metrica:16} {velho:>12} -> {novo:>12} ({variacao:+.1f}%){marca}", file=saida)
+            if piorou:
+                regressoes.append(f"{modo}.{metrica}")
+    return regressoes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dsn", required=True, help="DSN libpq do banco de testes")
+    parser.add_argument("--seed", action="store_true", help="recria e popula o schema n8n antes de medir")
+    parser.add_argument("--workflows", type=int, default=400)
+    parser.add_argument("--executions", type=int, default=200000)
+    parser.add_argument("--modes", default=",".join(MODOS), help=f"modos separados por vírgula ({','.join(MODOS)})")
+    parser.add_argument("--sample-workflows", type=int, default=10,
+                        help="workflows coletados nos modos agent/agent-cache")
+    parser.add_argument("--api-latency-ms", type=float, default=0.0, help="latência da API do Zabbix falsa")
+    parser.add_argument("--output", help="grava o resultado em JSON neste arquivo")
+    parser.add_argument("--compare", help="JSON de uma execução anterior para comparar")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="piora aceita em tempo e memória na comparação (padrão 0.2 = 20%%)")
+    args = parser.parse_args()
+
+    modos = [modo.strip() for modo in args.modes.split(",") if modo.strip()]
+    desconhecidos = set(modos) - set(MODOS)
+    if desconhecidos:
+        parser.error(f"modos desconhecidos: {', '.join(sorted(desconhecidos))}")
+    if "discovery-incremental" in modos and "discovery-full" not in modos:
+        parser.error("discovery-incremental precisa de discovery-full antes")
+
+    if args.seed:
+        conn = psycopg2.connect(args.dsn)
+        try:
+            popular(conn, args.workflows, args.executions)
+        finally:
+            conn.close()
+
+    workflows, meta = amostra_workflows(args.dsn, args.sample_workflows)
+    monitor = MonitorBanco(args.dsn, parse_dsn(args.dsn).get("dbname"))
+    api = iniciar_servidor(latencia=args.api_latency_ms / 1000)
+    trapper = TrapperServer(("127.0.0.1", 0), quiet=True)
+    threading.Thread(target=trapper.serve_forever, daemon=True).start()
+    diretorio = tempfile.mkdtemp(prefix="n8n-bench-")
+    resultado = {
+        "data": datetime.now(timezone.utc).isoformat(),
+        "meta": dict(meta, python=platform.python_version(), sample_workflows=len(workflows),
+                     api_latency_ms=args.api_latency_ms, pg_stat_statements=monitor.consultas),
+        "modos": {},
+    }
+    try:
+        conf = os.path.join(diretorio, "n8n_monitor.conf")
+        conf_cache = os.path.join(diretorio, "n8n_monitor_cache.conf")
+        estado = os.path.join(diretorio, "discovery_state.json")
+        escrever_config(conf, args.dsn, api.server_address[1], trapper.server_address[1], estado)
+        escrever_config(conf_cache, args.dsn, api.server_address[1], trapper.server_address[1], estado,
+                        cache=os.path.join(diretorio, "coletas_cache.sqlite"))
+        with open(os.path.join(diretorio, "stderr.log"), "w") as log:
+            for modo in modos:
+                ambiente = dict(os.environ, N8N_MONITOR_CONF=conf_cache if modo == "agent-cache" else conf)
+                if modo == "discovery-full":
+                    api.zabbix.reset()
+                medicao = medir_modo(modo, comandos_modo(modo, workflows), ambiente, monitor, api, trapper, log)
+                resultado["modos"][modo] = medicao
+                print(f"{modo}: {json.dumps(medicao)}", file=sys.stderr)
+        if any(m["falhas"] for m in resultado["modos"].values()):
+            with open(os.path.join(diretorio, "stderr.log")) as log:
+                print("Processos com falha; stderr:\n" + log.read()[-4000:], file=sys.stderr)
+    finally:
+        monitor.fechar()
+        api.shutdown()
+        trapper.shutdown()
+        shutil.rmtree(diretorio, ignore_errors=True)
+
+    texto = json.dumps(resultado, indent=4, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as arquivo:
+            arquivo.write(texto + "\n")
+    else:
+        print(texto)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as arquivo:
+            base = json.load(arquivo)
+        regressoes = comparar(base, resultado, args.tolerance)
+        if regressoes:
+            print(f"Regressões: {', '.join(regressoes)}", file=sys.stderr)
+            sys.exit(2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""API REST do n8n falsa para testar a descoberta via API com várias páginas.
+
+Serve GET /api/v1/workflows com limit/cursor/active como o n8n (nextCursor em
+base64), exige o cabeçalho X-N8N-API-KEY e devolve ETag por página,
+respondendo 304 a If-None-Match igual. GET /stats mostra os contadores.
+
+Exemplo:
+    python3 tools/fake_n8n_api.py --port 15678 --workflows 1000
+"""
+
+import argparse
+import base64
+import hashlib
+import json
+import sys
+import threading
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+def gerar_workflows(quantidade):
+    agora = datetime.now(timezone.utc)
+    return [{
+        "id": f"wf{i:06d}",
+        "name": f"Workflow sintético {i}",
+        "active": i % 5 != 0,
+        "isArchived": i % 50 == 0,
+        "updatedAt": (agora - timedelta(minutes=i)).isoformat(timespec="milliseconds").replace("+00:00", "Z"),
+        "nodes": [{"name": "Start", "type": "n8n-nodes-base.manualTrigger"}],
+    } for i in range(1, quantidade + 1)]
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, formato, *args):
+        pass
+
+    def _responder(self, status, corpo=None, etag=None):
+        dados = json.dumps(corpo).encode("utf-8") if corpo is not None else b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(dados)))
+        if etag:
+            self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(dados)
+
+    def do_GET(self):
+        servidor = self.server
+        url = urlparse(self.path)
+        if url.path == "/stats":
+            self._responder(200, dict(servidor.contadores))
+            return
+        if url.path != "/api/v1/workflows":
+            self._responder(404, {"message": "not found"})
+            return
+        if self.headers.get("X-N8N-API-KEY") != servidor.api_key:
+            self._responder(401, {"message": "unauthorized"})
+            return
+
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        limite = min(int(query.get("limit", 100)), 250)
+        inicio = 0
+        if "cursor" in query:
+            inicio = json.loads(base64.b64decode(query["cursor"]))["offset"]
+        workflows = servidor.workflows
+        if "active" in query:
+            workflows = [wf for wf in workflows if wf["active"] == (query["active"] == "true")]
+        pagina = workflows[inicio:inicio + limite]
+        proximo = None
+        if inicio + limite < len(workflows):
+            proximo = base64.b64encode(json.dumps({"offset": inicio + limite}).encode()).decode()
+        corpo = {"data": pagina, "nextCursor": proximo}
+        etag = '"' + hashlib.sha256(json.dumps(corpo).encode()).hexdigest()[:16] + '"'
+
+        servidor.contadores["paginas"] += 1
+        if self.headers.get("If-None-Match") == etag:
+            servidor.contadores["nao_modificadas"] += 1
+            self._responder(304, etag=etag)
+        else:
+            self._responder(200, corpo, etag=etag)
+
+
+def iniciar_servidor(porta=0, quantidade=1000, api_key="teste"):
+    servidor = ThreadingHTTPServer(("127.0.0.1", porta), Handler)
+    servidor.daemon_threads = True
+    servidor.workflows = gerar_workflows(quantidade)
+    servidor.api_key = api_key
+    servidor.contadores = Counter()
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=15678)
+    parser.add_argument("--workflows", type=int, default=1000)
+    parser.add_argument("--api-key", default="teste")
+    args = parser.parse_args()
+    iniciar_servidor(args.port, args.workflows, args.api_key)
+    print(f"API n8n falsa em http://127.0.0.1:{args.port} ({args.workflows} workflows)", file=sys.stderr)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
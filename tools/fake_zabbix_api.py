@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""API JSON-RPC do Zabbix falsa, em memória, para testar a descoberta localmente.
+
+Implementa o subconjunto usado pelos scripts (host/hostinterface/item/trigger
+get/create/update/delete, template.get e host.massadd, com parâmetros em
+objeto ou array) sobre um único host e conta as chamadas por método. GET /stats devolve os contadores e
+POST /reset zera o estado.
+
+Exemplo:
+    python3 tools/fake_zabbix_api.py --port 18080 --hostname n8n-host
+    # API_URL = http://127.0.0.1:18080/api_jsonrpc.php e HOST_ID = 10084 no .conf
+    N8N_MONITOR_CONF=./teste.conf python3 src/n8n-by-zabbix-workflow-discovery.py
+"""
+
+import argparse
+import itertools
+import json
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class ErroApi(Exception):
+    pass
+
+
+def _como_lista(valor):
+    if valor is None:
+        return None
+    return valor if isinstance(valor, list) else [valor]
+
+
+def _filtrar(objetos, params, campo_id):
+    """Aplica hostids/filter/search/output como a API real (subconjunto)."""
+    resultado = list(objetos)
+    ids = _como_lista(params.get(campo_id + "s"))
+    if ids is not None:
+        ids = {str(i) for i in ids}
+        resultado = [o for o in resultado if o[campo_id] in ids]
+    for campo, valores in (params.get("filter") or {}).items():
+        valores = {str(v) for v in _como_lista(valores)}
+        resultado = [o for o in resultado if str(o.get(campo)) in valores]
+    for campo, valor in (params.get("search") or {}).items():
+        if params.get("startSearch"):
+            resultado = [o for o in resultado if str(o.get(campo, "")).startswith(valor)]
+        else:
+            resultado = [o for o in resultado if valor in str(o.get(campo, ""))]
+    saida = params.get("output", "extend")
+    if saida != "extend":
+        resultado = [{c: o.get(c, "") for c in saida} for o in resultado]
+    if params.get("countOutput"):
+        return str(len(resultado))
+    return resultado
+
+
+class ZabbixFalso:
+    """Estado em memória de um host com seus itens e triggers."""
+
+    def __init__(self, host_id="10084", hostname="n8n-host", latencia=0.0):
+        self.host_id = str(host_id)
+        self.hostname = hostname
+        self.latencia = latencia
+        self.trava = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.itens = {}
+        self.triggers = {}
+        self.templates = [{"templateid": "20001", "host": "n8n by Zabbix", "name": "n8n by Zabbix"}]
+        self.vinculados = set()
+        self.ids = itertools.count(100000)
+        self.chamadas = Counter()
+        self.objetos = Counter()
+
+    def _texto(self, objeto):
+        # A API devolve números como texto
+        return {k: (str(v) if isinstance(v, (int, float)) and not isinstance(v, bool) else v)
+                for k, v in objeto.items()}
+
+    def chamar(self, metodo, params):
+        with self.trava:
+            self.chamadas[metodo] += 1
+            if isinstance(params, list):
+                self.objetos[metodo] += len(params)
+            manipulador = getattr(self, "m_" + metodo.replace(".", "_"), None)
+            if manipulador is None:
+                raise ErroApi(f'Incorrect method "{metodo}".')
+            return manipulador(params)
+
+    def m_apiinfo_version(self, params):
+        return "7.0.0"
+
+    def m_hostinterface_get(self, params):
+        return [{"interfaceid": "1", "hostid": self.host_id, "type": "1"}]
+
+    def m_host_get(self, params):
+        host = {"hostid": self.host_id, "host": self.hostname, "name": self.hostname}
+        return _filtrar([host], params, "hostid")
+
+    def m_template_get(self, params):
+        return _filtrar(self.templates, params, "templateid")
+
+    def m_host_massadd(self, params):
+        for template in _como_lista(params.get("templates")) or []:
+            if str(template["templateid"]) not in {t["templateid"] for t in self.templates}:
+                raise ErroApi("No permissions to referred object or it does not exist!")
+            self.vinculados.add(str(template["templateid"]))
+        return {"hostids": [str(h["hostid"]) for h in _como_lista(params.get("hosts"))]}
+
+    def m_item_get(self, params):
+        itens = _filtrar(self.itens.values(), dict(params, output="extend"), "hostid")
+        if not isinstance(itens, list):
+            return itens
+        saida = params.get("output", "extend")
+        resultado = []
+        for item in itens:
+            copia = dict(item) if saida == "extend" else {c: item.get(c, "") for c in saida}
+            if params.get("selectPreprocessing"):
+                copia["preprocessing"] = item.get("preprocessing", [])
+            if params.get("selectTags"):
+                copia["tags"] = item.get("tags", [])
+            resultado.append(copia)
+        return resultado
+
+    def m_item_create(self, params):
+        ids = []
+        for item in _como_lista(params):
+            item = self._texto(item)
+            if "hostid" not in item or "key_" not in item:
+                raise ErroApi("Invalid params.")
+            if any(i["key_"] == item["key_"] and i["hostid"] == item["hostid"] for i in self.itens.values()):
+                raise ErroApi(f'Item with key "{item["key_"]}" already exists on "{self.hostname}".')
+            item["itemid"] = str(next(self.ids))
+            item.setdefault("status", "0")
+            item.setdefault("flags", "0")
+            item["preprocessing"] = [self._texto(p) for p in _como_lista(item.get("preprocessing")) or []]
+            item["tags"] = _como_lista(item.get("tags")) or []
+            self.itens[item["itemid"]] = item
+            ids.append(item["itemid"])
+        return {"itemids": ids}
+
+    def m_item_update(self, params):
+        ids = []
+        for alteracao in _como_lista(params):
+            item = self.itens.get(str(alteracao.get("itemid")))
+            if item is None:
+                raise ErroApi("No permissions to referred object or it does not exist!")
+            alteracao = self._texto(alteracao)
+            if "preprocessing" in alteracao:
+                alteracao["preprocessing"] = [self._texto(p) for p in _como_lista(alteracao["preprocessing"])]
+            if "tags" in alteracao:
+                alteracao["tags"] = _como_lista(alteracao["tags"])
+            item.update(alteracao)
+            ids.append(item["itemid"])
+        return {"itemids": ids}
+
+    def m_item_delete(self, params):
+        for itemid in params:
+            item = self.itens.pop(str(itemid), None)
+            if item is None:
+                raise ErroApi("No permissions to referred object or it does not exist!")
+            # Como no Zabbix, triggers que usam o item somem junto
+            for triggerid, trigger in list(self.triggers.items()):
+                if f"/{item['key_']})" in trigger["expression"]:
+                    del self.triggers[triggerid]
+        return {"itemids": [str(i) for i in params]}
+
+    def m_trigger_get(self, params):
+        triggers = list(self.triggers.values())
+        if params.get("hostids") is not None and str(params["hostids"]) != self.host_id:
+            triggers = []
+        if params.get("itemids") is not None:
+            chaves = {self.itens[str(i)]["key_"] for i in _como_lista(params["itemids"]) if str(i) in self.itens}
+            triggers = [t for t in triggers if any(f"/{chave})" in t["expression"] or f"/{chave}," in t["expression"]
+                                                  for chave in chaves)]
+        ignorados = {"hostids", "itemids"}
+        return _filtrar(triggers, {k: v for k, v in params.items() if k not in ignorados}, "triggerid")
+
+    def m_trigger_create(self, params):
+        ids = []
+        for trigger in _como_lista(params):
+            trigger = self._texto(trigger)
+            trigger["triggerid"] = str(next(self.ids))
+            self.triggers[trigger["triggerid"]] = trigger
+            ids.append(trigger["triggerid"])
+        return {"triggerids": ids}
+
+    def m_trigger_update(self, params):
+        ids = []
+        for alteracao in _como_lista(params):
+            trigger = self.triggers.get(str(alteracao.get("triggerid")))
+            if trigger is None:
+                raise ErroApi("No permissions to referred object or it does not exist!")
+            trigger.update(self._texto(alteracao))
+            ids.append(trigger["triggerid"])
+        return {"triggerids": ids}
+
+    def m_trigger_delete(self, params):
+        for triggerid in params:
+            if self.triggers.pop(str(triggerid), None) is None:
+                raise ErroApi("No permissions to referred object or it does not exist!")
+        return {"triggerids": [str(i) for i in params]}
+
+    def estatisticas(self):
+        return {
+            "chamadas": dict(self.chamadas),
+            "total_chamadas": sum(self.chamadas.values()),
+            "objetos_em_arrays": dict(self.objetos),
+            "itens": len(self.itens),
+            "triggers": len(self.triggers),
+            "templates_vinculados": sorted(self.vinculados),
+        }
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Evita o atraso de Nagle + ACK atrasado nas conexões keep-alive
+    disable_nagle_algorithm = True
+
+    def log_message(self, formato, *args):
+        pass
+
+    def _responder(self, corpo, status=200):
+        dados = json.dumps(corpo).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(dados)))
+        self.end_headers()
+        self.wfile.write(dados)
+
+    def do_GET(self):
+        if self.path == "/stats":
+            self._responder(self.server.zabbix.estatisticas())
+        else:
+            self._responder({"erro": "não encontrado"}, 404)
+
+    def do_POST(self):
+        corpo = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.path == "/reset":
+            self.server.zabbix.reset()
+            self._responder({"ok": True})
+            return
+        pedido = json.loads(corpo)
+        if self.server.zabbix.latencia:
+            time.sleep(self.server.zabbix.latencia)
+        try:
+            resultado = self.server.zabbix.chamar(pedido["method"], pedido.get("params", {}))
+            self._responder({"jsonrpc": "2.0", "result": resultado, "id": pedido.get("id")})
+        except ErroApi as e:
+            self._responder({"jsonrpc": "2.0", "id": pedido.get("id"),
+                             "error": {"code": -32602, "message": "Invalid params.", "data": str(e)}})
+
+
+def iniciar_servidor(porta=0, host_id="10084", hostname="n8n-host", latencia=0.0):
+    """Sobe a API falsa numa thread e devolve o servidor (porta em server_address[1])."""
+    servidor = ThreadingHTTPServer(("127.0.0.1", porta), Handler)
+    servidor.daemon_threads = True
+    servidor.zabbix = ZabbixFalso(host_id, hostname, latencia)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=18080)
+    parser.add_argument("--host-id", default="10084")
+    parser.add_argument("--hostname", default="n8n-host")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="latência artificial por chamada")
+    args = parser.parse_args()
+
+    servidor = iniciar_servidor(args.port, args.host_id, args.hostname, args.latency_ms / 1000)
+    print(f"API Zabbix falsa em http://127.0.0.1:{args.port}/api_jsonrpc.php", file=sys.stderr)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        print(json.dumps(servidor.zabbix.estatisticas(), indent=4), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
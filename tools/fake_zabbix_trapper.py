@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""Trapper Zabbix falso para testar o coletor em modo bulk sem um Zabbix server.
+
+Escuta na porta informada, decodifica os pacotes "sender data", imprime cada
+valor recebido (ou só o resumo com --quiet) e responde como o Zabbix server.
+
+Exemplo:
+    python3 tools/fake_zabbix_trapper.py --port 10051
+    N8N_MONITOR_CONF=./teste.conf python3 src/n8n-by-zabbix-coletas.py bulk
+"""
+
+import argparse
+import json
+import os
+import socketserver
+import struct
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from n8n_zabbix_sender import CABECALHO, ler_pacote  # noqa: E402
+
+
+class TrapperHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        inicio = time.monotonic()
+        pedido = ler_pacote(self.request)
+        dados = pedido.get("data", [])
+        if not self.server.quiet:
+            for valor in dados:
+                print(f"{valor['host']} {valor['key']} {valor['value']}")
+        resposta = {
+            "response": "success",
+            "info": f"processed: {len(dados)}; failed: 0; total: {len(dados)}; "
+                    f"seconds spent: {time.monotonic() - inicio:.6f}",
+        }
+        corpo = json.dumps(resposta).encode("utf-8")
+        self.request.sendall(CABECALHO + struct.pack("<II", len(corpo), 0) + corpo)
+        self.server.pacotes += 1
+        self.server.valores += len(dados)
+        print(f"pacote #{self.server.pacotes}: {len(dados)} valores "
+              f"(total {self.server.valores})", file=sys.stderr)
+
+
+class TrapperServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, endereco, quiet=False):
+        super().__init__(endereco, TrapperHandler)
+        self.quiet = quiet
+        self.pacotes = 0
+        self.valores = 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=10051)
+    parser.add_argument("--quiet", action="store_true", help="não imprime os valores, só o resumo")
+    args = parser.parse_args()
+
+    with TrapperServer((args.host, args.port), quiet=args.quiet) as servidor:
+        print(f"Trapper falso escutando em {args.host}:{args.port}", file=sys.stderr)
+        try:
+            servidor.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""Cria um banco n8n sintético para testes locais do coletor e da descoberta.
+
+Gera as tabelas n8n.workflow_entity, n8n.execution_entity e n8n.execution_data
+com as colunas usadas pelos scripts e popula com N workflows e M execuções
+distribuídas nas últimas 24 horas. Use SOMENTE em um banco de testes: o schema
+n8n é recriado do zero.
+
+Exemplo:
+    python3 tools/seed_n8n_db.py --dsn "host=localhost dbname=n8n_teste user=postgres" \
+        --workflows 400 --executions 200000
+"""
+
+import argparse
+import sys
+import time
+
+import psycopg2
+
+DDL = """
+DROP SCHEMA IF EXISTS n8n CASCADE;
+CREATE SCHEMA n8n;
+
+CREATE TABLE n8n.workflow_entity (
+    id varchar(36) PRIMARY KEY,
+    name varchar(128) NOT NULL,
+    active boolean NOT NULL DEFAULT false,
+    nodes json,
+    connections json,
+    "createdAt" timestamptz(3) NOT NULL DEFAULT now(),
+    "updatedAt" timestamptz(3) NOT NULL DEFAULT now(),
+    "isArchived" boolean NOT NULL DEFAULT false
+);
+
+CREATE TABLE n8n.execution_entity (
+    id serial PRIMARY KEY,
+    finished boolean NOT NULL DEFAULT false,
+    mode varchar NOT NULL DEFAULT 'trigger',
+    "retryOf" varchar,
+    "retrySuccessId" varchar,
+    "startedAt" timestamptz(3),
+    "stoppedAt" timestamptz(3),
+    "waitTill" timestamptz(3),
+    "workflowId" varchar(36) NOT NULL,
+    status varchar NOT NULL,
+    "deletedAt" timestamptz(3),
+    "createdAt" timestamptz(3) NOT NULL DEFAULT now()
+);
+CREATE INDEX "IDX_execution_entity_workflowId_id" ON n8n.execution_entity ("workflowId", id);
+CREATE INDEX "IDX_execution_entity_stoppedAt_status_deletedAt"
+    ON n8n.execution_entity ("stoppedAt", status, "deletedAt");
+
+CREATE TABLE n8n.execution_data (
+    "executionId" integer PRIMARY KEY REFERENCES n8n.execution_entity (id) ON DELETE CASCADE,
+    "workflowData" json NOT NULL DEFAULT '{}',
+    data text NOT NULL
+);
+"""
+
+SQL_WORKFLOWS = """
+INSERT INTO n8n.workflow_entity (id, name, active, "updatedAt", "isArchived")
+SELECT 'wf' || lpad(g::text, 6, '0'),
+       'Workflow sintético ' || g,
+       g %% 5 <> 0,
+       now() - (g || ' minutes')::interval,
+       g %% 50 = 0
+FROM generate_series(1, %(workflows)s) AS g
+"""
+
+# Execuções distribuídas uniformemente nas últimas 24h; ~5% com erro e
+# algumas ainda em andamento/aguardando para exercitar as métricas de fila.
+SQL_EXECUCOES = """
+INSERT INTO n8n.execution_entity
+    (finished, mode, "startedAt", "stoppedAt", "workflowId", status, "createdAt")
+SELECT s.status = 'success',
+       'trigger',
+       s.inicio,
+       CASE WHEN s.status IN ('running', 'new', 'waiting') THEN NULL
+            ELSE s.inicio + random() * interval '30 seconds' END,
+       'wf' || lpad((1 + (g %% %(workflows)s))::text, 6, '0'),
+       s.status,
+       s.inicio - random() * interval '2 seconds'
+FROM generate_series(1, %(executions)s) AS g
+CROSS JOIN LATERAL (
+    SELECT now() - random() * interval '24 hours' AS inicio,
+           CASE WHEN g %% 20 = 0 THEN 'error'
+                WHEN g %% 997 = 0 THEN 'running'
+                WHEN g %% 1499 = 0 THEN 'waiting'
+                ELSE 'success' END AS status
+) AS s
+"""
+
+
+def popular(conn, workflows, execucoes):
+    """Recria o schema n8n na conexão e popula com os workflows e execuções pedidos."""
+    with conn, conn.cursor() as cursor:
+        cursor.execute(DDL)
+        cursor.execute(SQL_WORKFLOWS, {"workflows": workflows})
+        cursor.execute(SQL_EXECUCOES, {"workflows": workflows, "executions": execucoes})
+    with conn, conn.cursor() as cursor:
+        cursor.execute("ANALYZE n8n.workflow_entity; ANALYZE n8n.execution_entity")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dsn", required=True, help="DSN libpq do banco de testes")
+    parser.add_argument("--workflows", type=int, default=400)
+    parser.add_argument("--executions", type=int, default=100000)
+    args = parser.parse_args()
+
+    inicio = time.monotonic()
+    conn = psycopg2.connect(args.dsn)
+    try:
+        popular(conn, args.workflows, args.executions)
+    finally:
+        conn.close()
+    print(f"{args.workflows} workflows e {args.executions} execuções criados em "
+          f"{time.monotonic() - inicio:.1f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()